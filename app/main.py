@@ -1,8 +1,11 @@
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import chat, data
+from app.routes import chat, data, debug, pipelines
 from app.services.storage_service import MinioStorage
+from app.services.scheduler.pipeline_scheduler_service import get_pipeline_scheduler
+from app.services.registry.pipeline_registry_service import get_pipeline_registry
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,6 +23,10 @@ async def main(app: FastAPI):
     try:
         # Initialize MinIO service (this will create buckets and load initial data)
         logger.info("MinIO service initialized successfully")
+        if os.getenv("SCHEDULER_ENABLED", "true").lower() == "true":
+            pipeline_scheduler = get_pipeline_scheduler()
+            pipeline_scheduler.run_listeners.append(get_pipeline_registry().record_run)
+            pipeline_scheduler.start()
         yield
     except Exception as e:
         logger.error(f"Failed to initialize MinIO service: {e}")
@@ -27,6 +34,7 @@ async def main(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down DataOps Assistant API...")
+        get_pipeline_scheduler().shutdown()
 
 app = FastAPI(
     title="DataOps Assistant API",
@@ -49,3 +57,5 @@ def health_check():
 
 # Include routers
 app.include_router(chat.router, prefix="/chat", tags=["chat"])
+app.include_router(pipelines.router, prefix="/pipelines", tags=["pipelines"])
+app.include_router(debug.router, prefix="/debug", tags=["debug"])
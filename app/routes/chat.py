@@ -1,6 +1,10 @@
+from typing import Literal
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from app.services.build_queue import BuildRejected
 from app.services.chat_service import ChatService
+from app.services.llm_recording import LLMReplayMiss
+from app.services.llm_service import LLMUnavailableError
 from app.services.guards.prompt_guard_service import PromptGuardService
 from dotenv import load_dotenv
 
@@ -12,6 +16,7 @@ prompt_guard_service = PromptGuardService()
 
 class ChatRequest(BaseModel):
     message: str
+    priority: Literal["high", "normal", "low"] = "normal"
 
 @router.post("")
 async def chat_endpoint(request: ChatRequest):
@@ -19,7 +24,13 @@ async def chat_endpoint(request: ChatRequest):
     Endpoint to handle chat requests.
     Delegates business logic to ChatService.
     """
-    result = chat_service.process_message(request.message)
+    # Builds run on the build queue's workers; the request only awaits the result
+    try:
+        result = await chat_service.process_message(request.message, request.priority)
+    except BuildRejected as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except (LLMUnavailableError, LLMReplayMiss) as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if result["decision"] == "block":
         raise HTTPException(status_code=400, detail=result)
@@ -28,3 +39,8 @@ async def chat_endpoint(request: ChatRequest):
         return result
 
     return {"response": result["response"]}
+
+@router.get("/metrics")
+async def chat_metrics():
+    """Build queue depth and wait times, build coalescing and guard cache counters"""
+    return chat_service.metrics()
@@ -0,0 +1,26 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.tracing import tracer
+
+router = APIRouter()
+
+@router.get("/traces/slowest")
+async def slowest_traces(limit: int = Query(10, ge=1, le=100), name: Optional[str] = "build_pipeline",
+                         window_seconds: Optional[float] = Query(None, gt=0),
+                         format: Literal["waterfall", "otlp"] = "waterfall"):
+    """
+    Slowest traces of the last `window_seconds` (default and maximum: TRACING_SLOWEST_WINDOW_SECONDS)
+    containing a span called `name` (default: requests that ran a build)
+    """
+    traces = tracer.slowest(limit, name=name or None, window_seconds=window_seconds)
+    if format == "otlp":
+        return tracer.to_otlp(traces)
+    return {"traces": [tracer.waterfall(t) for t in traces]}
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, format: Literal["waterfall", "otlp"] = "waterfall"):
+    """One trace as a waterfall or as OTLP/JSON"""
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace '{trace_id}' not found")
+    return tracer.to_otlp([trace]) if format == "otlp" else tracer.waterfall(trace)
@@ -0,0 +1,36 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.services.scheduler.pipeline_scheduler_service import get_pipeline_scheduler
+from app.services.registry.pipeline_registry_service import get_pipeline_registry
+
+router = APIRouter()
+
+@router.get("")
+async def list_pipelines():
+    """List deployed pipelines with their schedule and last run"""
+    pipeline_scheduler = get_pipeline_scheduler()
+    return {"pipelines": pipeline_scheduler.list_pipelines(), "scheduler": pipeline_scheduler.stats()}
+
+@router.get("/registry")
+async def search_registry(q: Optional[str] = None, source_type: Optional[str] = None, source_path: Optional[str] = None,
+                          destination_type: Optional[str] = None, verified: Optional[bool] = None,
+                          limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """List and search every built pipeline (deployed or not) in the registry"""
+    return get_pipeline_registry().search(q=q, source_type=source_type, source_path=source_path,
+                                          destination_type=destination_type, verified=verified, limit=limit, offset=offset)
+
+@router.get("/registry/{name}")
+async def registry_entry(name: str):
+    """Spec, code, test metrics and recent runs of a registered pipeline"""
+    entry = get_pipeline_registry().get(name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{name}' is not registered")
+    return entry
+
+@router.get("/{name}/runs")
+async def pipeline_runs(name: str, limit: int = 50):
+    """Run history (duration, rows, peak memory) of a deployed pipeline"""
+    history = get_pipeline_scheduler().run_history(name, limit)
+    if history is None:
+        raise HTTPException(status_code=404, detail=f"Pipeline '{name}' is not deployed")
+    return {"pipeline": name, "runs": history}
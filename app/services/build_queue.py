@@ -0,0 +1,161 @@
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+# Recent wait times kept for the percentile metrics
+WAIT_SAMPLES = 1000
+
+
+class BuildRejected(Exception):
+    """The build was not admitted (queue full) or waited past its deadline."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Build rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class BuildQueue:
+    """
+    Admission control for pipeline builds: a fixed number of worker threads and
+    a bounded priority queue in front of them.
+
+    A full queue rejects immediately with an estimated Retry-After instead of
+    letting work pile up; a higher-priority request evicts the newest
+    lowest-priority queued one instead. Requests that waited longer than
+    `max_wait` are dropped when dequeued, so workers never spend minutes on a
+    build whose client has given up. Throughput therefore stays at `workers`
+    concurrent builds however large the burst.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_queued: Optional[int] = None, max_wait: Optional[float] = None):
+        self.workers = workers or int(os.getenv("BUILD_WORKERS", "2"))
+        self.max_queued = max_queued if max_queued is not None else int(os.getenv("BUILD_QUEUE_SIZE", "16"))
+        self.max_wait = max_wait or float(os.getenv("BUILD_QUEUE_MAX_WAIT_SECONDS", "600"))
+        self._cond = threading.Condition()
+        # (priority, seq, enqueued_at, fn, future)
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._threads: list = []
+        self.running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self.expired = 0
+        self._waits: deque = deque(maxlen=WAIT_SAMPLES)
+        # Exponential moving average of build duration, for Retry-After
+        self._avg_build_seconds: Optional[float] = None
+
+    def _ensure_workers(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"build-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: the backlog drained at the observed build rate."""
+        avg = self._avg_build_seconds or 60.0
+        return max(1, math.ceil(avg * (len(self._heap) + self.running) / self.workers))
+
+    def submit(self, fn: Callable[[], Any], priority: str = "normal") -> Future:
+        rank = PRIORITIES[priority]
+        future: Future = Future()
+        # Run in the submitter's context so tracing spans join the request's trace
+        fn = functools.partial(contextvars.copy_context().run, fn)
+        with self._cond:
+            self._ensure_workers()
+            if len(self._heap) >= self.max_queued:
+                # Newest entry of the lowest priority queued
+                victim = max(self._heap, key=lambda e: (e[0], e[1]), default=None)
+                if victim is None or victim[0] <= rank:
+                    self.rejected += 1
+                    raise BuildRejected("queue full", self.retry_after())
+                self._heap.remove(victim)
+                heapq.heapify(self._heap)
+                self.evicted += 1
+                victim[4].set_exception(BuildRejected("evicted by a higher priority build", self.retry_after()))
+            heapq.heappush(self._heap, (rank, next(self._seq), time.monotonic(), fn, future))
+            self.submitted += 1
+            self._cond.notify()
+        return future
+
+    async def run(self, fn: Callable[[], Any], priority: str = "normal") -> Any:
+        """
+        Submit and await the result; raises BuildRejected if not admitted.
+        The caller waits on the event loop, not in a thread, so a saturated
+        queue cannot also exhaust the threadpool and delay the 429 of the next
+        request.
+        """
+        return await asyncio.wrap_future(self.submit(fn, priority))
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                _, _, enqueued_at, fn, future = heapq.heappop(self._heap)
+                waited = time.monotonic() - enqueued_at
+                self._waits.append(waited)
+                if waited > self.max_wait:
+                    self.expired += 1
+                    future.set_exception(BuildRejected("waited too long in queue", self.retry_after()))
+                    continue
+                self.running += 1
+            if not future.set_running_or_notify_cancel():
+                with self._cond:
+                    self.running -= 1
+                continue
+            started = time.monotonic()
+            try:
+                future.set_result(fn())
+                ok = True
+            except BaseException as e:
+                future.set_exception(e)
+                ok = False
+            duration = time.monotonic() - started
+            with self._cond:
+                self.running -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._avg_build_seconds = duration if self._avg_build_seconds is None else 0.8 * self._avg_build_seconds + 0.2 * duration
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            depth = {name: sum(1 for e in self._heap if e[0] == rank) for name, rank in PRIORITIES.items()}
+
+            def pct(p):
+                return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3) if waits else None
+
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": len(self._heap),
+                "queued_by_priority": depth,
+                "max_queued": self.max_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+                "expired": self.expired,
+                "wait_seconds": {"p50": pct(0.5), "p95": pct(0.95), "max": round(waits[-1], 3) if waits else None},
+                "avg_build_seconds": round(self._avg_build_seconds, 3) if self._avg_build_seconds is not None else None,
+                "retry_after": self.retry_after(),
+            }
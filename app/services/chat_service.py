@@ -1,19 +1,41 @@
+import asyncio
+import hashlib
+import logging
+import time
+
 from app.services.llm_service import LLMService
 from app.services.guards.prompt_guard_service import PromptGuardService
 from app.services.pipeline_builder_service import PipelineBuilderService
+from app.services.single_flight import SingleFlight
+from app.services.build_queue import BuildQueue
+from app.services.tracing import tracer
 
 class ChatService:
     def __init__(self):
         self.llm_service = LLMService()
         self.prompt_guard_service = PromptGuardService()
         self.pipeline_builder_service = PipelineBuilderService()
+        self.log = logging.getLogger(__name__)
+        # Concurrent identical prompts share one build
+        self.build_flight = SingleFlight()
+        # Bounded number of concurrent builds; excess requests queue by priority or are rejected
+        self.build_queue = BuildQueue()
 
-    def process_message(self, raw_message: str) -> dict:
+    async def process_message(self, raw_message: str, priority: str = "normal") -> dict:
         """
         Process the user message, validate it, and get a response from the LLM.
+        Raises BuildRejected when the build queue cannot admit the request.
         """
-        # Step 1: Analyze and validate user input
-        analysis = self.prompt_guard_service.analyze(raw_message)
+        with tracer.span("chat.process_message", priority=priority, message_chars=len(raw_message)) as span:
+            result = await self._process_message(raw_message, priority)
+            span.set(decision=result["decision"])
+            return result
+
+    async def _process_message(self, raw_message: str, priority: str) -> dict:
+        # Step 1: Analyze and validate user input (large prompts take a few ms, keep them off the loop)
+        with tracer.span("guard.analyze") as span:
+            analysis = await asyncio.to_thread(self.prompt_guard_service.analyze, raw_message)
+            span.set(decision=analysis["decision"], findings=len(analysis["findings"]))
 
         if analysis["decision"] == "block":
             return {
@@ -37,7 +59,7 @@ class ChatService:
                 }
 
         # Step 2: Generate pipeline 
-        build_result = self.pipeline_builder_service.build_pipeline(analysis["cleaned"])
+        build_result = await self.build_pipeline(analysis["cleaned"], priority)
 
         # Step 4: Sanitize the LLM response for display
         # sanitized_response = self.prompt_guard_service.sanitize_for_display(llm_response)
@@ -46,3 +68,36 @@ class ChatService:
             "decision": "allow",
             "response": build_result
         }
+
+    async def build_pipeline(self, cleaned: str, priority: str = "normal") -> dict:
+        """
+        Build a pipeline for the cleaned prompt. Identical prompts that arrive while
+        a build is in flight wait for that build and get its result; only the first
+        one takes a slot in the build queue. Waiting is done on the event loop, so
+        neither queued nor coalesced requests hold a thread.
+        """
+        key = hashlib.sha256(" ".join(cleaned.split()).encode("utf-8", "surrogatepass")).hexdigest()
+        with tracer.span("chat.build", build_key=key[:12]) as span:
+            future, shared = self.build_flight.submit(key, lambda: self.build_queue.submit(self._queued_build(cleaned), priority))
+            span.set(coalesced=shared)
+            # Shielded: a client disconnecting must not cancel a build other requests share
+            build_result = await asyncio.shield(asyncio.wrap_future(future))
+        if shared:
+            self.log.info(f"Coalesced request onto in-flight build {key[:12]}")
+        return build_result
+
+    def _queued_build(self, cleaned: str):
+        submitted_ns = time.time_ns()
+
+        def build():
+            tracer.record_span("build_queue.wait", submitted_ns)
+            return self.pipeline_builder_service.build_pipeline(cleaned)
+
+        return build
+
+    def metrics(self) -> dict:
+        return {
+            "builds": self.build_flight.stats(),
+            "queue": self.build_queue.stats(),
+            "guard_cache": self.prompt_guard_service.cache_stats(),
+        }
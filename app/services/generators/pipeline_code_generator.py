@@ -1,8 +1,11 @@
-import json
-import os
+import logging
 import re
-from urllib import response
+import textwrap
 from app.services.llm_service import LLMService
+from app.services.generators.prompt_builder import CodePromptBuilder, instruction_prefix
+from app.services.source.s3_object_service import parse_s3_path
+from app.services.source.sqlite_service import parse_sqlite_path
+from app.services.tracing import tracer
 
 ALLOWED_PACKAGES = [
     "pandas>=2.0.0",
@@ -17,6 +20,8 @@ class PipelineCodeGenerator:
     """
     def __init__(self):
         self.llm = LLMService()
+        self.log = logging.getLogger(__name__)
+        self.prompt_builder = CodePromptBuilder()
 
     def generate_code(self, spec: dict, data_preview: dict, last_code: str = None, last_error: str = None, python_test: str = None) -> str:
         """
@@ -31,57 +36,25 @@ class PipelineCodeGenerator:
 
         pipeline_name = spec.get("pipeline_name")
 
-        # Construct the prompt for the LLM
-        # Todo: improve the file path handling
-        prompt = f"""
-            Use Python 3.13 and best practices to generate the code.
-            The allowed packages are: {', '.join(ALLOWED_PACKAGES)}.
-
-            Given the following pipeline specification:
-            {json.dumps(spec, indent=2)}
-
-            And the following data preview:
-            {json.dumps(data_preview, indent=2)}
-
-            All generated files—the main code (`{pipeline_name}.py`), the requirements file (`requirements.txt`), and the unit test (`{pipeline_name}_test.py`)—should be placed in the same folder: `../pipelines/{pipeline_name}/`.
-            In the unit test, import functions from `{pipeline_name}` (e.g., `from {pipeline_name} import ...`).
-
-            The ETL pipeline must ingest all available data from the source files, regardless of the number of records or partitions.
-            If partitioning Parquet files, use a strategy that avoids exceeding system limits (e.g., group by year or month if there are too many unique dates, or write without partitioning if necessary).
-
-            The input data files path should be loaded from a .env file using the variable DATA_ROUTE. In the generated code, use:
-
-            from dotenv import load_dotenv
-            import os
-            load_dotenv()
-            DATA_FOLDER = os.getenv('DATA_FOLDER')
-
-            Use DATA_FOLDER as the path for input data files in all relevant code.
-
-            Ensure the DataFrame has a 'date' column. If not, add today's date.
-
-            All output files generated by the pipeline must be saved to the output folder inside the pipeline directory: '../pipelines/{pipeline_name}/output/'.
-            Make sure this folder exists before writing output files.
-
-            Generate Python code to perform the specified transformations and load the data into the destination.
-            Also, generate a requirements.txt listing all necessary Python packages.
-            Additionally, generate a small unit test (using pytest) that verifies the output of the main transformation function to ensure it works correctly. The unit test should be returned as a third code block (```python test ... ```).
-            Return only three code blocks: one with Python code (```python ... ```), one with requirements.txt (```requirements.txt ... ```), and one with the unit test (```python test ... ```).
-            Do not include explanations or extra text.
-            """
-        
-        if last_code and last_error:
-            prompt += f"""
-            The last generated code had the following error when executed:
-            {last_error}
-
-            Here is the last generated code:
-            {last_code}
-            This is the test code:
-            {python_test}
-
-            Please fix the code to resolve the error.
-            """
+        # Fixed instructions first so the provider can reuse its cached prefix,
+        # then the pipeline-specific parts in compact form
+        pipeline_instructions = "\n".join(part for part in (
+            f"The pipeline name is `{pipeline_name}`: write `../pipelines/{pipeline_name}/{pipeline_name}.py`, "
+            f"`../pipelines/{pipeline_name}/requirements.txt` and `../pipelines/{pipeline_name}/{pipeline_name}_test.py`, "
+            f"and save outputs under `../pipelines/{pipeline_name}/output/`.",
+            self.execution_instructions(spec),
+            self.source_instructions(spec),
+            self.destination_instructions(spec),
+        ) if part)
+        fix_request = self.prompt_builder.fix_request(last_code, last_error, python_test) if last_code and last_error else ""
+        prompt, tokens = self.prompt_builder.build(
+            instruction_prefix(tuple(ALLOWED_PACKAGES)), spec, data_preview, pipeline_instructions, fix_request
+        )
+        self.log.info(f"Code generation prompt for {pipeline_name}: {tokens['total']} tokens "
+                      f"(cached prefix {tokens['prefix']}, preview {tokens['preview']}, budget {tokens['budget']})")
+        tracer.set_attributes(prompt_tokens=tokens["total"], prefix_tokens=tokens["prefix"], preview_tokens=tokens["preview"])
+        if tokens["total"] > tokens["budget"]:
+            self.log.warning(f"Code generation prompt for {pipeline_name} is over budget; the spec or last error alone exceeds it.")
 
         response = self.llm.response_create(
             model="gpt-4.1",
@@ -98,6 +71,50 @@ class PipelineCodeGenerator:
 
         return python_code, requirements, python_test
 
+    def execution_instructions(self, spec: dict) -> str:
+        # Chunked (out-of-core) mode when the spec declares a memory budget
+        budget = spec.get("memory_budget_mb")
+        if not budget:
+            return ""
+        return textwrap.dedent(f"""
+            The pipeline runs under a memory budget of {budget} MB and the input can be much larger than that, so it must never load all data into one DataFrame.
+            Process the input in bounded batches with generators: `pd.read_csv(..., chunksize=...)`, `pd.read_json(..., lines=True, chunksize=...)` or `pyarrow.parquet.ParquetFile.iter_batches(...)`, one file at a time.
+            Transform each batch independently and write it out incrementally (append to CSV, or `pyarrow.parquet.ParquetWriter` / one part file per batch for Parquet).
+            Aggregations must be computed incrementally (combine partial results per batch); do not concatenate batches or call `pd.concat` on the whole dataset.
+            Pick the chunk size so that a batch plus its transformed copy stays well below {budget} MB.
+            """).strip()
+
+    def source_instructions(self, spec: dict) -> str:
+        # Extra prompt text for sources that are not plain local files
+        if spec.get("source_type") == "s3Object":
+            _, key = parse_s3_path(spec.get("source_path", ""), "")
+            return textwrap.dedent(f"""
+            The source is an object in S3-compatible storage. DATA_FOLDER is a pyarrow filesystem URI: either an s3:// URI or an absolute local directory holding a cached copy with the same layout.
+            Open it with `fs, base = pyarrow.fs.FileSystem.from_uri(DATA_FOLDER)` and read the object at `f"{{base}}/{key}"` through `fs.open_input_file(...)`.
+            For Parquet use `pyarrow.parquet.ParquetFile` on that file and read only the needed columns/row groups instead of downloading the whole object.
+            """).strip()
+        if spec.get("source_type") == "sqlLite":
+            db_path, table = parse_sqlite_path(spec.get("source_path", ""))
+            db_path = db_path.lstrip("./")
+            if db_path.startswith("data/"):
+                db_path = db_path[5:]
+            return textwrap.dedent(f"""
+            The source is the SQLite table `{table}` in the database file `os.path.join(DATA_FOLDER, "{db_path}")`.
+            Read it with the standard library `sqlite3` module and `pd.read_sql_query(..., chunksize=...)`, selecting only the needed columns.
+            """).strip()
+        return ""
+
+    def destination_instructions(self, spec: dict) -> str:
+        # Write path for SQLite destinations: batched executemany, not row-by-row inserts
+        if spec.get("destination_type") == "sqlLite":
+            return textwrap.dedent(f"""
+            The destination is the SQLite table `{spec.get("destination_name")}` in the database file given by `os.getenv('SQLITE_DB_PATH')`; create its folder and the table if missing.
+            Use the standard library `sqlite3` module: run `PRAGMA journal_mode=WAL` and `PRAGMA synchronous=NORMAL` once on the connection, and open a single connection for the whole run.
+            Insert with `cursor.executemany(...)` in batches of `int(os.getenv('SQLITE_BATCH_SIZE', '10000'))` rows, each batch in its own transaction (`BEGIN` ... `COMMIT`); never insert row by row and do not use `DataFrame.to_sql`.
+            Convert each batch to plain Python values column by column (`series.tolist()` per column, NaN to None, timestamps to ISO strings) and `zip(*columns)` them into rows; `DataFrame.astype(object)` or per-value conversion is slower than the insert itself.
+            """).strip()
+        return ""
+
     def extract_code_block(self, llm_response: str, block_type: str) -> str:
         # Extract code between triple backticks with block_type
         pattern = rf"```{block_type}(.*?)```"
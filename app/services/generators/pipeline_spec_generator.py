@@ -1,5 +1,8 @@
 import json
+import os
 from app.services.llm_service import LLMService
+from app.services.generators.prompt_builder import count_tokens
+from app.services.tracing import tracer
 import datetime
 
 
@@ -13,11 +16,11 @@ ETL_SPEC_SCHEMA = {
         "source_type": {
             "type": "string",
             "description": "The source of the data this will be a file path, database connection string, API endpoint, etc.",
-            "enum": ["localFileCSV","localFileJSON",  "PostgreSQL", "api"],
+            "enum": ["localFileCSV","localFileJSON", "s3Object", "sqlLite", "PostgreSQL", "api"],
         },
         "source_path": {
             "type": "string",
-            "description": "The path to the source file (if source is localFile)",
+            "description": "The path to the source file (if source is localFile), the object key / s3://bucket/key (if source is s3Object), or <database file>::<table> (if source is sqlLite)",
         },
         "destination_type": {
             "type": "string",
@@ -35,9 +38,13 @@ ETL_SPEC_SCHEMA = {
         "schedule": {
             "type": "string",
             "description": "Cron schedule for the pipeline",
+        },
+        "memory_budget_mb": {
+            "type": ["integer", "null"],
+            "description": "Memory budget in MB for a pipeline run. When set the pipeline must process its input in chunks (out-of-core); null if not requested",
         }
     },
-    "required": ["pipeline_name", "source_type", "source_path", "destination_type", "destination_name", "transformation", "schedule"],
+    "required": ["pipeline_name", "source_type", "source_path", "destination_type", "destination_name", "transformation", "schedule", "memory_budget_mb"],
     "additionalProperties": False,
 }
 
@@ -56,9 +63,11 @@ class PipelineSpecGenerator:
         Returns:
             dict: A dictionary representing the pipeline specification.
         """
+        prompt = f"Generate a pipeline spec for: {user_input}"
+        tracer.set_attributes(prompt_tokens=count_tokens(prompt))
         response = self.llm.response_create(
             model = "gpt-4.1",
-            input = f"Generate a pipeline spec for: {user_input}",
+            input = prompt,
             temperature = 0,
             text={
                 "format": {
@@ -72,7 +81,9 @@ class PipelineSpecGenerator:
         spec = json.loads(response.output_text)
 
         date_str = datetime.datetime.now().strftime('%Y%m%d_%H%M')
-        # Append date to pipeline_name
+        # Append date and a random suffix to pipeline_name: builds run concurrently, and two
+        # prompts with the same base name in the same minute must not share a folder,
+        # registry entry or scheduler job
         if 'pipeline_name' in spec:
-            spec['pipeline_name'] = f"{spec['pipeline_name']}_{date_str}"
+            spec['pipeline_name'] = f"{spec['pipeline_name']}_{date_str}_{os.urandom(3).hex()}"
         return spec
@@ -0,0 +1,218 @@
+import json
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+# gpt-4.1 / gpt-4o tokenizer, used when tiktoken is installed
+TIKTOKEN_ENCODING = "o200k_base"
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+DATE_COLUMN_RE = re.compile(r"date|time|_at$|_on$|day|month|year", re.IGNORECASE)
+# Keep at least this many sample rows before dropping columns
+MIN_PREVIEW_ROWS = 2
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    except Exception:
+        # Not installed, or the encoding file cannot be fetched (offline)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local token count. Exact with tiktoken; otherwise an estimate that counts
+    words and punctuation, with long words costing one token per ~4 characters,
+    which slightly over-counts BPE tokenizers and so errs on the safe side.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(t) / 4) if len(t) > 4 else 1 for t in _TOKEN_RE.findall(text))
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def truncate_value(value, max_chars: int):
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + f"…(+{len(value) - max_chars} chars)"
+    if isinstance(value, (dict, list)):
+        text = compact_json(value)
+        if len(text) > max_chars:
+            return text[:max_chars] + f"…(+{len(text) - max_chars} chars)"
+    return value
+
+
+def _type_name(values: list) -> str:
+    for value in values:
+        if value is not None:
+            return type(value).__name__
+    return "null"
+
+
+class CodePromptBuilder:
+    """
+    Builds the code generation prompt within a token budget.
+
+    The fixed instructions come first and are identical for every pipeline, so
+    the provider's automatic prompt caching (exact prefix match) can reuse them;
+    everything pipeline-specific goes after them. The spec and data preview are
+    serialized as compact JSON, the preview column-wise (keys once, not per row),
+    with long cells truncated. When the preview does not fit, rows are dropped
+    first and then the least representative columns: columns named in the spec,
+    date-like columns and one column per value type are kept first.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, preview_max_tokens: Optional[int] = None,
+                 max_cell_chars: Optional[int] = None, max_error_chars: Optional[int] = None):
+        self.max_tokens = max_tokens or int(os.getenv("CODEGEN_PROMPT_MAX_TOKENS", "8000"))
+        self.preview_max_tokens = preview_max_tokens or int(os.getenv("CODEGEN_PREVIEW_MAX_TOKENS", "2500"))
+        self.max_cell_chars = max_cell_chars or int(os.getenv("CODEGEN_MAX_CELL_CHARS", "64"))
+        self.max_error_chars = max_error_chars or int(os.getenv("CODEGEN_MAX_ERROR_CHARS", "4000"))
+
+    # --- preview ---
+
+    def representative_columns(self, columns: list, samples: dict, spec: dict) -> list:
+        """All columns ordered by how much the model needs to see their values."""
+        spec_text = " ".join(str(spec.get(k) or "") for k in ("transformation", "destination_name", "source_path")).lower()
+        mentioned = [c for c in columns if re.search(rf"(?<!\w){re.escape(str(c).lower())}(?!\w)", spec_text)]
+        dates = [c for c in columns if DATE_COLUMN_RE.search(str(c))]
+        seen_types, by_type = set(), []
+        for column in columns:
+            type_name = _type_name(samples[column])
+            if type_name not in seen_types:
+                seen_types.add(type_name)
+                by_type.append(column)
+        return list(dict.fromkeys([*mentioned, *dates, *by_type, *columns]))
+
+    def render_preview(self, columns: list, samples: dict, keep: list, nrows: int, all_types: bool) -> str:
+        keep = set(keep)
+        kept = [c for c in columns if c in keep]
+        payload = {
+            "columns": kept,
+            "rows": [[samples[c][i] for c in kept] for i in range(nrows)],
+        }
+        omitted = [c for c in columns if c not in keep]
+        if omitted:
+            if all_types:
+                payload["other_columns"] = {c: _type_name(samples[c]) for c in omitted}
+            else:
+                payload["other_columns_count"] = len(omitted)
+        return compact_json(payload)
+
+    def compact_preview(self, data_preview: list, spec: dict, max_tokens: Optional[int] = None) -> str:
+        max_tokens = max_tokens or self.preview_max_tokens
+        if not data_preview:
+            return "[]"
+        columns = list(dict.fromkeys(c for row in data_preview for c in row))
+        samples = {c: [truncate_value(row.get(c), self.max_cell_chars) for row in data_preview] for c in columns}
+        total_rows = len(data_preview)
+
+        text = self.render_preview(columns, samples, columns, total_rows, True)
+        if count_tokens(text) <= max_tokens:
+            return text
+
+        # Fewer rows, all columns
+        for nrows in range(total_rows - 1, MIN_PREVIEW_ROWS - 1, -1):
+            text = self.render_preview(columns, samples, columns, nrows, True)
+            if count_tokens(text) <= max_tokens:
+                return text
+
+        # Fewest rows, largest prefix of the representative order that fits
+        ordered = self.representative_columns(columns, samples, spec)
+        nrows = min(total_rows, MIN_PREVIEW_ROWS)
+        for all_types in (True, False):
+            lo, hi, best = 1, len(ordered), None
+            while lo <= hi:
+                mid = (lo + hi) // 2
+                candidate = self.render_preview(columns, samples, ordered[:mid], nrows, all_types)
+                if count_tokens(candidate) <= max_tokens:
+                    best, lo = candidate, mid + 1
+                else:
+                    hi = mid - 1
+            if best is not None:
+                return best
+        return self.render_preview(columns, samples, ordered[:1], 1, False)
+
+    # --- prompt ---
+
+    def build(self, prefix: str, spec: dict, data_preview: list, pipeline_instructions: str, fix_request: str = "") -> tuple:
+        """Returns (prompt, token counts). `prefix` is the cached instruction_prefix()."""
+        spec_text = compact_json(spec)
+        body_fixed = (
+            f"{pipeline_instructions}\n"
+            f"Pipeline specification:\n{spec_text}\n"
+        )
+        fix_request = fix_request or ""
+        fixed_tokens = count_tokens(prefix) + count_tokens(body_fixed) + count_tokens(fix_request)
+        # The preview gets what is left, never more than its own cap
+        preview_budget = max(min(self.preview_max_tokens, self.max_tokens - fixed_tokens - 50), 100)
+        preview = self.compact_preview(data_preview, spec, preview_budget)
+        prompt = f"{prefix}\n{body_fixed}Data preview (column-wise, long values truncated):\n{preview}\n{fix_request}"
+        counts = {
+            "total": count_tokens(prompt),
+            "prefix": count_tokens(prefix),
+            "preview": count_tokens(preview),
+            "budget": self.max_tokens,
+        }
+        return prompt, counts
+
+    def fix_request(self, last_code: str, last_error: str, python_test: str) -> str:
+        error = last_error or ""
+        if len(error) > self.max_error_chars:
+            # The end of a traceback carries the actual failure
+            error = "…" + error[-self.max_error_chars:]
+        return (
+            "The last generated code had the following error when executed:\n"
+            f"{error}\n\n"
+            f"Here is the last generated code:\n{last_code}\n"
+            f"This is the test code:\n{python_test}\n\n"
+            "Please fix the code to resolve the error.\n"
+        )
+
+
+@lru_cache(maxsize=4)
+def instruction_prefix(allowed_packages: tuple) -> str:
+    """
+    Fixed instructions shared by every code generation call. Built once; it must
+    not contain anything pipeline-specific or the provider cache cannot reuse it.
+    """
+    return f"""Use Python 3.13 and best practices to generate the code.
+The allowed packages are: {', '.join(allowed_packages)}.
+
+You will be given a pipeline specification, pipeline-specific instructions and a data preview.
+The data preview is JSON with "columns" and sample "rows" (one list per row, in column order); "other_columns" lists further columns whose values were left out, with their types. String values ending in "…(+N chars)" were truncated for the preview only.
+
+All generated files (the main code `<pipeline_name>.py`, the requirements file `requirements.txt` and the unit test `<pipeline_name>_test.py`) are placed in the same folder: `../pipelines/<pipeline_name>/`.
+In the unit test, import functions from `<pipeline_name>` (e.g., `from <pipeline_name> import ...`).
+
+The ETL pipeline must ingest all available data from the source files, regardless of the number of records or partitions.
+If partitioning Parquet files, use a strategy that avoids exceeding system limits (e.g., group by year or month if there are too many unique dates, or write without partitioning if necessary).
+
+The input data files path should be loaded from a .env file using the variable DATA_ROUTE. In the generated code, use:
+
+from dotenv import load_dotenv
+import os
+load_dotenv()
+DATA_FOLDER = os.getenv('DATA_FOLDER')
+
+Use DATA_FOLDER as the path for input data files in all relevant code.
+
+Ensure the DataFrame has a 'date' column. If not, add today's date.
+
+All output files generated by the pipeline must be saved to the output folder inside the pipeline directory: '../pipelines/<pipeline_name>/output/'.
+Make sure this folder exists before writing output files.
+When the pipeline finishes, print a single line `PIPELINE_ROWS=<n>` to stdout, where <n> is the number of rows written to the destination.
+
+Generate Python code to perform the specified transformations and load the data into the destination.
+Also, generate a requirements.txt listing all necessary Python packages.
+Additionally, generate a small unit test (using pytest) that verifies the output of the main transformation function to ensure it works correctly. The unit test should be returned as a third code block (```python test ... ```).
+Return only three code blocks: one with Python code (```python ... ```), one with requirements.txt (```requirements.txt ... ```), and one with the unit test (```python test ... ```).
+Do not include explanations or extra text.
+"""
@@ -0,0 +1,93 @@
+# pattern_scanner.py
+"""
+Multi-pattern scanner used by PromptGuardService.
+
+Python's `re` has no multi-pattern automaton, and folding every rule into one
+alternation would change the per-rule (non-overlapping) counts. Instead each
+rule declares literals that any of its matches must contain. The text is case
+folded once and checked for those literals with plain substring search, and only
+rules that can possibly match are run, counting hits without materialising spans.
+"""
+import re
+import string
+import sys
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+@lru_cache(maxsize=1)
+def _ascii_fold_table() -> dict:
+    """
+    Non-ASCII characters `re.IGNORECASE` treats as equal to an ASCII letter
+    (e.g. "ı" ~ "i", "ſ" ~ "s"), mapped to that letter. Computed once, on the
+    first non-ASCII input.
+    """
+    letter = re.compile(r"[a-z]", re.IGNORECASE)
+    table = {}
+    for cp in range(0x80, sys.maxunicode + 1):
+        ch = chr(cp)
+        if letter.fullmatch(ch):
+            table[cp] = next(c for c in string.ascii_lowercase if re.fullmatch(c, ch, re.IGNORECASE))
+    return table
+
+
+def casefold_for_literals(text: str) -> str:
+    """
+    Lower-case `text` so that a case-insensitive regex literal can only match
+    where the lowered literal is a substring of the result.
+    """
+    if text.isascii():
+        return text.lower()
+    table = _ascii_fold_table()
+    if any(chr(cp) in text for cp in table):
+        text = text.translate(table)
+    return text.lower()
+
+
+class PatternScanner:
+    def __init__(self, patterns: List[Tuple[str, re.Pattern, str]], triggers: Optional[Dict[str, Iterable[str]]] = None):
+        self.patterns = patterns
+        triggers = triggers or {}
+        # rule -> (ignorecase, literals), ignorecase taken from the rule so the
+        # prefilter has the same case semantics as the rule itself
+        self.triggers: Dict[str, Tuple[bool, Tuple[str, ...]]] = {}
+        for key, rx, _ in patterns:
+            lits = tuple(triggers.get(key) or ())
+            if not lits:
+                continue
+            ignorecase = bool(rx.flags & re.IGNORECASE)
+            self.triggers[key] = (ignorecase, tuple(lit.lower() for lit in lits) if ignorecase else lits)
+
+    def candidates(self, text: str) -> set:
+        """Rules that may match `text`. Rules without declared literals are always included."""
+        folded = None
+        found = set()
+        for key, _, _ in self.patterns:
+            if key not in self.triggers:
+                found.add(key)
+                continue
+            ignorecase, lits = self.triggers[key]
+            if ignorecase:
+                if folded is None:
+                    folded = casefold_for_literals(text)
+                haystack = folded
+            else:
+                haystack = text
+            if any(lit in haystack for lit in lits):
+                found.add(key)
+        return found
+
+    def scan(self, text: str) -> List[Tuple[str, int, str]]:
+        """
+        Return (rule, count, description) for every rule with at least one hit,
+        in the order of `patterns`.
+        """
+        candidates = self.candidates(text)
+        results = []
+        for key, rx, desc in self.patterns:
+            if key not in candidates:
+                continue
+            count = sum(1 for _ in rx.finditer(text))
+            if count:
+                results.append((key, count, desc))
+        return results
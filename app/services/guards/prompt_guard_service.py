@@ -5,9 +5,18 @@ Service for sanitation, guardrails, and validation of user input and LLM output.
 from typing import Any
 
 # app/service.py
+import hashlib
+import json
+import os
 import re
+import sys
+import threading
 import unicodedata
-from typing import Dict, List, Tuple
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.services.guards.pattern_scanner import PatternScanner
 
 # --- Normalization / Cleaning ---
 
@@ -26,31 +35,39 @@ ZERO_WIDTH = {
     "\uFEFF",  # BOM
 }
 
+_BIDI_ZERO_WIDTH = frozenset(BIDI_CHARS | ZERO_WIDTH)
+
+# ASCII control characters (category Cc) except newline and tab
+_ASCII_CONTROL_TABLE = {i: None for i in [*range(0x00, 0x20), 0x7F] if chr(i) not in ("\n", "\t")}
+
 def _normalize_nfkc(s: str) -> str:
     return unicodedata.normalize("NFKC", s)
 
+def _removal_table(chars) -> dict:
+    # Classify each distinct character once instead of every position
+    return {
+        ord(ch): None
+        for ch in chars
+        if ch in _BIDI_ZERO_WIDTH
+        or (ch not in ("\n", "\t") and unicodedata.category(ch).startswith("C"))  # control/format/surrogate
+    }
+
 def _strip_control_chars(s: str) -> str:
-    out = []
-    for ch in s:
-        cat = unicodedata.category(ch)
-        if ch in ("\n", "\t"):
-            out.append(ch)
-        elif cat.startswith("C"):  # control/format/surrogate
-            continue
-        else:
-            out.append(ch)
-    return "".join(out)
+    table = _removal_table(set(s))
+    return s.translate(table) if table else s
 
 def _remove_bidi_zero_width(s: str) -> str:
-    for ch in BIDI_CHARS.union(ZERO_WIDTH):
-        s = s.replace(ch, "")
-    return s
+    table = {ord(ch): None for ch in _BIDI_ZERO_WIDTH if ch in s}
+    return s.translate(table) if table else s
 
 def basic_clean(s: str) -> str:
+    if s.isascii():
+        # NFKC is the identity on ASCII and there are no bidi/zero-width chars
+        return s.translate(_ASCII_CONTROL_TABLE)
     s = _normalize_nfkc(s)
-    s = _remove_bidi_zero_width(s)
-    s = _strip_control_chars(s)
-    return s
+    # Bidi/zero-width characters are category Cf, so one table removes both
+    table = _removal_table(set(s))
+    return s.translate(table) if table else s
 
 # --- Detection rules ---
 
@@ -88,28 +105,134 @@ SEVERITY = {
     "injection_system": "medium",
 }
 
+# Literals that every match of a rule must contain (matched with the rule's own
+# case sensitivity). Lets the scanner skip rules that cannot match. Keep in sync
+# with PATTERNS; a rule without an entry is always run.
+TRIGGERS = {
+    "code_block": ("```",),
+    "python_import": ("import", "from"),
+    "dangerous_python": ("eval", "exec", "__import__", "open(", "compile(", "input("),
+    "shell_cmd": ("!", "%", "sh", "$(", "`"),
+    "subprocess": ("subprocess.",),
+    "os_cmd": ("os.",),
+    "sql_keywords": ("select", "insert", "update", "delete", "drop", "alter", "union", "--", ";"),
+    "powershell": ("invoke-expression", "new-object"),
+    "injection_english": ("ignore", "bypass", "override", "disregard"),
+    "injection_system": ("prompt", "you are now"),
+    "injection_hebrew": ("התעלם", "תתעלם", "עוקף", "בטל"),
+    "urls": ("://",),
+    "markdown_links": ("](",),
+    "attachments_hint": ("base64", "data:"),
+}
+
+RISK_WEIGHTS = {"low": 1, "medium": 3, "high": 6}
+BLOCK_SCORE = 8
+REVIEW_SCORE = 3
+
+def rules_version() -> str:
+    """
+    Fingerprint of everything that determines a verdict (patterns, prefilter
+    literals, severities, weights and thresholds). Changes whenever the rule set
+    changes.
+    """
+    material = {
+        "patterns": [(key, rx.pattern, rx.flags, desc) for key, rx, desc in PATTERNS],
+        # A wrong or missing literal changes which rules run, so it changes verdicts
+        "triggers": {key: list(lits) for key, lits in TRIGGERS.items()},
+        "severity": SEVERITY,
+        "weights": RISK_WEIGHTS,
+        "thresholds": [BLOCK_SCORE, REVIEW_SCORE],
+    }
+    blob = json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+# Rough per-entry cost of a cached verdict besides the cleaned text (key, dicts, findings)
+CACHE_ENTRY_OVERHEAD = 1024
+
 SAFE_CHARS_RE = re.compile(r"^[\n\t\r a-zA-Z0-9_\-.,:;!?()\"'@#/$%&*+=<>[\]{}|\\~`]+$")
 
 class PromptGuardService:
-    def __init__(self, allowlist_max_len: int = 2000):
+    def __init__(self, allowlist_max_len: int = 2000, cache_size: Optional[int] = None,
+                 cache_max_bytes: Optional[int] = None, cache_max_text_bytes: Optional[int] = None):
         self.allowlist_max_len = allowlist_max_len
+        self.scanner = PatternScanner(PATTERNS, TRIGGERS)
+        self.rules_version = rules_version()
+        # Bounded LRU of verdicts keyed by (rules version, hash of raw input),
+        # limited both by entry count and by approximate memory
+        self.cache_size = int(os.getenv("GUARD_CACHE_SIZE", "10000")) if cache_size is None else cache_size
+        self.cache_max_bytes = int(os.getenv("GUARD_CACHE_MAX_BYTES", str(64 * 1024 * 1024))) if cache_max_bytes is None else cache_max_bytes
+        # Cleaned text larger than this is not cached; a hit re-runs basic_clean instead
+        self.cache_max_text_bytes = int(os.getenv("GUARD_CACHE_MAX_TEXT_BYTES", str(64 * 1024))) if cache_max_text_bytes is None else cache_max_text_bytes
+        # key -> (verdict without original/cleaned, cleaned text or None, entry bytes)
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[Dict, Optional[str], int]]" = OrderedDict()
+        self._cache_bytes = 0
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
     def analyze(self, raw: str) -> Dict:
+        if self.cache_size <= 0 or self.cache_max_bytes <= 0:
+            return self._analyze(raw)
+
+        key = (self.rules_version, hashlib.blake2b(raw.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest())
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+        if cached is not None:
+            verdict, cleaned, _ = cached
+            if cleaned is None:
+                cleaned = raw if verdict["unchanged"] else basic_clean(raw)
+            return self._from_cache(verdict, raw, cleaned)
+
+        result = self._analyze(raw)
+        self._store(key, result)
+        return result
+
+    def _store(self, key: Tuple[str, str], result: Dict) -> None:
+        # Only the verdict is kept; the raw prompt never is, and the cleaned text
+        # only when it differs from the raw one and is small
+        raw, cleaned = result["original"], result["cleaned"]
+        verdict = {k: v for k, v in result.items() if k not in ("original", "cleaned")}
+        verdict["findings"] = [dict(f) for f in result["findings"]]
+        verdict["unchanged"] = cleaned == raw
+        keep = None
+        if not verdict["unchanged"] and sys.getsizeof(cleaned) <= self.cache_max_text_bytes:
+            keep = cleaned
+        nbytes = CACHE_ENTRY_OVERHEAD + (sys.getsizeof(keep) if keep is not None else 0)
+        with self._cache_lock:
+            self.cache_misses += 1
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= previous[2]
+            self._cache[key] = (verdict, keep, nbytes)
+            self._cache_bytes += nbytes
+            while len(self._cache) > self.cache_size or self._cache_bytes > self.cache_max_bytes:
+                _, (_, _, evicted_bytes) = self._cache.popitem(last=False)
+                self._cache_bytes -= evicted_bytes
+
+    @staticmethod
+    def _from_cache(verdict: Dict, raw: str, cleaned: str) -> Dict:
+        # Callers get their own findings so they cannot corrupt cached verdicts
+        result = {"original": raw, "cleaned": cleaned}
+        result.update((k, v) for k, v in verdict.items() if k != "unchanged")
+        result["findings"] = [dict(f) for f in verdict["findings"]]
+        return result
+
+    def _analyze(self, raw: str) -> Dict:
         cleaned = basic_clean(raw)
         findings = []
-        for key, rx, desc in PATTERNS:
-            hits = [(m.start(), m.end()) for m in rx.finditer(cleaned)]
-            if hits:
-                findings.append({
-                    "rule": key,
-                    "severity": SEVERITY.get(key, "low"),
-                    "count": len(hits),
-                    "description": desc,
-                })
-
-        weights = {"low": 1, "medium": 3, "high": 6}
-        score = sum(weights[f["severity"]] * f["count"] for f in findings)
-        decision = "block" if score >= 8 else "review" if score >= 3 else "allow"
+        for key, count, desc in self.scanner.scan(cleaned):
+            findings.append({
+                "rule": key,
+                "severity": SEVERITY.get(key, "low"),
+                "count": count,
+                "description": desc,
+            })
+
+        score = sum(RISK_WEIGHTS[f["severity"]] * f["count"] for f in findings)
+        decision = "block" if score >= BLOCK_SCORE else "review" if score >= REVIEW_SCORE else "allow"
 
         return {
             "original": raw,
@@ -117,8 +240,46 @@ class PromptGuardService:
             "findings": findings,
             "risk_score": score,
             "decision": decision,
+            "rules_version": self.rules_version,
         }
 
+    def analyze_batch(self, messages: Iterable[str], processes: Optional[int] = None, chunksize: int = 512) -> Iterator[Dict]:
+        """
+        Analyze a (possibly huge) stream of messages across worker processes,
+        yielding results in input order. Only a bounded number of chunks is in
+        flight at once, so the input is never fully materialised.
+        Bypasses the verdict cache: re-audits mostly see each message once.
+        """
+        processes = processes or os.cpu_count() or 1
+        chunks = _chunked(messages, chunksize)
+        if processes == 1:
+            for chunk in chunks:
+                yield from (self._analyze(m) for m in chunk)
+            return
+
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_batch_worker) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_analyze_chunk, chunk))
+                if len(pending) >= processes * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def cache_stats(self) -> Dict:
+        with self._cache_lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.cache_size,
+                "bytes": self._cache_bytes,
+                "max_bytes": self.cache_max_bytes,
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "rules_version": self.rules_version,
+            }
+
     def allowlist_only(self, cleaned: str) -> bool:
         if len(cleaned) > self.allowlist_max_len:
             return False
@@ -127,3 +288,24 @@ class PromptGuardService:
     @staticmethod
     def sanitize_for_display(cleaned: str) -> str:
         return cleaned.replace("<", "&lt;").replace(">", "&gt;")
+
+# --- Batch workers ---
+
+_batch_guard: Optional[PromptGuardService] = None
+
+def _init_batch_worker() -> None:
+    global _batch_guard
+    _batch_guard = PromptGuardService(cache_size=0)
+
+def _analyze_chunk(messages: List[str]) -> List[Dict]:
+    return [_batch_guard._analyze(m) for m in messages]
+
+def _chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
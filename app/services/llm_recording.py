@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Optional
+
+# Spec generation appends `_%Y%m%d_%H%M_<6 hex>` to pipeline names, so the same
+# request carries a different name on every run. Keys ignore it; replay swaps it
+# back in. The random part is optional so older recordings still match.
+PIPELINE_TIMESTAMP_RE = re.compile(r"_\d{8}_\d{4}(?:_[0-9a-f]{6})?(?![0-9a-z])")
+
+
+class LLMReplayMiss(KeyError):
+    """Replay mode got a request that was never recorded."""
+
+
+class ReplayResponse:
+    """The subset of an OpenAI Responses API response the generators use."""
+
+    def __init__(self, output_text: str):
+        self.output_text = output_text
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return PIPELINE_TIMESTAMP_RE.sub("_<ts>", value)
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(request: dict) -> str:
+    canonical = json.dumps(_normalize(request), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _first_timestamp(request: dict) -> Optional[str]:
+    match = PIPELINE_TIMESTAMP_RE.search(json.dumps(request, default=str))
+    return match.group(0) if match else None
+
+
+class LLMRecordingStore:
+    """
+    On-disk recordings of LLM calls, one JSON file per normalized request:
+    {"key", "request", "output_text", "latency_seconds", "recorded_at"}.
+    Replays are deterministic: the same request always gets the same text,
+    after a simulated latency (the recorded one times `latency_scale`, or a
+    fixed `latency_seconds`).
+    """
+
+    def __init__(self, directory: Optional[str] = None, latency_seconds: Optional[float] = None,
+                 latency_scale: Optional[float] = None):
+        self.directory = os.path.abspath(directory or os.getenv("LLM_RECORDINGS_DIR", "../llm_recordings"))
+        fixed = latency_seconds if latency_seconds is not None else os.getenv("LLM_REPLAY_LATENCY_SECONDS")
+        self.latency_seconds = float(fixed) if fixed not in (None, "") else None
+        self.latency_scale = latency_scale if latency_scale is not None else float(os.getenv("LLM_REPLAY_LATENCY_SCALE", "1.0"))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def save(self, request: dict, output_text: str, latency_seconds: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        key = request_key(request)
+        record = {
+            "key": key,
+            "request": request,
+            "output_text": output_text,
+            "latency_seconds": round(latency_seconds, 3),
+            "recorded_at": time.time(),
+        }
+        # Atomic write so a concurrent replay never reads half a file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(record, f, default=str)
+        os.replace(tmp, self.path(key))
+        return key
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def records(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name)) as f:
+                    yield json.load(f)
+
+    def replay(self, request: dict) -> ReplayResponse:
+        key = request_key(request)
+        record = self.load(key)
+        with self._lock:
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if record is None:
+            raise LLMReplayMiss(f"No recorded LLM response for request {key[:12]} in {self.directory}")
+
+        delay = self.latency_seconds if self.latency_seconds is not None else record.get("latency_seconds", 0) * self.latency_scale
+        if delay > 0:
+            time.sleep(delay)
+
+        output_text = record["output_text"]
+        recorded_ts, current_ts = _first_timestamp(record["request"]), _first_timestamp(request)
+        if recorded_ts and current_ts and recorded_ts != current_ts:
+            output_text = output_text.replace(recorded_ts, current_ts)
+        return ReplayResponse(output_text)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"directory": self.directory, "hits": self.hits, "misses": self.misses}
@@ -1,20 +1,47 @@
 # llm_service.py
 """
 Service for handling calls to OpenAI or other LLM providers.
+
+LLM_MODE selects the backend:
+- "live" (default): call the provider.
+- "record": call the provider and save every request/response to LLM_RECORDINGS_DIR.
+- "replay": serve saved responses only, with simulated latency; no network or key needed.
 """
 
+from functools import lru_cache
 from typing import Optional
 import os
+import time
 import openai
 
+from app.services.llm_recording import LLMRecordingStore
+
+LLM_MODES = ("live", "record", "replay")
+
+
+class LLMUnavailableError(RuntimeError):
+    """No provider is configured (or the provider call failed)."""
+
+
+@lru_cache(maxsize=1)
+def recording_store() -> LLMRecordingStore:
+    # Shared by every LLMService so hit/miss counts cover the whole process
+    return LLMRecordingStore()
+
+
 class LLMService:
-    def __init__(self, provider: str = "openai", api_key: Optional[str] = None, model: str = "gpt-3.5-turbo"):
+    def __init__(self, provider: str = "openai", api_key: Optional[str] = None, model: str = "gpt-3.5-turbo",
+                 mode: Optional[str] = None):
         self.provider = provider
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model
+        self.mode = mode or os.getenv("LLM_MODE", "live")
+        if self.mode not in LLM_MODES:
+            raise ValueError(f"LLM_MODE must be one of {LLM_MODES}, got {self.mode!r}")
+        self.store = recording_store() if self.mode != "live" else None
         self.client = None
 
-        if self.provider == "openai" and self.api_key:
+        if self.provider == "openai" and self.api_key and self.mode != "replay":
             try:
                 self.client = openai.Client(api_key=self.api_key)
             except Exception as e:
@@ -22,27 +49,29 @@ class LLMService:
                 self.client = None
 
     def generate_response(self, prompt: str) -> str:
-        if self.provider == "openai" and self.api_key:
-            try:
-                response =  self.client.responses.create(
-                    model=self.model,
-                    input=[{"role": "user", "content": prompt}]
-                )
-                return response.output_text
-            except Exception as e:
-                return f"OpenAI API error: {e}"
-        # Add other providers here as needed
-        return f"[LLM {self.provider}] Response to: {prompt}"
-    
+        response = self.response_create(model=self.model, input=[{"role": "user", "content": prompt}])
+        return response.output_text
+
 
    # basic response create wrapper for openai
-    def response_create(self, **kwargs) -> Optional[dict]:
-        if self.provider == "openai" and self.api_key:
-            try:
-                response =  self.client.responses.create(**kwargs)
-                return response
-            except Exception as e:
-                return f"OpenAI API error: {e}"
-        return None
-    
+    def response_create(self, **kwargs):
+        """
+        Returns an object with `output_text`. Raises LLMUnavailableError when no
+        provider is configured or the call fails, and LLMReplayMiss in replay mode
+        for a request that was never recorded.
+        """
+        if self.mode == "replay":
+            return self.store.replay(kwargs)
 
+        if self.provider != "openai" or self.client is None:
+            raise LLMUnavailableError(
+                f"LLM provider '{self.provider}' is not configured (set OPENAI_API_KEY, or LLM_MODE=replay for offline use)"
+            )
+        started = time.monotonic()
+        try:
+            response = self.client.responses.create(**kwargs)
+        except Exception as e:
+            raise LLMUnavailableError(f"OpenAI API error: {e}") from e
+        if self.mode == "record":
+            self.store.save(kwargs, response.output_text, time.monotonic() - started)
+        return response
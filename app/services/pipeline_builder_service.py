@@ -1,6 +1,11 @@
+import datetime
+import json
 import logging
+import os
+from contextlib import contextmanager
 import jsonschema
 import runpy
+from typing import Optional
 
 from app.services.generators.pipeline_code_generator import PipelineCodeGenerator
 from app.services.guards.prompt_guard_service import PromptGuardService
@@ -8,7 +13,14 @@ from app.services.llm_service import LLMService
 from app.services.generators.pipeline_spec_generator import PipelineSpecGenerator
 from app.services.generators.pipeline_spec_generator import ETL_SPEC_SCHEMA
 from app.services.source.local_file_service import LocalFileService
+from app.services.source.s3_object_service import S3ObjectService
+from app.services.source.sqlite_service import SQLiteService, parse_sqlite_path, SQLITE_EXTENSIONS
+from app.services.scheduler.cron import CronSchedule
+from app.services.scheduler.pipeline_scheduler_service import get_pipeline_scheduler, DEPLOYMENT_FILE
+from app.services.registry.pipeline_registry_service import get_pipeline_registry, schema_fingerprint, PipelineRegistryService
+from app.services.tracing import tracer
 from app.services.tests.test_pipline_service import TestPipelineService
+from app.services.tests.synthetic_data_service import SyntheticDataService
 
 class PipelineBuilderService:
     def __init__(self):
@@ -18,49 +30,111 @@ class PipelineBuilderService:
         self.llm = LLMService()
         self.spec_gen = PipelineSpecGenerator()
         self.local_file_service = LocalFileService()
+        try:
+            self.s3_object_service = S3ObjectService()
+        except Exception as e:
+            self.log.error(f"Error initializing S3 object service: {e}")
+            self.s3_object_service = None
+        self.sqlite_service = SQLiteService(data_directory=self.local_file_service.data_directory)
         self.code_gen = PipelineCodeGenerator()
         self.test_service = TestPipelineService(self.log)
+        self.synthetic_data_service = SyntheticDataService(self.log)
+        # Where pipeline folders are created (each one is <pipelines_dir>/<pipeline_name>)
+        self.pipelines_dir = os.path.abspath(os.getenv("PIPELINES_DIR", "../pipelines"))
+        # "venv" or "docker" (shared base image, see DockerRunnerService)
+        self.execution_mode = os.getenv("PIPELINE_EXECUTION_MODE", "venv")
+        # Synthetic input for the streaming check is this many times the memory budget
+        self.streaming_input_factor = float(os.getenv("STREAMING_CHECK_INPUT_FACTOR", "1.5"))
+        self.reuse_enabled = os.getenv("PIPELINE_REUSE_ENABLED", "true").lower() == "true"
         # Add other initializations as needed
 
+    @property
+    def registry(self) -> PipelineRegistryService:
+        return get_pipeline_registry()
+
     def build_pipeline(self, user_input: str) -> dict:
+        with tracer.span("build_pipeline", execution_mode=self.execution_mode) as span:
+            result = self._build_pipeline(user_input)
+            span.set(success=bool(result.get("success")), reused=bool(result.get("reused")), error=result.get("error"))
+            return result
+
+    def _build_pipeline(self, user_input: str) -> dict:
+        # 1. Reuse a verified pipeline built from the same prompt, skipping every LLM call
+        if self.reuse_enabled:
+            with tracer.span("registry.lookup_prompt") as span:
+                reused = self.find_reusable_by_prompt(user_input)
+                span.set(hit=reused is not None)
+            if reused:
+                return reused
+
         # 2. Generate JSON spec
         self.log.info("Generating pipeline specification...")
-        spec = self.spec_gen.generate_spec(user_input)
+        with tracer.span("spec.generate") as span:
+            spec = self.spec_gen.generate_spec(user_input)
+            span.set(pipeline_name=spec.get("pipeline_name"), source_type=spec.get("source_type"))
 
         # 3. Validate schema
         self.log.info("Validating pipeline specification schema...")
-        if not self.validate_spec_schema(spec):
+        with tracer.span("spec.validate"):
+            valid = self.validate_spec_schema(spec)
+        if not valid:
             self.log.error("Pipeline specification schema validation failed.")
             return {"error": "Spec schema validation failed."}
 
         # 4. Try connecting to source/destination
         self.log.info("Connecting to source/destination to validate access...")
-        db_info = self.connect_to_source(spec)
+        with tracer.span("source.connect", source_type=spec.get("source_type")) as span:
+            db_info = self.connect_to_source(spec)
+            span.set(success=bool(db_info.get("success")), preview_rows=len(db_info.get("data_preview") or []))
         if not db_info.get("success"):
             self.log.error("Source/Destination connection failed.")
             return {"error": "Source/Destination connection failed.", "details": db_info.get("details")}
+        fingerprint = schema_fingerprint(db_info.get("data_preview"))
+
+        # 4b. Reuse a verified pipeline with the same normalized spec and source schema
+        if self.reuse_enabled:
+            with tracer.span("registry.lookup_spec") as span:
+                existing = self.registry.find_verified(spec, fingerprint)
+                span.set(hit=existing is not None)
+            reused = self.reuse_result(existing) if existing else None
+            if reused:
+                self.log.info(f"Reusing verified pipeline {existing['name']} for an identical spec.")
+                self.registry.upsert_prompt(user_input, existing["name"])
+                return reused
 
         # 5-6. Generate pipeline code and run unit test, retry if unit test fails
         generate_attempts = 0
         code = None
         python_test = None
         last_error = None
+        attempt_metrics = []
         while True:
             generate_attempts += 1
 
             self.log.info("Generating pipeline code...")
-            code, requirements, python_test = self.code_gen.generate_code(spec,
-                                                                            db_info.get("data_preview"),
-                                                                            last_code=code,
-                                                                            last_error=last_error,
-                                                                            python_test=python_test
-                                                                            )
+            with tracer.span("code.generate", attempt=generate_attempts) as span:
+                code, requirements, python_test = self.code_gen.generate_code(spec,
+                                                                                db_info.get("data_preview"),
+                                                                                last_code=code,
+                                                                                last_error=last_error,
+                                                                                python_test=python_test
+                                                                                )
+                span.set(file_count=sum(1 for block in (code, requirements, python_test) if block))
             if not code:
                 self.log.error("Pipeline code generation failed.")
                 return {"error": "Pipeline code generation failed."}
 
             self.log.info("Creating and running unit tests...")
-            test_result = self.create_and_run_unittest(spec, code, requirements, python_test)
+            with tracer.span("unit_test", attempt=generate_attempts) as span:
+                test_result = self.create_and_run_unittest(spec, code, requirements, python_test)
+                span.set(success=bool(test_result.get("success")))
+            streaming_safe = None
+            if test_result.get("success") and spec.get("memory_budget_mb"):
+                self.log.info("Checking that the pipeline streams within its memory budget...")
+                with tracer.span("streaming_check", attempt=generate_attempts, memory_budget_mb=spec.get("memory_budget_mb")) as span:
+                    test_result, streaming_safe = self.run_streaming_check(spec, db_info.get("data_preview"), test_result)
+                    span.set(streaming_safe=streaming_safe)
+            attempt_metrics.append({"attempt": generate_attempts, "success": bool(test_result.get("success")), "streaming_safe": streaming_safe, **test_result.get("metrics", {})})
             if test_result.get("success"):
                 break
             else:
@@ -69,13 +143,17 @@ class PipelineBuilderService:
             # Optionally, add a retry limit to avoid infinite loops
             if generate_attempts > 3:
                 self.log.error("Max retry attempts reached.")
-                return {"error": "Max retry attempts reached."}
+                self.register_pipeline(spec, code, requirements, python_test, fingerprint, False, streaming_safe, attempt_metrics, user_input)
+                return {"error": "Max retry attempts reached.", "details": last_error, "metrics": attempt_metrics}
         self.log.info("Pipeline code generation and unit tests completed successfully. After %d attempts.", generate_attempts)
 
-        # # 7. Deploy
-        # deploy_result = self.deploy_pipeline(code)
-        # if not deploy_result.get("success"):
-        #     return {"error": "Deployment failed.", "details": deploy_result.get("details")}
+        # 7. Deploy
+        with tracer.span("deploy"):
+            deploy_result = self.deploy_pipeline(spec)
+        if not deploy_result.get("success"):
+            return {"error": "Deployment failed.", "details": deploy_result.get("details")}
+        with tracer.span("registry.register"):
+            self.register_pipeline(spec, code, requirements, python_test, fingerprint, True, streaming_safe, attempt_metrics, user_input)
 
         # # 8. E2E tests
         # e2e_result = self.run_e2e_tests(deploy_result)
@@ -87,15 +165,86 @@ class PipelineBuilderService:
             "spec": spec,
             "code": code,
             # "unit_test": test_result,
-            # "deployment": deploy_result,
+            "metrics": attempt_metrics,
+            "streaming_safe": streaming_safe,
+            "deployment": deploy_result,
             # "e2e_test": e2e_result
         }
 
+    def find_reusable_by_prompt(self, user_input: str):
+        existing = self.registry.find_by_prompt(user_input)
+        if not existing:
+            return None
+        # The source may have changed shape since; re-check it without the LLM
+        db_info = self.connect_to_source(existing["spec"])
+        if not db_info.get("success") or schema_fingerprint(db_info.get("data_preview")) != existing["schema_fingerprint"]:
+            self.log.info(f"Source schema of {existing['name']} changed, building a new pipeline.")
+            return None
+        reused = self.reuse_result(existing)
+        if reused:
+            self.log.info(f"Reusing verified pipeline {existing['name']} built from the same prompt.")
+        return reused
+
+    def reuse_result(self, existing: dict) -> Optional[dict]:
+        """
+        Result for a registered pipeline, or None when its folder, code or
+        deployment is gone (deleted or never deployed) so it is built again.
+        A deployment on disk that the scheduler does not know is scheduled again.
+        """
+        name = existing["name"]
+        folder = existing.get("folder") or os.path.join(self.pipelines_dir, name)
+        deployment_path = os.path.join(folder, DEPLOYMENT_FILE)
+        try:
+            with open(deployment_path) as f:
+                deployment = json.load(f)
+        except (OSError, ValueError):
+            deployment = None
+        missing = deployment is None or not os.path.isfile(os.path.join(folder, f"{name}.py"))
+        if not missing and deployment.get("execution_mode", "venv") == "venv":
+            # Scheduled venv runs use the pipeline's own interpreter
+            missing = not os.path.exists(os.path.join(folder, "venv", "bin", "python"))
+        if missing:
+            self.log.info(f"Registered pipeline {name} has no deployable folder, code or deployment; building a new one.")
+            return None
+
+        scheduler = get_pipeline_scheduler()
+        job = scheduler.jobs.get(name)
+        if job is None:
+            try:
+                job = scheduler.register(**deployment)
+            except Exception as e:
+                self.log.error(f"Failed to schedule reused pipeline {name}: {e}")
+                return None
+        return {
+            "success": True,
+            "reused": True,
+            "spec": existing["spec"],
+            "code": existing["code"],
+            "metrics": existing["test_metrics"],
+            "streaming_safe": existing["streaming_safe"],
+            "deployment": {
+                "success": True,
+                "schedule": job.schedule,
+                "next_run": job.to_dict()["next_run"],
+            },
+        }
+
+    def register_pipeline(self, spec: dict, code: str, requirements: str, python_test: str, fingerprint, verified: bool,
+                          streaming_safe, metrics: list, user_input: str) -> None:
+        # The registry is an index; a failure to write it must not fail the build
+        try:
+            folder = os.path.join(self.pipelines_dir, spec.get("pipeline_name"))
+            self.registry.upsert(spec, code=code, requirements=requirements, python_test=python_test, folder=folder,
+                                 fingerprint=fingerprint, verified=verified, streaming_safe=streaming_safe,
+                                 metrics=metrics, prompt=user_input)
+        except Exception as e:
+            self.log.error(f"Failed to register pipeline {spec.get('pipeline_name')}: {e}")
+
     def validate_spec_schema(self, spec: dict) -> bool:
         # Validate spec against ETL_SPEC_SCHEMA using jsonschema
         try:
             jsonschema.validate(instance=spec, schema=ETL_SPEC_SCHEMA)
-            return self.validate_source_path(spec)
+            return self.validate_source_path(spec) and self.validate_schedule(spec)
         except ImportError:
             print("jsonschema package is not installed.")
             return False
@@ -104,6 +253,16 @@ class PipelineBuilderService:
             return False
 
 
+    def validate_schedule(self, spec: dict) -> bool:
+        # The scheduler only parses the schedule at deploy time; reject free text
+        # ("daily at 8am") before spending LLM calls and test runs on the pipeline
+        try:
+            CronSchedule(spec.get("schedule", "")).next_after(datetime.datetime.now())
+        except ValueError as e:
+            print(f"Invalid schedule: {e}")
+            return False
+        return True
+
     def validate_source_path(self, spec: dict) -> None:
         # If source_type is localFileCSV or localFileJSON, ensure source_path exists
         match spec.get("source_type"):
@@ -113,6 +272,13 @@ class PipelineBuilderService:
             case "localFileJSON":
                 if not spec.get("source_path", "").endswith('.json'):
                     return False
+            case "s3Object":
+                if not spec.get("source_path", "").lower().endswith(('.parquet', '.csv', '.json', '.jsonl', '.ndjson')):
+                    return False
+            case "sqlLite":
+                db_path, table = parse_sqlite_path(spec.get("source_path", ""))
+                if not table or not db_path.lower().endswith(SQLITE_EXTENSIONS):
+                    return False
             case _:
                 pass
         return True
@@ -149,19 +315,108 @@ class PipelineBuilderService:
                     return {"success": True, "data_preview": data_preview}
                 else:
                     return {"success": False, "details": "No recent data files found."}
+            case "s3Object":
+                if self.s3_object_service is None:
+                    return {"success": False, "details": "S3 storage is not available."}
+                try:
+                    data = self.s3_object_service.preview(spec.get("source_path"))
+                    # Parquet previews carry timestamps, let pandas make them JSON safe for the prompt
+                    data_preview = json.loads(data.to_json(orient="records", date_format="iso"))
+                    return {"success": True, "data_preview": data_preview}
+                except Exception as e:
+                    return {"success": False, "details": f"Failed to read S3 source: {e}"}
             case "sqlLite":
-                pass
+                db_path, table = parse_sqlite_path(spec.get("source_path", ""))
+                db_path = self.sqlite_service.resolve_path(db_path)
+                try:
+                    if not self.sqlite_service.check_table_exists(db_path, table):
+                        return {"success": False, "details": f"Table '{table}' not found in {db_path}."}
+                    data = self.sqlite_service.preview(db_path, table)
+                    # NULLs come back as NaN; go through to_json like the S3 preview so the prompt gets null
+                    data_preview = json.loads(data.to_json(orient="records", date_format="iso"))
+                    return {"success": True, "data_preview": data_preview}
+                except Exception as e:
+                    return {"success": False, "details": f"Failed to read SQLite source: {e}"}
             case "api":
                 pass
 
         return {"success": True}
 
+    def pipeline_env(self, spec: dict, use_cache: bool = True) -> dict:
+        # Extra .env entries the generated pipeline needs to reach its source and destination
+        env = {}
+        if spec.get("source_type") == "s3Object" and self.s3_object_service is not None:
+            # Test runs read the cached copy from local disk instead of the bucket
+            env.update(self.s3_object_service.pipeline_env(spec.get("source_path"), use_cache=use_cache))
+        env.update(self.destination_env(spec, use_cache))
+        return env
+
+    def destination_env(self, spec: dict, use_cache: bool = True) -> dict:
+        if spec.get("destination_type") != "sqlLite":
+            return {}
+        # Test runs (use_cache) write to a database in the pipeline's own output folder,
+        # deployed runs to the shared destination database
+        if use_cache:
+            db_path = os.path.join(self.pipelines_dir, spec.get("pipeline_name"), "output", "test.db")
+        else:
+            db_path = os.path.abspath(os.getenv("SQLITE_DESTINATION_DB", os.path.join(self.pipelines_dir, "warehouse.db")))
+        return {"SQLITE_DB_PATH": db_path, "SQLITE_BATCH_SIZE": str(self.sqlite_service.batch_size)}
+
+    @contextmanager
+    def test_env(self, spec: dict):
+        # pipeline_env for a test run; a cached S3 source stays pinned in the disk cache until the run is over
+        if spec.get("source_type") == "s3Object" and self.s3_object_service is not None:
+            with self.s3_object_service.pinned_pipeline_env(spec.get("source_path")) as source_env:
+                yield {**source_env, **self.destination_env(spec)}
+        else:
+            yield self.pipeline_env(spec)
+
     def create_and_run_unittest(self, spec: dict, code: str, requirements: str, python_test: str) -> dict:
-        return self.test_service.create_and_run_unittest(spec.get("pipeline_name"), code, requirements, python_test, execution_mode="venv")
+        with self.test_env(spec) as env:
+            return self.test_service.create_and_run_unittest(spec.get("pipeline_name"), code, requirements, python_test, execution_mode=self.execution_mode,
+                                                             env=env, output_dir=self.pipelines_dir)
 
-    def deploy_pipeline(self, code: str) -> dict:
-        # TODO: Implement deployment logic
-        return {"success": True}
+    def run_streaming_check(self, spec: dict, data_preview: list, test_result: dict) -> tuple:
+        """
+        Returns the updated test result and whether the pipeline is streaming-safe
+        (None if it could not be checked, e.g. no preview or a non-streamable format).
+        """
+        budget_mb = spec.get("memory_budget_mb")
+        target_bytes = int(budget_mb * 1024 * 1024 * self.streaming_input_factor)
+        try:
+            data_folder = self.synthetic_data_service.create_oversized_input(spec, data_preview, target_bytes)
+        except Exception as e:
+            self.log.error(f"Failed to create synthetic input for streaming check: {e}")
+            data_folder = None
+        if data_folder is None:
+            self.log.info("Streaming check skipped: source cannot be synthesised.")
+            return test_result, None
+        try:
+            check = self.test_service.run_streaming_check(test_result["folder"], spec.get("pipeline_name"), data_folder, budget_mb,
+                                                         execution_mode=self.execution_mode)
+        finally:
+            self.synthetic_data_service.cleanup(data_folder)
+
+        metrics = {**test_result.get("metrics", {}), "streaming_check": check["metrics"]}
+        if not check["success"]:
+            return {**test_result, "success": False, "details": check["details"], "metrics": metrics}, False
+        return {**test_result, "metrics": metrics}, True
+
+    def deploy_pipeline(self, spec: dict) -> dict:
+        # Register the tested pipeline with the in-process scheduler
+        name = spec.get("pipeline_name")
+        folder = os.path.join(self.pipelines_dir, name)
+        deployment = {"name": name, "folder": folder, "schedule": spec.get("schedule"), "execution_mode": self.execution_mode}
+        try:
+            # Scheduled runs read the live source, not the test-time cache
+            self.test_service.write_env(folder, self.pipeline_env(spec, use_cache=False))
+            job = get_pipeline_scheduler().register(**deployment)
+            with open(os.path.join(folder, DEPLOYMENT_FILE), "w") as f:
+                json.dump(deployment, f, indent=2)
+        except Exception as e:
+            self.log.error(f"Failed to deploy pipeline {name}: {e}")
+            return {"success": False, "details": str(e)}
+        return {"success": True, "schedule": job.schedule, "next_run": job.to_dict()["next_run"]}
 
     def run_e2e_tests(self, deploy_result: dict) -> dict:
         # TODO: Implement E2E test logic
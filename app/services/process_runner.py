@@ -0,0 +1,156 @@
+import os
+import resource
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Optional
+
+# How often the child's memory is sampled from /proc
+MEMORY_POLL_SECONDS = 0.05
+
+
+def _proc_memory_kb(pid: int) -> Optional[tuple]:
+    """(VmHWM, VmRSS) of a live process in KB, or None if unavailable (exited, no /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            status = f.read()
+    except OSError:
+        return None
+    values = {}
+    for line in status.splitlines():
+        key, _, value = line.partition(":")
+        if key in ("VmHWM", "VmRSS"):
+            values[key] = int(value.split()[0])
+    if len(values) != 2:
+        # A zombie has no memory map left
+        return None
+    return values["VmHWM"], values["VmRSS"]
+
+
+class _MemoryMonitor(threading.Thread):
+    """
+    Samples the child's own high-water mark (VmHWM) and kills its process
+    group once its resident memory passes `limit_kb`, or once `cancel` is set.
+
+    ru_maxrss from wait4 cannot be used for this: the child is forked from the
+    server and Linux carries the pre-exec high-water mark across execve, so it
+    reports at least the server's own RSS. VmHWM belongs to the memory map
+    created by exec and only counts the child's program.
+    """
+
+    def __init__(self, pid: int, limit_kb: Optional[int], kill, cancel: Optional[threading.Event] = None):
+        super().__init__(name=f"memory-monitor-{pid}", daemon=True)
+        self.pid = pid
+        self.limit_kb = limit_kb
+        self.kill = kill
+        self.cancel = cancel
+        self.peak_kb: Optional[int] = None
+        self.exceeded = False
+        self.cancelled = False
+        self.stopped = threading.Event()
+
+    def sample(self) -> None:
+        memory = _proc_memory_kb(self.pid)
+        if memory is None:
+            return
+        hwm, rss = memory
+        self.peak_kb = hwm if self.peak_kb is None else max(self.peak_kb, hwm)
+        if self.limit_kb and rss > self.limit_kb and not self.exceeded:
+            self.exceeded = True
+            self.kill()
+
+    def run(self) -> None:
+        while not self.stopped.is_set():
+            if self.cancel is not None and self.cancel.is_set() and not self.cancelled:
+                self.cancelled = True
+                self.kill()
+            self.sample()
+            self.stopped.wait(MEMORY_POLL_SECONDS)
+
+
+def run_measured(args: list, cwd: Optional[str] = None, timeout: Optional[float] = None, env: Optional[dict] = None,
+                 memory_limit_mb: Optional[int] = None, address_space_limit_mb: Optional[int] = None,
+                 cancel: Optional[threading.Event] = None) -> dict:
+    """
+    Run a child process and account for its resources.
+    CPU time comes from os.wait4, so it is this child's only, not that of every
+    child the server has ever reaped. Peak memory is the child's own VmHWM,
+    sampled from /proc every MEMORY_POLL_SECONDS (None where /proc is
+    unavailable); it does not include grandchildren.
+    Output is spooled to temp files so a chatty process cannot dead-lock on a
+    full pipe.
+    `memory_limit_mb` is enforced while the child runs: the process group is
+    killed as soon as its resident memory is seen above the limit, and the
+    result has `memory_exceeded` set. `address_space_limit_mb` additionally sets
+    a hard RLIMIT_AS right after start, so runaway allocations fail with
+    MemoryError instead of taking the host down. Setting `cancel` kills the
+    process group within MEMORY_POLL_SECONDS (used on shutdown).
+    Returns returncode, stdout, stderr, wall/user/sys seconds, max RSS (KB),
+    output bytes and whether the run was killed for exceeding `timeout` or
+    `memory_limit_mb`, or cancelled.
+    """
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        started = time.monotonic()
+        proc = subprocess.Popen(args, cwd=cwd, stdout=out, stderr=err, env=env, start_new_session=True)
+        if address_space_limit_mb:
+            limit = address_space_limit_mb * 1024 * 1024
+            try:
+                # Set from the parent: preexec_fn is not safe in a threaded server
+                resource.prlimit(proc.pid, resource.RLIMIT_AS, (limit, limit))
+            except (ProcessLookupError, OSError):
+                pass
+
+        timed_out = threading.Event()
+
+        def _kill():
+            try:
+                # Kill the whole session so grandchildren (e.g. pytest workers) go too
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        def _timeout():
+            timed_out.set()
+            _kill()
+
+        monitor = _MemoryMonitor(proc.pid, memory_limit_mb * 1024 if memory_limit_mb else None, _kill, cancel)
+        monitor.start()
+        timer = threading.Timer(timeout, _timeout) if timeout else None
+        if timer:
+            timer.daemon = True
+            timer.start()
+        try:
+            # Wait for exit without reaping, so the pid cannot be reused while
+            # the monitor still reads /proc/<pid>
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            monitor.stopped.set()
+            monitor.join()
+            _, status, rusage = os.wait4(proc.pid, 0)
+        finally:
+            monitor.stopped.set()
+            if timer:
+                timer.cancel()
+        wall = time.monotonic() - started
+        # Tell Popen the child is already reaped
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read()
+        stderr = err.read()
+
+    return {
+        "returncode": proc.returncode,
+        "stdout": stdout.decode("utf-8", "replace"),
+        "stderr": stderr.decode("utf-8", "replace"),
+        "timed_out": timed_out.is_set(),
+        "memory_exceeded": monitor.exceeded,
+        "cancelled": monitor.cancelled,
+        "wall_seconds": round(wall, 3),
+        "user_cpu_seconds": round(rusage.ru_utime, 3),
+        "sys_cpu_seconds": round(rusage.ru_stime, 3),
+        "max_rss_kb": monitor.peak_kb,
+        "output_bytes": len(stdout) + len(stderr),
+    }
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipelines (
+    name TEXT PRIMARY KEY,
+    spec_key TEXT NOT NULL,
+    schema_fingerprint TEXT,
+    source_type TEXT,
+    source_path TEXT,
+    destination_type TEXT,
+    destination_name TEXT,
+    transformation TEXT,
+    schedule TEXT,
+    folder TEXT,
+    spec_json TEXT NOT NULL,
+    code TEXT,
+    requirements TEXT,
+    python_test TEXT,
+    verified INTEGER NOT NULL DEFAULT 0,
+    streaming_safe INTEGER,
+    test_metrics_json TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    run_count INTEGER NOT NULL DEFAULT 0,
+    last_run_status TEXT,
+    last_run_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_pipelines_reuse ON pipelines (spec_key, schema_fingerprint, verified, updated_at);
+CREATE INDEX IF NOT EXISTS ix_pipelines_source ON pipelines (source_path);
+CREATE INDEX IF NOT EXISTS ix_pipelines_filters ON pipelines (source_type, destination_type, verified);
+CREATE INDEX IF NOT EXISTS ix_pipelines_updated ON pipelines (updated_at);
+
+CREATE TABLE IF NOT EXISTS pipeline_prompts (
+    prompt_hash TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    scheduled_for REAL,
+    status TEXT,
+    duration_seconds REAL,
+    rows INTEGER,
+    peak_memory_kb INTEGER,
+    record_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_pipeline_runs_name ON pipeline_runs (name, id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS pipelines_fts USING fts5(
+    name, transformation, source_path, destination_name, tokenize = 'unicode61'
+);
+"""
+
+# Columns returned by list/search (no code blobs)
+SUMMARY_COLUMNS = (
+    "name", "source_type", "source_path", "destination_type", "destination_name", "transformation",
+    "schedule", "verified", "streaming_safe", "schema_fingerprint", "created_at", "updated_at",
+    "run_count", "last_run_status", "last_run_at",
+)
+
+
+def _normalize_text(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+def _normalize_path(path) -> str:
+    # "data/x.csv" and "./data/x.csv" are the same source; "/data/x.csv" and
+    # "../data/x.csv" are not. URIs (s3://...) are kept as given.
+    path = (path or "").strip()
+    if not path or "://" in path:
+        return path
+    return os.path.normpath(path)
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def spec_key(spec: dict) -> str:
+    """
+    Hash of the spec fields that define what a pipeline does. The generated
+    pipeline_name (which carries a timestamp) is deliberately left out.
+    """
+    normalized = {
+        "source_type": spec.get("source_type"),
+        "source_path": _normalize_path(spec.get("source_path")),
+        "destination_type": spec.get("destination_type"),
+        "destination_name": _normalize_text(spec.get("destination_name")),
+        "transformation": _normalize_text(spec.get("transformation")),
+        "schedule": " ".join((spec.get("schedule") or "").split()),
+        "memory_budget_mb": spec.get("memory_budget_mb"),
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+def schema_fingerprint(data_preview) -> Optional[str]:
+    """Hash of column names and value types seen in the data preview, in column order."""
+    if not data_preview:
+        return None
+    columns = {}
+    for row in data_preview:
+        for column, value in row.items():
+            if value is not None and columns.get(column) in (None, "NoneType"):
+                columns[column] = type(value).__name__
+            else:
+                columns.setdefault(column, type(value).__name__)
+    return hashlib.sha256(json.dumps(list(columns.items())).encode()).hexdigest()
+
+
+class PipelineRegistryService:
+    """
+    Persistent index of built pipelines in an embedded SQLite database.
+    Pipelines are indexed by normalized spec (spec_key), source path and schema
+    fingerprint so a verified pipeline can be found before spending LLM calls,
+    venvs and test runs on an identical request. Prompts that produced a pipeline
+    and the scheduler's run history are indexed alongside.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.log = logging.getLogger(__name__)
+        self.db_path = db_path or os.getenv("PIPELINE_REGISTRY_DB") or os.path.join(os.getenv("PIPELINES_DIR", "../pipelines"), "registry.db")
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            try:
+                self._conn.executescript(FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                self.log.warning("SQLite FTS5 not available, registry search falls back to LIKE")
+                self.fts = False
+
+    # --- writes ---
+
+    def upsert(self, spec: dict, code: str = None, requirements: str = None, python_test: str = None,
+               folder: str = None, fingerprint: str = None, verified: bool = False,
+               streaming_safe: Optional[bool] = None, metrics=None, prompt: Optional[str] = None) -> None:
+        name = spec["pipeline_name"]
+        now = time.time()
+        row = {
+            "name": name,
+            "spec_key": spec_key(spec),
+            "schema_fingerprint": fingerprint,
+            "source_type": spec.get("source_type"),
+            "source_path": spec.get("source_path"),
+            "destination_type": spec.get("destination_type"),
+            "destination_name": spec.get("destination_name"),
+            "transformation": spec.get("transformation"),
+            "schedule": spec.get("schedule"),
+            "folder": folder,
+            "spec_json": json.dumps(spec),
+            "code": code,
+            "requirements": requirements,
+            "python_test": python_test,
+            "verified": int(bool(verified)),
+            "streaming_safe": None if streaming_safe is None else int(streaming_safe),
+            "test_metrics_json": json.dumps(metrics) if metrics is not None else None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{c}" for c in row)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in row if c not in ("name", "created_at"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO pipelines ({columns}) VALUES ({placeholders}) ON CONFLICT(name) DO UPDATE SET {updates}",
+                row,
+            )
+            if self.fts:
+                # FTS rows share the pipeline's rowid so updates are indexed lookups, not scans
+                rowid = self._conn.execute("SELECT rowid FROM pipelines WHERE name = ?", (name,)).fetchone()[0]
+                self._conn.execute("DELETE FROM pipelines_fts WHERE rowid = ?", (rowid,))
+                self._conn.execute(
+                    "INSERT INTO pipelines_fts (rowid, name, transformation, source_path, destination_name) VALUES (?, ?, ?, ?, ?)",
+                    (rowid, name, row["transformation"], row["source_path"], row["destination_name"]),
+                )
+            if prompt and verified:
+                self._upsert_prompt(prompt, name)
+
+    def upsert_prompt(self, prompt: str, name: str) -> None:
+        """Point another prompt at an existing pipeline so the next identical request skips spec generation."""
+        with self._lock, self._conn:
+            self._upsert_prompt(prompt, name)
+
+    def _upsert_prompt(self, prompt: str, name: str) -> None:
+        self._conn.execute(
+            "INSERT INTO pipeline_prompts (prompt_hash, name) VALUES (?, ?) "
+            "ON CONFLICT(prompt_hash) DO UPDATE SET name = excluded.name",
+            (prompt_hash(prompt), name),
+        )
+
+    def record_run(self, record: dict) -> None:
+        """Scheduler run listener: index a run and update the pipeline's counters."""
+        name = record.get("pipeline")
+        if not name:
+            return
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO pipeline_runs (name, scheduled_for, status, duration_seconds, rows, peak_memory_kb, record_json) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (name, record.get("scheduled_for_ts"), record.get("status"), record.get("duration_seconds"),
+                 record.get("rows"), record.get("peak_memory_kb"), json.dumps(record)),
+            )
+            self._conn.execute(
+                "UPDATE pipelines SET run_count = run_count + 1, last_run_status = ?, last_run_at = ? WHERE name = ?",
+                (record.get("status"), record.get("scheduled_for_ts"), name),
+            )
+
+    # --- reuse lookups ---
+
+    def find_verified(self, spec: dict, fingerprint: Optional[str]) -> Optional[dict]:
+        """Most recent verified pipeline with the same normalized spec and data schema."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM pipelines WHERE spec_key = ? AND schema_fingerprint IS ? AND verified = 1 "
+                "ORDER BY updated_at DESC LIMIT 1",
+                (spec_key(spec), fingerprint),
+            ).fetchone()
+        return self._full(row)
+
+    def find_by_prompt(self, prompt: str) -> Optional[dict]:
+        """Verified pipeline previously built from the same prompt, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT p.* FROM pipeline_prompts pp JOIN pipelines p ON p.name = pp.name "
+                "WHERE pp.prompt_hash = ? AND p.verified = 1",
+                (prompt_hash(prompt),),
+            ).fetchone()
+        return self._full(row)
+
+    # --- queries ---
+
+    def get(self, name: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM pipelines WHERE name = ?", (name,)).fetchone()
+            runs = self._conn.execute(
+                "SELECT record_json FROM pipeline_runs WHERE name = ? ORDER BY id DESC LIMIT 20", (name,)
+            ).fetchall()
+        result = self._full(row)
+        if result is not None:
+            result["recent_runs"] = [json.loads(r["record_json"]) for r in runs]
+        return result
+
+    def search(self, q: Optional[str] = None, source_type: Optional[str] = None, source_path: Optional[str] = None,
+               destination_type: Optional[str] = None, verified: Optional[bool] = None,
+               limit: int = 50, offset: int = 0) -> dict:
+        where, params = [], []
+        if q:
+            if self.fts:
+                # Quote each term so user input cannot inject FTS syntax
+                terms = " ".join('"' + t.replace('"', '""') + '"' for t in q.split())
+                where.append("p.rowid IN (SELECT rowid FROM pipelines_fts WHERE pipelines_fts MATCH ?)")
+                params.append(terms)
+            else:
+                where.append("(p.name LIKE ? OR p.transformation LIKE ? OR p.destination_name LIKE ?)")
+                params += [f"%{q}%"] * 3
+        for column, value in (("source_type", source_type), ("source_path", source_path), ("destination_type", destination_type)):
+            if value is not None:
+                where.append(f"p.{column} = ?")
+                params.append(value)
+        if verified is not None:
+            where.append("p.verified = ?")
+            params.append(int(verified))
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        columns = ", ".join(f"p.{c}" for c in SUMMARY_COLUMNS)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM pipelines p {clause}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {columns} FROM pipelines p {clause} ORDER BY p.updated_at DESC LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        return {"total": total, "pipelines": [self._summary(r) for r in rows]}
+
+    @staticmethod
+    def _summary(row: sqlite3.Row) -> dict:
+        result = dict(row)
+        result["verified"] = bool(result["verified"])
+        if result.get("streaming_safe") is not None:
+            result["streaming_safe"] = bool(result["streaming_safe"])
+        return result
+
+    def _full(self, row: Optional[sqlite3.Row]) -> Optional[dict]:
+        if row is None:
+            return None
+        result = self._summary(row)
+        result["spec"] = json.loads(result.pop("spec_json"))
+        metrics = result.pop("test_metrics_json", None)
+        result["test_metrics"] = json.loads(metrics) if metrics else None
+        return result
+
+
+@lru_cache(maxsize=1)
+def get_pipeline_registry() -> PipelineRegistryService:
+    # Created on first use, so importing the module does not create the database
+    return PipelineRegistryService()
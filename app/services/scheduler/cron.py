@@ -0,0 +1,102 @@
+import datetime
+from typing import Optional, Set
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTH_NAMES = {name: i + 1 for i, name in enumerate(["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"])}
+DAY_NAMES = {name: i for i, name in enumerate(["sun", "mon", "tue", "wed", "thu", "fri", "sat"])}
+
+# Give up searching for a matching time after this long (e.g. "0 0 30 2 *")
+MAX_SEARCH_YEARS = 5
+
+
+def _parse_value(token: str, names: dict) -> int:
+    token = token.lower()
+    if token in names:
+        return names[token]
+    return int(token)
+
+
+def _parse_field(field: str, low: int, high: int, names: Optional[dict] = None) -> Set[int]:
+    names = names or {}
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step <= 0:
+                raise ValueError(f"Invalid cron step: {step_str}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_str, end_str = part.split("-", 1)
+            start, end = _parse_value(start_str, names), _parse_value(end_str, names)
+        else:
+            start = _parse_value(part, names)
+            # "5/15" means every 15 starting at 5
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    Minimal 5-field cron expression (minute hour day-of-month month day-of-week),
+    with lists, ranges, steps, month/day names and the @daily style aliases.
+    Like cron, when both day fields are restricted a day matching either one fires.
+    """
+
+    def __init__(self, expr: str):
+        self.expr = expr
+        fields = ALIASES.get(expr.strip().lower(), expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: '{expr}'")
+        minute, hour, dom, month, dow = fields
+        self.minutes = _parse_field(minute, 0, 59)
+        self.hours = _parse_field(hour, 0, 23)
+        self.days = _parse_field(dom, 1, 31)
+        self.months = _parse_field(month, 1, 12, MONTH_NAMES)
+        # 7 is an alias for Sunday
+        self.weekdays = {d % 7 for d in _parse_field(dow, 0, 7, DAY_NAMES)}
+        # As in cron, a field starting with "*" (e.g. "*/2") does not restrict the day
+        self.dom_restricted = not dom.startswith("*")
+        self.dow_restricted = not dow.startswith("*")
+
+    def _day_matches(self, dt: datetime.datetime) -> bool:
+        dom_ok = dt.day in self.days
+        dow_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.dom_restricted and self.dow_restricted:
+            return dom_ok or dow_ok
+        return dom_ok and dow_ok
+
+    def next_after(self, dt: datetime.datetime) -> datetime.datetime:
+        """First matching minute strictly after `dt`."""
+        current = dt.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=366 * MAX_SEARCH_YEARS)
+        while current <= limit:
+            if current.month not in self.months:
+                year, month = (current.year + 1, 1) if current.month == 12 else (current.year, current.month + 1)
+                current = current.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(current):
+                current = (current + datetime.timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if current.hour not in self.hours:
+                current = (current + datetime.timedelta(hours=1)).replace(minute=0)
+                continue
+            if current.minute not in self.minutes:
+                current += datetime.timedelta(minutes=1)
+                continue
+            return current
+        raise ValueError(f"Cron expression '{self.expr}' never fires")
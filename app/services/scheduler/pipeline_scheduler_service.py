@@ -0,0 +1,382 @@
+import datetime
+import glob
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+from app.services.process_runner import run_measured
+from app.services.scheduler.cron import CronSchedule
+from app.services.tests.docker_runner_service import DockerRunnerService
+from app.services.tests.test_pipline_service import DEFAULT_BUDGET
+
+# Generated pipelines report how many rows they wrote with a line like this
+ROWS_RE = re.compile(r"PIPELINE_ROWS=(\d+)")
+
+MISFIRE_POLICIES = ("skip", "run_once", "catch_up")
+OVERLAP_POLICIES = ("queue", "skip")
+
+DEPLOYMENT_FILE = "deployment.json"
+HISTORY_FILE = "runs.jsonl"
+
+
+class ScheduledPipeline:
+    """Scheduling state of one deployed pipeline."""
+
+    def __init__(self, name: str, folder: str, schedule: str, max_concurrency: int = 1,
+                 misfire_policy: str = "run_once", overlap_policy: str = "queue", max_queued: int = 1,
+                 history_size: int = 100, execution_mode: str = "venv"):
+        if misfire_policy not in MISFIRE_POLICIES:
+            raise ValueError(f"Unknown misfire policy: {misfire_policy}")
+        if overlap_policy not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown overlap policy: {overlap_policy}")
+        self.name = name
+        self.folder = folder
+        self.schedule = schedule
+        self.cron = CronSchedule(schedule)
+        self.max_concurrency = max_concurrency
+        self.misfire_policy = misfire_policy
+        self.overlap_policy = overlap_policy
+        self.max_queued = max_queued
+        self.execution_mode = execution_mode
+        self.next_run: Optional[float] = None
+        self.running = 0
+        self.queued: deque = deque()
+        self.history: deque = deque(maxlen=history_size)
+        # Bumped on re-registration so stale heap entries are ignored
+        self.generation = 0
+
+    def next_fire_after(self, ts: float) -> float:
+        return self.cron.next_after(datetime.datetime.fromtimestamp(ts)).timestamp()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "folder": self.folder,
+            "schedule": self.schedule,
+            "max_concurrency": self.max_concurrency,
+            "misfire_policy": self.misfire_policy,
+            "overlap_policy": self.overlap_policy,
+            "execution_mode": self.execution_mode,
+            "next_run": _iso(self.next_run),
+            "running": self.running,
+            "queued": len(self.queued),
+            "last_run": self.history[-1] if self.history else None,
+        }
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+class PipelineSchedulerService:
+    """
+    In-process cron scheduler for deployed pipelines.
+
+    One timer thread pops due pipelines from a heap keyed by next fire time and
+    hands runs to a bounded worker pool. Next fire times are computed from the
+    scheduled time rather than from when the run actually started, so schedules
+    do not drift. Missed fire times (downtime, overload) are handled by the
+    pipeline's misfire policy: `skip`, `run_once` or `catch_up`. Runs that would
+    exceed a pipeline's concurrency limit are queued or skipped per its overlap
+    policy, and when the pool backlog is full new runs are skipped and recorded.
+    On shutdown running pipelines are killed and recorded as cancelled.
+    """
+
+    def __init__(self, pipelines_dir: Optional[str] = None, max_workers: Optional[int] = None,
+                 max_pending: Optional[int] = None, run_timeout: Optional[float] = None,
+                 misfire_grace: Optional[float] = None, max_catch_up: Optional[int] = None):
+        self.log = logging.getLogger(__name__)
+        self.pipelines_dir = os.path.abspath(pipelines_dir or os.getenv("PIPELINES_DIR", "../pipelines"))
+        self.max_workers = max_workers or int(os.getenv("SCHEDULER_MAX_WORKERS", "4"))
+        self.max_pending = max_pending if max_pending is not None else int(os.getenv("SCHEDULER_MAX_PENDING", "100"))
+        self.run_timeout = run_timeout or float(os.getenv("SCHEDULER_RUN_TIMEOUT_SECONDS", "3600"))
+        self.misfire_grace = misfire_grace if misfire_grace is not None else float(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "60"))
+        self.max_catch_up = max_catch_up or int(os.getenv("SCHEDULER_MAX_CATCH_UP", "10"))
+
+        self.jobs: Dict[str, ScheduledPipeline] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        # Set on shutdown to kill the children of runs in progress
+        self._cancel_runs = threading.Event()
+        # Runs handed to the pool that have not finished yet
+        self._in_pool = 0
+        self.skipped_overload = 0
+        self.docker_runner = DockerRunnerService(self.log)
+        # Callables invoked with every run record (e.g. the pipeline registry)
+        self.run_listeners: List[Callable[[dict], None]] = []
+
+    # --- lifecycle ---
+
+    def start(self) -> None:
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._cancel_runs.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pipeline-run")
+        self.load_deployments()
+        self._thread = threading.Thread(target=self._loop, name="pipeline-scheduler", daemon=True)
+        self._thread.start()
+        self.log.info(f"Pipeline scheduler started with {len(self.jobs)} pipeline(s), {self.max_workers} worker(s)")
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+        # A run may take up to run_timeout; do not hold shutdown for it
+        self._cancel_runs.set()
+        if self._executor:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+        self.log.info("Pipeline scheduler stopped")
+
+    def load_deployments(self) -> None:
+        for path in glob.glob(os.path.join(self.pipelines_dir, "*", DEPLOYMENT_FILE)):
+            try:
+                with open(path) as f:
+                    deployment = json.load(f)
+                self.register(**deployment)
+            except Exception as e:
+                self.log.error(f"Failed to load deployment {path}: {e}")
+
+    # --- registration ---
+
+    def register(self, name: str, schedule: str, folder: Optional[str] = None, **options) -> ScheduledPipeline:
+        folder = folder or os.path.join(self.pipelines_dir, name)
+        job = ScheduledPipeline(name, folder, schedule, **options)
+        history = self._load_history(job)
+        job.history.extend(history)
+
+        now = time.time()
+        # Records are appended as runs finish, so the last one is not necessarily the latest fire time
+        last_scheduled = max((r["scheduled_for_ts"] for r in history if r.get("scheduled_for_ts")), default=None)
+
+        with self._cond:
+            previous = self.jobs.get(name)
+            if previous is not None:
+                # Re-registered while scheduled (redeploy): carry on from now, nothing was missed
+                job.generation = previous.generation + 1
+                job.next_run = job.next_fire_after(now)
+            else:
+                # Resume from the last recorded fire time so downtime shows up as misfires
+                job.next_run = job.next_fire_after(last_scheduled or now)
+            self.jobs[name] = job
+            heapq.heappush(self._heap, (job.next_run, next(self._seq), name, job.generation))
+            self._cond.notify_all()
+        self.log.info(f"Scheduled pipeline {name} ({schedule}), next run at {_iso(job.next_run)}")
+        return job
+
+    def unregister(self, name: str) -> bool:
+        with self._cond:
+            # Heap entries for it are dropped lazily when they come due
+            return self.jobs.pop(name, None) is not None
+
+    def list_pipelines(self) -> List[dict]:
+        with self._cond:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def run_history(self, name: str, limit: int = 50) -> Optional[List[dict]]:
+        with self._cond:
+            job = self.jobs.get(name)
+            if job is None:
+                return None
+            return list(job.history)[-limit:]
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pipelines": len(self.jobs),
+                "workers": self.max_workers,
+                "in_pool": self._in_pool,
+                "max_pending": self.max_pending,
+                "queued": sum(len(job.queued) for job in self.jobs.values()),
+                "skipped_overload": self.skipped_overload,
+            }
+
+    # --- scheduling loop ---
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while self._running and (not self._heap or self._heap[0][0] > time.time()):
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                due = []
+                now = time.time()
+                while self._heap and self._heap[0][0] <= now:
+                    ts, _, name, generation = heapq.heappop(self._heap)
+                    job = self.jobs.get(name)
+                    if job is not None and job.generation == generation:
+                        due.append((job, ts))
+            for job, ts in due:
+                try:
+                    self._fire(job, ts)
+                except Exception as e:
+                    self.log.error(f"Failed to dispatch pipeline {job.name}: {e}")
+
+    def _fire(self, job: ScheduledPipeline, scheduled_for: float) -> None:
+        now = time.time()
+        fire_times = [scheduled_for]
+        next_run = job.next_fire_after(scheduled_for)
+
+        if now - scheduled_for > self.misfire_grace:
+            # Collect every fire time we missed, bounded so a long outage stays cheap
+            while next_run <= now and len(fire_times) < self.max_catch_up:
+                fire_times.append(next_run)
+                next_run = job.next_fire_after(next_run)
+            if next_run <= now:
+                next_run = job.next_fire_after(now)
+            self.log.warning(f"Pipeline {job.name} missed {len(fire_times)} run(s), policy {job.misfire_policy}")
+            if job.misfire_policy == "skip":
+                for ts in fire_times:
+                    self._record(job, self._skipped_record(job, ts, "missed"))
+                fire_times = []
+            elif job.misfire_policy == "run_once":
+                for ts in fire_times[:-1]:
+                    self._record(job, self._skipped_record(job, ts, "missed"))
+                fire_times = fire_times[-1:]
+
+        with self._cond:
+            if self.jobs.get(job.name) is job:
+                job.next_run = next_run
+                heapq.heappush(self._heap, (next_run, next(self._seq), job.name, job.generation))
+        # A catch-up backlog (already bounded by max_catch_up) is queued in full
+        catching_up = len(fire_times) > 1
+        for ts in fire_times:
+            self._submit(job, ts, force_queue=catching_up)
+
+    def _submit(self, job: ScheduledPipeline, scheduled_for: float, force_queue: bool = False) -> None:
+        reason = None
+        with self._cond:
+            if not self._running:
+                return
+            if job.running >= job.max_concurrency:
+                if force_queue or (job.overlap_policy == "queue" and len(job.queued) < job.max_queued):
+                    job.queued.append(scheduled_for)
+                    return
+                reason = "concurrency_limit"
+            elif self._in_pool >= self.max_workers + self.max_pending:
+                self.skipped_overload += 1
+                reason = "overloaded"
+            else:
+                job.running += 1
+                self._in_pool += 1
+        if reason:
+            self.log.warning(f"Skipping run of {job.name}: {reason}")
+            self._record(job, self._skipped_record(job, scheduled_for, reason))
+            return
+        self._executor.submit(self._run, job, scheduled_for)
+
+    def _run(self, job: ScheduledPipeline, scheduled_for: float) -> None:
+        started = time.time()
+        record = {
+            "pipeline": job.name,
+            "scheduled_for": _iso(scheduled_for),
+            "scheduled_for_ts": scheduled_for,
+            "started_at": _iso(started),
+            "delay_seconds": round(started - scheduled_for, 3),
+        }
+        try:
+            if job.execution_mode == "docker":
+                budget = {**DEFAULT_BUDGET, "timeout_seconds": self.run_timeout}
+                result = self.docker_runner.run(job.folder, job.name, ["python", f"{job.name}.py"], budget,
+                                                cancel=self._cancel_runs)
+            else:
+                python_path = os.path.join(job.folder, "venv", "bin", "python")
+                code_path = os.path.join(job.folder, f"{job.name}.py")
+                result = run_measured([python_path, code_path], cwd=job.folder, timeout=self.run_timeout,
+                                      cancel=self._cancel_runs)
+            rows = ROWS_RE.findall(result["stdout"])
+            if result["cancelled"]:
+                status = "cancelled"
+            elif result["timed_out"]:
+                status = "timeout"
+            else:
+                status = "success" if result["returncode"] == 0 else "failed"
+            record.update({
+                "status": status,
+                "return_code": result["returncode"],
+                "duration_seconds": result["wall_seconds"],
+                "cpu_user_seconds": result["user_cpu_seconds"],
+                "cpu_sys_seconds": result["sys_cpu_seconds"],
+                "peak_memory_kb": result["max_rss_kb"],
+                "rows": int(rows[-1]) if rows else None,
+            })
+            if record["status"] != "success":
+                record["error"] = result["stderr"][-2000:]
+        except Exception as e:
+            record.update({"status": "failed", "duration_seconds": round(time.time() - started, 3), "error": str(e)})
+        finally:
+            self._record(job, record)
+            self.log.info(f"Pipeline {job.name} run finished: {record['status']} in {record['duration_seconds']}s")
+            next_queued = None
+            with self._cond:
+                job.running -= 1
+                self._in_pool -= 1
+                if job.queued:
+                    next_queued = job.queued.popleft()
+            if next_queued is not None:
+                self._submit(job, next_queued)
+
+    # --- history ---
+
+    def _skipped_record(self, job: ScheduledPipeline, scheduled_for: float, reason: str) -> dict:
+        return {
+            "pipeline": job.name,
+            "scheduled_for": _iso(scheduled_for),
+            "scheduled_for_ts": scheduled_for,
+            "status": "skipped",
+            "reason": reason,
+        }
+
+    def _record(self, job: ScheduledPipeline, record: dict) -> None:
+        with self._cond:
+            job.history.append(record)
+        try:
+            with open(os.path.join(job.folder, HISTORY_FILE), "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            self.log.error(f"Failed to write run history for {job.name}: {e}")
+        for listener in self.run_listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                self.log.error(f"Run listener failed for {job.name}: {e}")
+
+    def _load_history(self, job: ScheduledPipeline) -> List[dict]:
+        path = os.path.join(job.folder, HISTORY_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            lines = deque(f, maxlen=job.history.maxlen)
+        history = []
+        for line in lines:
+            try:
+                history.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return history
+
+
+@lru_cache(maxsize=1)
+def get_pipeline_scheduler() -> PipelineSchedulerService:
+    # Created on first use rather than at import
+    return PipelineSchedulerService()
@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution.
+    The first caller (the leader) starts the work; callers arriving while it is
+    in flight get the leader's future and share its result, or its exception.
+    Nothing is cached once the future completes.
+
+    Callers receive the future rather than blocking on it, so an async caller
+    can await it (asyncio.wrap_future) and a coalesced request costs no thread
+    however many pile up behind one build.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: dict = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def submit(self, key: Hashable, start: Callable[[], Future]) -> Tuple[Future, bool]:
+        """
+        Returns (future, shared) where `shared` is True for callers that joined a
+        leader. `start` must return quickly (e.g. queue the work); if it raises,
+        the exception propagates to the leader and nothing is registered.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, True
+            future = start()
+            self._inflight[key] = future
+            self.executions += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future, False
+
+    def _forget(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._inflight),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+            }
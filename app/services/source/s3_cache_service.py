@@ -0,0 +1,227 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Optional
+
+from app.services.storage_service import MinioStorage
+
+DEFAULT_CACHE_DIR = "../cache/s3"
+DEFAULT_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+TMP_SUFFIX = ".part"
+
+
+class S3DiskCache:
+    """
+    Read-through disk cache for bucket objects.
+
+    Entries are keyed by (bucket, key, ETag) and laid out as
+    `<cache_dir>/objects/<bucket>/<etag>/<key>`, so a changed object gets a new
+    entry and `<cache_dir>/objects/<bucket>/<etag>` can be used as a local
+    DATA_FOLDER for the pipeline that reads it.
+    Fills are written to a temp file and renamed into place, total size is kept
+    under `max_bytes` with LRU eviction, and concurrent misses for the same entry
+    share a single download. Entries pinned by a running pipeline (`pinned`) are
+    never evicted; the cache may run over `max_bytes` until they are released.
+    """
+
+    def __init__(self, storage: MinioStorage, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.log = logging.getLogger(__name__)
+        self.storage = storage
+        self.cache_dir = os.path.abspath(cache_dir or os.getenv("S3_CACHE_DIR", DEFAULT_CACHE_DIR))
+        self.max_bytes = max_bytes or int(os.getenv("S3_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES))
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # path -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._inflight: dict = {}
+        # path -> number of holders; eviction skips these
+        self._pins: dict = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.bytes_downloaded = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        # Rebuild LRU order from disk after a restart, dropping half written fills
+        found = []
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(TMP_SUFFIX):
+                    os.remove(path)
+                    continue
+                st = os.stat(path)
+                found.append((max(st.st_atime, st.st_mtime), path, st.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._size += size
+        self._evict()
+
+    def entry_dir(self, bucket: str, etag: str) -> str:
+        return os.path.join(self.objects_dir, bucket, etag)
+
+    def entry_path(self, bucket: str, key: str, etag: str) -> str:
+        parts = [p for p in key.split("/") if p]
+        if not parts or any(p in (".", "..") for p in parts):
+            raise ValueError(f"Refusing to cache unsafe object key: {key}")
+        return os.path.join(self.entry_dir(bucket, etag), *parts)
+
+    def lookup(self, bucket: str, key: str, etag: str) -> Optional[str]:
+        """Return the cached file path if present, without downloading."""
+        path = self.entry_path(bucket, key, etag)
+        with self._lock:
+            if path not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+        self._touch(path)
+        return path
+
+    def get(self, bucket: str, key: str, etag: Optional[str] = None) -> str:
+        """
+        Return a local path holding the object, downloading it on a miss.
+        """
+        if etag is None:
+            etag = self.storage.head_object(key, bucket=bucket)["etag"]
+        path = self.entry_path(bucket, key, etag)
+
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                leader = None
+            elif path in self._inflight:
+                self.coalesced += 1
+                future = self._inflight[path]
+                leader = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._inflight[path] = future
+                leader = True
+
+        if leader is None:
+            self._touch(path)
+            return path
+        if not leader:
+            return future.result()
+
+        try:
+            size = self._fill(bucket, key, etag, path)
+            with self._lock:
+                self._entries[path] = size
+                self._size += size
+                self.bytes_downloaded += size
+                self._evict(keep=path)
+            future.set_result(path)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(path, None)
+        self.log.info(f"Cached s3://{bucket}/{key} ({size} bytes), hit rate {self.hit_rate():.2%}")
+        return path
+
+    def acquire(self, bucket: str, key: str, etag: Optional[str] = None) -> str:
+        """get() and pin the entry; pair with release()."""
+        while True:
+            path = self.get(bucket, key, etag)
+            with self._lock:
+                # A concurrent fill may have evicted it between get() and here
+                if path in self._entries:
+                    self._pins[path] = self._pins.get(path, 0) + 1
+                    return path
+
+    def release(self, path: str) -> None:
+        with self._lock:
+            remaining = self._pins.get(path, 0) - 1
+            if remaining > 0:
+                self._pins[path] = remaining
+                return
+            self._pins.pop(path, None)
+            # Fills made while it was pinned may have left the cache over budget
+            self._evict()
+
+    @contextmanager
+    def pinned(self, bucket: str, key: str, etag: Optional[str] = None):
+        """Local path of the object, kept in the cache until the block exits."""
+        path = self.acquire(bucket, key, etag)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _fill(self, bucket: str, key: str, etag: str, path: str) -> int:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}{TMP_SUFFIX}"
+        try:
+            size = self.storage.download_to(key, tmp_path, bucket=bucket, etag=etag)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return size
+
+    def _touch(self, path: str) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        # Caller holds the lock (or is the constructor)
+        if self._size <= self.max_bytes:
+            return
+        for path, size in list(self._entries.items()):
+            if self._size <= self.max_bytes:
+                break
+            # The entry just filled and entries in use by a pipeline run stay;
+            # a single object larger than the budget stays until the next fill
+            if path == keep or path in self._pins:
+                continue
+            del self._entries[path]
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+                self._prune_dirs(os.path.dirname(path))
+            except OSError as e:
+                self.log.warning(f"Failed to remove evicted cache file {path}: {e}")
+
+    def _prune_dirs(self, directory: str) -> None:
+        while directory.startswith(self.objects_dir) and directory != self.objects_dir:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pinned": len(self._pins),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "bytes_downloaded": self.bytes_downloaded,
+                "hit_rate": self.hit_rate(),
+            }
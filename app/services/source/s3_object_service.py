@@ -0,0 +1,285 @@
+import io
+import os
+import logging
+from contextlib import contextmanager
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+import pandas as pd
+
+from app.services.storage_service import MinioStorage
+from app.services.source.s3_cache_service import S3DiskCache
+
+# Size of a single ranged GET. Small enough that a preview only moves a few
+# requests worth of data, large enough that sequential scans are not chatty.
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+# Parquet keeps its metadata at the end of the file; one tail read usually
+# covers the 8 byte trailer and the whole footer.
+PARQUET_TAIL_BYTES = 64 * 1024
+# How much of a CSV/NDJSON object we download to build a preview.
+DEFAULT_PREVIEW_BYTES = 1024 * 1024
+
+
+def parse_s3_path(path: str, default_bucket: str) -> Tuple[str, str]:
+    """
+    Split a source path into (bucket, key).
+    Accepts "s3://bucket/key" or a plain key in the default bucket.
+    """
+    if path.startswith("s3://"):
+        parsed = urlparse(path)
+        return parsed.netloc, parsed.path.lstrip("/")
+    return default_bucket, path.lstrip("/")
+
+
+class S3RangeReader(io.RawIOBase):
+    """
+    Read-only, seekable file object backed by HTTP range GETs.
+    Only the blocks that are actually touched are downloaded, which lets
+    pyarrow read a Parquet footer and selected row groups without pulling
+    the whole object.
+    """
+
+    def __init__(self, storage: MinioStorage, bucket: str, key: str, size: int, block_size: int = DEFAULT_BLOCK_SIZE):
+        super().__init__()
+        self.storage = storage
+        self.bucket = bucket
+        self.key = key
+        self.size = size
+        self.block_size = block_size
+        self.pos = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        # Last fetched window and the Parquet tail, kept separately so footer
+        # lookups do not evict the data block being scanned.
+        self._buf_start = 0
+        self._buf = b""
+        self._tail_start = size
+        self._tail = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self.pos = offset
+        elif whence == io.SEEK_CUR:
+            self.pos += offset
+        elif whence == io.SEEK_END:
+            self.pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self.pos = max(0, self.pos)
+        return self.pos
+
+    def _fetch(self, start: int, end: int) -> bytes:
+        data = self.storage.get_range(self.key, start, end, bucket=self.bucket)
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        return data
+
+    def prefetch_tail(self, nbytes: int) -> None:
+        start = max(0, self.size - nbytes)
+        if start < self._tail_start:
+            self._tail = self._fetch(start, self.size - 1)
+            self._tail_start = start
+
+    def _cached(self, start: int, n: int) -> Optional[bytes]:
+        for buf_start, buf in ((self._tail_start, self._tail), (self._buf_start, self._buf)):
+            if buf_start <= start and start + n <= buf_start + len(buf):
+                offset = start - buf_start
+                return buf[offset:offset + n]
+        return None
+
+    def read(self, n: int = -1) -> bytes:
+        if self.pos >= self.size:
+            return b""
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = min(n, self.size - self.pos)
+        if n == 0:
+            # A zero-length read would otherwise send the invalid range bytes=pos-(pos-1)
+            return b""
+
+        data = self._cached(self.pos, n)
+        if data is None:
+            end = min(self.size, self.pos + max(n, self.block_size)) - 1
+            self._buf = self._fetch(self.pos, end)
+            self._buf_start = self.pos
+            data = self._buf[:n]
+        self.pos += len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self) -> bytes:
+        return self.read(-1)
+
+
+class S3ObjectService:
+    """
+    Reads pipeline sources that live in the MinIO/S3 bucket.
+    Previews use byte-range GETs so only the Parquet footer plus the first
+    row group, or the first few MB of a CSV/NDJSON object, are transferred.
+    Whole-object reads go through the local S3DiskCache.
+    """
+
+    def __init__(self, storage: Optional[MinioStorage] = None, preview_bytes: Optional[int] = None, block_size: Optional[int] = None,
+                 cache: Optional[S3DiskCache] = None):
+        self.log = logging.getLogger(__name__)
+        self.storage = storage or MinioStorage()
+        if cache is None and os.getenv("S3_CACHE_ENABLED", "true").lower() == "true":
+            cache = S3DiskCache(self.storage)
+        self.cache = cache
+        self.preview_bytes = preview_bytes or int(os.getenv("S3_PREVIEW_BYTES", DEFAULT_PREVIEW_BYTES))
+        self.block_size = block_size or int(os.getenv("S3_RANGE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+
+    def stat(self, source_path: str) -> dict:
+        bucket, key = parse_s3_path(source_path, self.storage.bucket)
+        info = self.storage.head_object(key, bucket=bucket)
+        info.update({"bucket": bucket, "key": key})
+        return info
+
+    def open(self, source_path: str) -> S3RangeReader:
+        info = self.stat(source_path)
+        return S3RangeReader(self.storage, info["bucket"], info["key"], info["size"], block_size=self.block_size)
+
+    def check_object_exists(self, source_path: str) -> bool:
+        try:
+            self.stat(source_path)
+            return True
+        except Exception as e:
+            self.log.info(f"S3 object '{source_path}' not accessible: {e}")
+            return False
+
+    def preview(self, source_path: str, nrows: int = 5, columns: Optional[list] = None) -> pd.DataFrame:
+        """
+        Return the first `nrows` rows of an object, downloading as little as possible.
+        A copy already in the disk cache is read locally instead.
+        """
+        info = self.stat(source_path)
+        cached = self.cache.lookup(info["bucket"], info["key"], info["etag"]) if self.cache else None
+        if cached:
+            with open(cached, "rb") as f:
+                df = self._preview_file(f, info["size"], info["key"], nrows, columns)
+            self.log.info(f"Previewed s3://{info['bucket']}/{info['key']} from disk cache")
+            return df
+
+        reader = S3RangeReader(self.storage, info["bucket"], info["key"], info["size"], block_size=self.block_size)
+        df = self._preview_file(reader, reader.size, reader.key, nrows, columns)
+        self.log.info(
+            f"Previewed s3://{reader.bucket}/{reader.key} ({reader.size} bytes) "
+            f"with {reader.requests} range request(s), {reader.bytes_fetched} bytes transferred"
+        )
+        return df
+
+    def _preview_file(self, f, size: int, key: str, nrows: int, columns: Optional[list]) -> pd.DataFrame:
+        key = key.lower()
+        if key.endswith(".parquet"):
+            df = self._preview_parquet(f, nrows, columns)
+        elif key.endswith(".csv"):
+            df = self._preview_text(f, size, nrows, "csv")
+        elif key.endswith((".json", ".jsonl", ".ndjson")):
+            df = self._preview_text(f, size, nrows, "json")
+        else:
+            raise ValueError(f"Unsupported S3 object type: {key}")
+        if columns:
+            df = df[[c for c in columns if c in df.columns]]
+        return df
+
+    def read_row_groups(self, source_path: str, row_groups: list, columns: Optional[list] = None) -> pd.DataFrame:
+        """Read only the given Parquet row groups (and optionally columns)."""
+        parquet_file = self._open_parquet(self.open(source_path))
+        return parquet_file.read_row_groups(row_groups, columns=columns).to_pandas()
+
+    def _open_parquet(self, f):
+        import pyarrow.parquet as pq
+
+        if isinstance(f, S3RangeReader):
+            # pyarrow already asks for exact column chunk ranges, readahead would only waste bytes
+            f.block_size = 0
+            f.prefetch_tail(PARQUET_TAIL_BYTES)
+        return pq.ParquetFile(f)
+
+    def _preview_parquet(self, f, nrows: int, columns: Optional[list]) -> pd.DataFrame:
+        parquet_file = self._open_parquet(f)
+        if parquet_file.metadata.num_row_groups == 0:
+            return parquet_file.schema_arrow.empty_table().to_pandas()
+        batch = next(parquet_file.iter_batches(batch_size=nrows, row_groups=[0], columns=columns), None)
+        if batch is None:
+            return parquet_file.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas()
+
+    def _preview_text(self, f, size: int, nrows: int, fmt: str) -> pd.DataFrame:
+        chunk = f.read(self.preview_bytes)
+        if f.tell() < size:
+            # Drop the trailing partial record
+            cut = chunk.rfind(b"\n")
+            if cut != -1:
+                chunk = chunk[:cut + 1]
+        buf = io.BytesIO(chunk)
+        if fmt == "csv":
+            return pd.read_csv(buf, nrows=nrows)
+        try:
+            return pd.read_json(buf, lines=True, nrows=nrows)
+        except ValueError:
+            # A plain JSON array cannot be parsed from a prefix
+            if size > self.preview_bytes:
+                raise
+            buf.seek(0)
+            return pd.read_json(buf).head(nrows)
+
+    def materialize(self, source_path: str) -> str:
+        """Return a local file holding the object, going through the disk cache."""
+        if self.cache is None:
+            raise RuntimeError("S3 disk cache is disabled.")
+        info = self.stat(source_path)
+        return self.cache.get(info["bucket"], info["key"], etag=info["etag"])
+
+    def pipeline_data_uri(self, bucket: Optional[str] = None) -> str:
+        """
+        DATA_FOLDER value that lets generated code open bucket objects through
+        pyarrow.fs.FileSystem.from_uri (which also issues range reads).
+        """
+        endpoint = urlparse(self.storage.endpoint)
+        return f"s3://{bucket or self.storage.bucket}?endpoint_override={endpoint.netloc}&scheme={endpoint.scheme or 'http'}&region={self.storage.region}"
+
+    def pipeline_env(self, source_path: str, use_cache: bool = False) -> dict:
+        """
+        Environment entries a generated pipeline needs to read `source_path`.
+        With `use_cache` the object is pulled into the disk cache and DATA_FOLDER
+        points at the local cache directory, which has the same layout as the bucket.
+        """
+        bucket, _ = parse_s3_path(source_path, self.storage.bucket)
+        if use_cache and self.cache is not None:
+            info = self.stat(source_path)
+            self.cache.get(info["bucket"], info["key"], etag=info["etag"])
+            return {"DATA_FOLDER": self.cache.entry_dir(info["bucket"], info["etag"])}
+        return {
+            "DATA_FOLDER": self.pipeline_data_uri(bucket),
+            "AWS_ACCESS_KEY_ID": self.storage.access_key,
+            "AWS_SECRET_ACCESS_KEY": self.storage.secret_key,
+            "AWS_DEFAULT_REGION": self.storage.region,
+        }
+
+    @contextmanager
+    def pinned_pipeline_env(self, source_path: str):
+        """
+        pipeline_env(use_cache=True) for the duration of a pipeline run: the cached
+        copy is pinned until the block exits, so a concurrent build's fill cannot
+        evict it while the pipeline is reading it.
+        """
+        if self.cache is None:
+            yield self.pipeline_env(source_path)
+            return
+        info = self.stat(source_path)
+        with self.cache.pinned(info["bucket"], info["key"], etag=info["etag"]):
+            yield {"DATA_FOLDER": self.cache.entry_dir(info["bucket"], info["etag"])}
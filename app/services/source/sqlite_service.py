@@ -0,0 +1,227 @@
+import datetime
+import itertools
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Separates the database file from the table in a sqlLite source_path: "data/shop.db::orders"
+TABLE_SEPARATOR = "::"
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+# pandas/numpy values that sqlite3 cannot bind natively
+sqlite3.register_adapter(pd.Timestamp, lambda ts: ts.isoformat())
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat())
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sqlite_type(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    return "TEXT"
+
+
+def parse_sqlite_path(source_path: str) -> tuple:
+    """Split "<database file>::<table>" into (database file, table); table is None if missing."""
+    db_path, _, table = source_path.partition(TABLE_SEPARATOR)
+    return db_path, table or None
+
+
+class SQLiteService:
+    """
+    SQLite source/destination with a pool of reusable connections per database
+    file, returned to the pool instead of being reopened for every preview or
+    write. Source reads (previews, table checks) use read-only connections
+    (mode=ro) that set no pragmas, so inspecting a user's database never
+    switches its journal mode or creates -wal/-shm files next to it. Write
+    connections run in WAL mode (readers do not block the writer) with
+    synchronous=NORMAL.
+
+    Writes go through executemany in batches of `batch_size` rows, one explicit
+    transaction per batch, so a large load neither commits row by row nor holds
+    the write lock for the whole run. Generated pipelines run in their own venv
+    and cannot import this module: the write methods are the reference
+    implementation of the write path PipelineCodeGenerator instructs them to
+    follow, and are what app/tools/sqlite_benchmark.py measures next to a
+    literal rendering of those instructions.
+    """
+
+    def __init__(self, data_directory: Optional[str] = None, pool_size: Optional[int] = None,
+                 batch_size: Optional[int] = None, busy_timeout_ms: Optional[int] = None):
+        self.data_directory = data_directory or os.getenv("SQLITE_DATA_DIR", "../data")
+        self.pool_size = pool_size or int(os.getenv("SQLITE_POOL_SIZE", "4"))
+        self.batch_size = batch_size or int(os.getenv("SQLITE_BATCH_SIZE", "10000"))
+        self.busy_timeout_ms = busy_timeout_ms or int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        self._lock = threading.Lock()
+        # (db path, read_only) -> [LifoQueue of idle connections, number of connections opened]
+        self._pools: dict = {}
+        self.connections_opened = 0
+        self.checkouts = 0
+
+    def resolve_path(self, path: str) -> str:
+        if os.path.isabs(path):
+            return path
+        # Same normalisation as LocalFileService._resolve_pattern
+        clean = path.lstrip("./")
+        if clean.startswith("data/"):
+            clean = clean[5:]
+        return os.path.abspath(os.path.join(self.data_directory, clean))
+
+    # --- pool ---
+
+    def _connect(self, db_path: str, read_only: bool = False) -> sqlite3.Connection:
+        timeout = self.busy_timeout_ms / 1000
+        if read_only:
+            # The journal mode is a property of the file; a source is read as it is
+            return sqlite3.connect(f"{pathlib.Path(db_path).as_uri()}?mode=ro", uri=True, check_same_thread=False, timeout=timeout)
+        # isolation_level=None: no implicit transactions, batches BEGIN/COMMIT explicitly
+        conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=timeout)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self, db_path: str, read_only: bool = False):
+        db_path = os.path.abspath(db_path)
+        key = (db_path, read_only)
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = [queue.LifoQueue(), 0]
+            idle, opened = pool
+            self.checkouts += 1
+            if idle.empty() and opened < self.pool_size:
+                pool[1] += 1
+                self.connections_opened += 1
+                open_new = True
+            else:
+                open_new = False
+        if open_new:
+            try:
+                conn = self._connect(db_path, read_only)
+            except Exception:
+                with self._lock:
+                    pool[1] -= 1
+                raise
+        else:
+            # Waits for a connection to come back when all are checked out
+            conn = idle.get()
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            idle.put(conn)
+
+    def close_all(self) -> None:
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for idle, _ in pools.values():
+            while not idle.empty():
+                idle.get_nowait().close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "databases": len({db_path for db_path, _ in self._pools}),
+                "connections_opened": self.connections_opened,
+                "checkouts": self.checkouts,
+                "idle": sum(idle.qsize() for idle, _ in self._pools.values()),
+            }
+
+    # --- reads ---
+
+    def list_tables(self, db_path: str) -> list:
+        with self.connection(db_path, read_only=True) as conn:
+            rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+        return [r[0] for r in rows]
+
+    def check_table_exists(self, db_path: str, table: str) -> bool:
+        if not os.path.exists(db_path):
+            return False
+        with self.connection(db_path, read_only=True) as conn:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+    def preview(self, db_path: str, table: str, nrows: int = 5, columns: Optional[list] = None) -> pd.DataFrame:
+        """First `nrows` rows of a table; only those rows are read (LIMIT), not the table."""
+        selected = ", ".join(quote_identifier(c) for c in columns) if columns else "*"
+        with self.connection(db_path, read_only=True) as conn:
+            cursor = conn.execute(f"SELECT {selected} FROM {quote_identifier(table)} LIMIT ?", (int(nrows),))
+            names = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        return pd.DataFrame(rows, columns=names)
+
+    # --- writes ---
+
+    def create_table(self, conn: sqlite3.Connection, table: str, columns: dict, if_exists: str = "append") -> None:
+        if if_exists == "replace":
+            conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(table)}")
+        definition = ", ".join(f"{quote_identifier(name)} {type_}" for name, type_ in columns.items())
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {quote_identifier(table)} ({definition})")
+
+    def insert_rows(self, db_path: str, table: str, columns: list, rows: Iterable[tuple], batch_size: Optional[int] = None) -> int:
+        """Insert an iterable of row tuples in batches; each batch is one transaction. Returns rows written."""
+        batch_size = batch_size or self.batch_size
+        sql = (
+            f"INSERT INTO {quote_identifier(table)} ({', '.join(quote_identifier(c) for c in columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        written = 0
+        rows = iter(rows)
+        with self.connection(db_path) as conn:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(sql, batch)
+                conn.execute("COMMIT")
+                written += len(batch)
+        return written
+
+    def write_dataframe(self, df: pd.DataFrame, db_path: str, table: str, if_exists: str = "append",
+                        batch_size: Optional[int] = None) -> int:
+        """Create the table from the DataFrame's dtypes if needed and append its rows."""
+        batch_size = batch_size or self.batch_size
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self.connection(db_path) as conn:
+            self.create_table(conn, table, {c: sqlite_type(df[c].dtype) for c in df.columns}, if_exists=if_exists)
+        rows = itertools.chain.from_iterable(
+            dataframe_rows(df.iloc[start:start + batch_size]) for start in range(0, len(df), batch_size)
+        )
+        return self.insert_rows(db_path, table, list(df.columns), rows, batch_size)
+
+
+def dataframe_rows(df: pd.DataFrame):
+    """
+    Row tuples of plain Python values, converted column-wise: tolist() per column,
+    naive timestamps as ISO strings in one vectorized call, NaN/NaT as None.
+    Several times faster than astype(object) plus a per-value sqlite3 adapter.
+    """
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        if pd.api.types.is_datetime64_dtype(series.dtype):
+            values = np.datetime_as_string(series.values, unit="us").tolist()
+        else:
+            values = series.tolist()
+        if series.hasnans:
+            values = [None if missing else v for v, missing in zip(values, series.isna().tolist())]
+        columns.append(values)
+    return zip(*columns)
@@ -83,3 +83,30 @@ class MinioStorage:
             extra["ContentType"] = content_type
         self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **extra)
         return {"object_key": key, "public_url": f"{self.public_base_url}/{self.bucket}/{key}"}
+
+    def head_object(self, key: str, bucket: Optional[str] = None):
+        resp = self.client.head_object(Bucket=bucket or self.bucket, Key=key)
+        return {
+            "size": resp["ContentLength"],
+            "etag": resp.get("ETag", "").strip('"'),
+            "content_type": resp.get("ContentType"),
+            "last_modified": resp.get("LastModified"),
+        }
+
+    def get_range(self, key: str, start: int, end: int, bucket: Optional[str] = None) -> bytes:
+        """Fetch bytes [start, end] (inclusive, like the HTTP Range header) of an object."""
+        resp = self.client.get_object(Bucket=bucket or self.bucket, Key=key, Range=f"bytes={start}-{end}")
+        return resp["Body"].read()
+
+    def download_to(self, key: str, path: str, bucket: Optional[str] = None, etag: Optional[str] = None, chunk_size: int = 1024 * 1024) -> int:
+        """Stream an object to a local file. With `etag` the GET fails if the object changed meanwhile."""
+        params = {"Bucket": bucket or self.bucket, "Key": key}
+        if etag:
+            params["IfMatch"] = f'"{etag}"'
+        resp = self.client.get_object(**params)
+        written = 0
+        with open(path, "wb") as f:
+            for chunk in resp["Body"].iter_chunks(chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+        return written
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import shlex
+import subprocess
+import tempfile
+import threading
+from typing import Optional
+
+from app.services.generators.pipeline_code_generator import ALLOWED_PACKAGES
+from app.services.process_runner import run_measured
+
+BASE_IMAGE_REPO = "dataops-pipeline-base"
+BASE_IMAGE_LABEL = "dataops.pipeline-base"
+# Pipelines write to ../pipelines/<name>/output and read ../../data relative to
+# their folder, so mount them at the same relative layout inside the container.
+CONTAINER_ROOT = "/work"
+# `timeout` exit status when it had to stop the command
+TIMEOUT_EXIT_CODE = 124
+# Container killed by the kernel OOM killer under --memory
+OOM_EXIT_CODE = 137
+
+
+class DockerRunnerService:
+    """
+    Runs generated pipelines in containers started from one prebuilt base image.
+
+    The base image has every ALLOWED_PACKAGES entry installed and is tagged with
+    a hash of the requirements, so it is built once per package set instead of
+    once per pipeline and retry. Pipeline code is bind-mounted rather than copied
+    into a new image. Older base images are removed once a new one is built.
+    The CLI is configurable (DOCKER_CLI), so podman or a stand-in script with the
+    same `image inspect` / `build` / `run` / `images` / `rmi` interface also works.
+    Containers join PIPELINE_DOCKER_NETWORK when set (e.g. the compose network
+    MinIO is on, so S3 pipelines can reach minio:9000).
+    """
+
+    def __init__(self, log, docker_cmd: Optional[str] = None, python_image: Optional[str] = None,
+                 network: Optional[str] = None):
+        self.log = log
+        self.docker_cmd = shlex.split(docker_cmd or os.getenv("DOCKER_CLI", "docker"))
+        self.python_image = python_image or os.getenv("PIPELINE_PYTHON_IMAGE", "python:3.11-slim")
+        self.network = network or os.getenv("PIPELINE_DOCKER_NETWORK") or None
+        self.data_dir = os.path.abspath(os.getenv("PIPELINE_DATA_DIR", "../data"))
+        self._build_lock = threading.Lock()
+
+    # --- base image ---
+
+    def requirements_text(self) -> str:
+        return "\n".join(sorted(ALLOWED_PACKAGES)) + "\n"
+
+    def base_image_tag(self) -> str:
+        digest = hashlib.sha256(f"{self.python_image}\n{self.requirements_text()}".encode()).hexdigest()[:12]
+        return f"{BASE_IMAGE_REPO}:{digest}"
+
+    def _docker(self, *args, **kwargs) -> subprocess.CompletedProcess:
+        return subprocess.run([*self.docker_cmd, *args], capture_output=True, text=True, **kwargs)
+
+    def image_exists(self, tag: str) -> bool:
+        return self._docker("image", "inspect", tag).returncode == 0
+
+    def ensure_base_image(self) -> str:
+        tag = self.base_image_tag()
+        if self.image_exists(tag):
+            return tag
+        with self._build_lock:
+            # Another request may have built it while we waited
+            if self.image_exists(tag):
+                return tag
+            self.log.info(f"Building pipeline base image {tag}...")
+            with tempfile.TemporaryDirectory() as context:
+                with open(os.path.join(context, "requirements.txt"), "w") as f:
+                    f.write(self.requirements_text())
+                with open(os.path.join(context, "Dockerfile"), "w") as f:
+                    f.write(
+                        f"FROM {self.python_image}\n"
+                        f"LABEL {BASE_IMAGE_LABEL}=1\n"
+                        "COPY requirements.txt /tmp/requirements.txt\n"
+                        "RUN pip install --no-cache-dir -r /tmp/requirements.txt\n"
+                        f"WORKDIR {CONTAINER_ROOT}\n"
+                    )
+                result = self._docker("build", "-t", tag, context)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to build base image {tag}: {result.stderr[-2000:]}")
+            self.cleanup_old_images(keep=tag)
+        return tag
+
+    def cleanup_old_images(self, keep: str) -> list:
+        listed = self._docker("images", "--filter", f"label={BASE_IMAGE_LABEL}=1", "--format", "{{.Repository}}:{{.Tag}}")
+        removed = []
+        for image in listed.stdout.split():
+            if image == keep or image.endswith(":<none>"):
+                continue
+            if self._docker("rmi", image).returncode == 0:
+                removed.append(image)
+        if removed:
+            self.log.info(f"Removed old pipeline base images: {removed}")
+        return removed
+
+    # --- runs ---
+
+    def _env_file_values(self, folder: str) -> dict:
+        env_path = os.path.join(folder, ".env")
+        values = {}
+        if not os.path.exists(env_path):
+            return values
+        with open(env_path) as f:
+            for line in f:
+                key, _, value = line.strip().partition("=")
+                if key:
+                    values[key] = value
+        return values
+
+    def run(self, folder: str, pipeline_name: str, command: list, budget: dict, data_folder: Optional[str] = None,
+            cancel: Optional[threading.Event] = None) -> dict:
+        """
+        Run `command` inside a container from the base image with the pipeline folder,
+        its input data and its SQLite destination directory mounted. Returns
+        run_measured's result with container-level limits applied; CPU and RSS
+        figures are None because the docker client's own are meaningless here.
+        Setting `cancel` kills the client and the container.
+        """
+        tag = self.ensure_base_image()
+        workdir = f"{CONTAINER_ROOT}/pipelines/{pipeline_name}"
+        mounts = ["-v", f"{folder}:{workdir}"]
+        env = []
+
+        env_values = self._env_file_values(folder)
+        data_folder = data_folder or env_values.get("DATA_FOLDER")
+        if data_folder and "://" not in data_folder:
+            if os.path.isabs(data_folder):
+                # Absolute paths (cache, synthetic inputs) are mounted at the same path
+                mounts += ["-v", f"{data_folder}:{data_folder}:ro"]
+                env += ["-e", f"DATA_FOLDER={data_folder}"]
+            elif os.path.isdir(self.data_dir):
+                mounts += ["-v", f"{self.data_dir}:{CONTAINER_ROOT}/data:ro"]
+
+        db_path = env_values.get("SQLITE_DB_PATH")
+        if db_path and os.path.isabs(db_path):
+            # SQLite destination (host path): mount its directory read-write at the same
+            # path, or the database would be written inside the --rm container and lost.
+            # The directory, not the file, so the WAL and journal files land next to it.
+            db_dir = os.path.dirname(db_path)
+            os.makedirs(db_dir, exist_ok=True)
+            mounts += ["-v", f"{db_dir}:{db_dir}"]
+
+        timeout = int(budget["timeout_seconds"])
+        container = f"dataops-{pipeline_name}-{os.urandom(4).hex()}"
+        args = [
+            *self.docker_cmd, "run", "--rm", "--name", container,
+            "--memory", f"{budget['max_rss_mb']}m",
+            "--memory-swap", f"{budget['max_rss_mb']}m",
+            *(["--network", self.network] if self.network else []),
+            *mounts, *env,
+            "-w", workdir,
+            tag,
+            "timeout", str(timeout), *command,
+        ]
+        # Client side timeout only as a backstop if the daemon hangs
+        result = run_measured(args, timeout=timeout + 60, cancel=cancel)
+        if result["cancelled"]:
+            # Killing the client does not stop the container
+            self._docker("kill", container)
+        result["timed_out"] = result["timed_out"] or result["returncode"] == TIMEOUT_EXIT_CODE
+        result["oom_killed"] = result["returncode"] == OOM_EXIT_CODE
+        result.update({"max_rss_kb": None, "user_cpu_seconds": None, "sys_cpu_seconds": None})
+        return result
@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import pandas as pd
+
+from app.services.source.s3_object_service import parse_s3_path
+
+# Rows per block written to the synthetic file; the block is repeated until the target size
+BLOCK_ROWS = 50_000
+
+
+class SyntheticDataService:
+    """
+    Builds synthetic pipeline inputs shaped like the data preview but larger
+    than a memory budget, to check that a generated pipeline really streams.
+    Files are laid out under a scratch DATA_FOLDER at the path the pipeline
+    expects (the spec's source_path, with glob wildcards filled in).
+    """
+
+    def __init__(self, log, scratch_dir: Optional[str] = None):
+        self.log = log
+        self.scratch_dir = scratch_dir or os.getenv("SYNTHETIC_DATA_DIR") or tempfile.gettempdir()
+
+    def relative_input_path(self, spec: dict) -> Optional[str]:
+        source_path = spec.get("source_path", "")
+        if spec.get("source_type") == "s3Object":
+            _, path = parse_s3_path(source_path, "")
+        else:
+            # Same normalisation as LocalFileService._resolve_pattern
+            path = source_path.lstrip("./")
+            if path.startswith("data/"):
+                path = path[5:]
+        path = path.replace("**/", "").replace("*", "synthetic").replace("?", "x")
+        if not path or os.path.isabs(path) or ".." in path.split("/"):
+            return None
+        return path
+
+    def create_oversized_input(self, spec: dict, data_preview: list, target_bytes: int) -> Optional[str]:
+        """
+        Write an input of at least `target_bytes` and return the DATA_FOLDER holding it.
+        Returns None when the source format cannot be streamed (e.g. a JSON array)
+        or there is no preview to base rows on.
+        """
+        if not data_preview:
+            return None
+        relative = self.relative_input_path(spec)
+        if relative is None:
+            return None
+        ext = os.path.splitext(relative)[1].lower()
+        if ext not in (".csv", ".parquet", ".jsonl", ".ndjson"):
+            return None
+
+        data_folder = tempfile.mkdtemp(prefix="streaming_check_", dir=self.scratch_dir)
+        path = os.path.join(data_folder, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        preview = pd.DataFrame(data_preview)
+        block = pd.concat([preview] * (BLOCK_ROWS // len(preview) + 1), ignore_index=True).head(BLOCK_ROWS)
+        try:
+            if ext == ".parquet":
+                self._write_parquet(path, block, target_bytes)
+            else:
+                self._write_text(path, block, target_bytes, ext)
+        except Exception:
+            self.cleanup(data_folder)
+            raise
+        self.log.info(f"Created synthetic input {path} ({os.path.getsize(path)} bytes) for streaming check")
+        return data_folder
+
+    def _write_text(self, path: str, block: pd.DataFrame, target_bytes: int, ext: str) -> None:
+        if ext == ".csv":
+            payload = block.to_csv(index=False).encode()
+            header, body = payload.split(b"\n", 1)
+            with open(path, "wb") as f:
+                f.write(header + b"\n")
+                while f.tell() < target_bytes:
+                    f.write(body)
+        else:
+            body = block.to_json(orient="records", lines=True, date_format="iso").encode()
+            with open(path, "wb") as f:
+                while f.tell() < target_bytes:
+                    f.write(body)
+
+    def _write_parquet(self, path: str, block: pd.DataFrame, target_bytes: int) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(block, preserve_index=False)
+        # Repeated rows compress to almost nothing, so size by decoded bytes:
+        # that is what a pipeline loading the whole file would hold in memory
+        written = 0
+        with pq.ParquetWriter(path, table.schema) as writer:
+            while written < target_bytes:
+                writer.write_table(table)
+                written += table.nbytes
+
+    def cleanup(self, data_folder: str) -> None:
+        shutil.rmtree(data_folder, ignore_errors=True)
@@ -3,17 +3,34 @@ import subprocess
 import sys
 import runpy
 
+from app.services.process_runner import run_measured
+from app.services.tests.docker_runner_service import DockerRunnerService
+from app.services.tracing import tracer
+
+DEFAULT_BUDGET = {
+    # Wall time per step (pipeline run, pytest run); the process is killed past it
+    "timeout_seconds": float(os.getenv("PIPELINE_TEST_TIMEOUT_SECONDS", "300")),
+    # Peak resident memory of a step; the step is killed once it goes past it
+    "max_rss_mb": int(os.getenv("PIPELINE_TEST_MAX_RSS_MB", "2048")),
+    # Combined stdout/stderr of a step
+    "max_output_bytes": int(os.getenv("PIPELINE_TEST_MAX_OUTPUT_BYTES", str(10 * 1024 * 1024))),
+    # Optional hard address space cap (0 = off); numpy/pyarrow reserve a lot of virtual memory
+    "address_space_limit_mb": int(os.getenv("PIPELINE_TEST_ADDRESS_SPACE_MB", "0")),
+    "install_timeout_seconds": float(os.getenv("PIPELINE_INSTALL_TIMEOUT_SECONDS", "600")),
+}
+
 class TestPipelineService:
-    def __init__(self, log):
+    def __init__(self, log, budget: dict = None):
             self.log = log
+            self.budget = {**DEFAULT_BUDGET, **(budget or {})}
+            self.docker_runner = DockerRunnerService(log)
 
-    def create_pipeline_output(self, pipeline_name: str, code: str, requirements: str, python_test: str, output_dir="../pipelines") -> str:
+    def create_pipeline_output(self, pipeline_name: str, code: str, requirements: str, python_test: str, output_dir="../pipelines", env: dict = None) -> str:
         folder = os.path.abspath(os.path.join(output_dir, pipeline_name))
         os.makedirs(folder, exist_ok=True)
         code_path = os.path.join(folder, f"{pipeline_name}.py")
         req_path = os.path.join(folder, "requirements.txt")
         test_path = os.path.join(folder, f"{pipeline_name}_test.py")
-        env_path = os.path.join(folder, ".env")
 
         with open(code_path, "w") as f:
             f.write(code)
@@ -21,71 +38,162 @@ class TestPipelineService:
             f.write(requirements)
         with open(test_path, "w") as f:
             f.write(python_test)
-        with open(env_path, "w") as f:
-            f.write("DATA_FOLDER=../../data\n")
+        self.write_env(folder, env)
         return folder
 
-    def run_pipeline_test(self, folder: str, pipeline_name: str, execution_mode="venv") -> dict:
+    def write_env(self, folder: str, env: dict = None) -> str:
+        env_path = os.path.join(folder, ".env")
+        env_vars = {"DATA_FOLDER": "../../data"}
+        env_vars.update(env or {})
+        with open(env_path, "w") as f:
+            for key, value in env_vars.items():
+                f.write(f"{key}={value}\n")
+        return env_path
+
+    def run_pipeline_test(self, folder: str, pipeline_name: str, execution_mode="venv", budget: dict = None) -> dict:
         self.log.info(f"Running pipeline test for {pipeline_name}...")
-        code_path = os.path.join(folder, f"{pipeline_name}.py")
-        req_path = os.path.join(folder, "requirements.txt")
+        budget = {**self.budget, **(budget or {})}
+        metrics = {"budget": budget, "execution_mode": execution_mode}
+        try:
+            run = self.step_runner(folder, pipeline_name, execution_mode, budget)
+        except Exception as e:
+            self.log.error(f"Error occurred while preparing pipeline test: {e}")
+            return {"success": False, "details": str(e), "metrics": metrics}
+        if run is None:
+            return {"success": False, "details": "Unknown execution mode.", "metrics": metrics}
+
+        try:
+            with tracer.span("pipeline.run") as span:
+                result = run(["python", f"{pipeline_name}.py"])
+                span.set(**self.step_metrics(result))
+            metrics["pipeline"] = self.step_metrics(result)
+            self.log.info(f"Pipeline test completed for {pipeline_name} with return code {result['returncode']}. Metrics: {metrics['pipeline']}")
+            violations = self.budget_violations("pipeline run", result, budget)
+            if violations:
+                self.log.error(f"Pipeline {pipeline_name} exceeded its performance budget: {violations}")
+                return {"success": False, "details": self.budget_details(violations, result), "metrics": metrics}
+            if result["returncode"] != 0:
+                self.log.error(f"Pipeline test failed for {pipeline_name} with error: {result['stderr']}")
+                return {"success": False, "details": result["stderr"], "metrics": metrics}
+
+            # Run test to verify the output of the main transformation function
+            try:
+                with tracer.span("pytest") as span:
+                    test_result = run(["python", "-m", "pytest", f"{pipeline_name}_test.py"])
+                    span.set(**self.step_metrics(test_result))
+                metrics["unit_test"] = self.step_metrics(test_result)
+                violations = self.budget_violations("unit test", test_result, budget)
+                if violations:
+                    self.log.error(f"Unit test for {pipeline_name} exceeded its performance budget: {violations}")
+                    return {"success": False, "details": self.budget_details(violations, test_result), "metrics": metrics}
+                if test_result["returncode"] != 0:
+                    self.log.error(f"Unit test failed for {pipeline_name} with error: {test_result['stderr']} and stdout: {test_result['stdout']}")
+                    return {"success": False, "details": f"Unit test failed with error: {test_result['stderr']}, stdout: {test_result['stdout']}", "metrics": metrics}
+
+                self.log.info(f"Unit test executed successfully for {pipeline_name} with output: {test_result['stdout']}")
+                return {"success": True, "details": "Unit test executed successfully.", "stdout": test_result["stdout"], "metrics": metrics}
+            except Exception as e:
+                self.log.error(f"Unit test failed for {pipeline_name} with exception: {e}")
+                return {"success": False, "details": str(e), "metrics": metrics}
+        except Exception as e:
+            self.log.error(f"Error occurred while running pipeline test: {e}")
+            return {"success": False, "details": str(e), "metrics": metrics}
+
+    def step_runner(self, folder: str, pipeline_name: str, execution_mode: str, budget: dict, data_folder: str = None):
+        """
+        Prepare the execution environment and return a function running one
+        command (["python", ...]) in it, or None for an unknown mode.
+        """
         if execution_mode == "venv":
-            try: 
-                venv_path = os.path.join(folder, "venv")
-                subprocess.run([sys.executable, "-m", "venv", venv_path], check=True)
+            venv_path = os.path.join(folder, "venv")
+            python_path = os.path.join(venv_path, "bin", "python")
+            if not os.path.exists(python_path):
+                with tracer.span("venv.create"):
+                    subprocess.run([sys.executable, "-m", "venv", venv_path], check=True)
+            if data_folder is None:
+                # Requirements may change between retries; pip is a no-op when satisfied
                 pip_path = os.path.join(venv_path, "bin", "pip")
-                python_path = os.path.join(venv_path, "bin", "python")
-                subprocess.run([pip_path, "install", "-r", req_path], check=True)
-                result = subprocess.run([python_path, code_path], capture_output=True, text=True, cwd=folder)
-                self.log.info(f"Pipeline test completed for {pipeline_name} with return code {result.returncode}.")
-                if result.returncode != 0:
-                    self.log.error(f"Pipeline test failed for {pipeline_name} with error: {result.stderr}")
-                    return {"success": False, "details": result.stderr}
-                
-                # Run test to verify the output of the main transformation function
-                test_path = os.path.join(folder, f"{pipeline_name}_test.py")
-                try:
-                    test_result = subprocess.run(
-                        [python_path, "-m", "pytest", test_path],
-                        capture_output=True,
-                        text=True,
-                        cwd=folder
-                    )
-                    if test_result.returncode != 0:
-                        self.log.error(f"Unit test failed for {pipeline_name} with error: {test_result.stderr} and stdout: {test_result.stdout}")
-                        return {"success": False, "details": f"Unit test failed with error: {test_result.stderr}, stdout: {test_result.stdout}"}
-
-                    self.log.info(f"Unit test executed successfully for {pipeline_name} with output: {test_result.stdout}")
-                    return {"success": True, "details": "Unit test executed successfully.", "stdout": test_result.stdout}
-                except Exception as e:
-                    self.log.error(f"Unit test failed for {pipeline_name} with exception: {e}")
-                    return {"success": False, "details": str(e)}
-            except Exception as e:
-                self.log.error(f"Error occurred while running pipeline test: {e}")
-                return {"success": False, "details": str(e)}
-        elif execution_mode == "docker":
-            dockerfile_path = os.path.join(folder, "Dockerfile")
-            dockerfile_content = f"""
-                FROM python:3.11-slim
-                WORKDIR /app
-                COPY requirements.txt .
-                RUN pip install --no-cache-dir -r requirements.txt
-                COPY {pipeline_name}_test.py .
-                CMD ["python", "{pipeline_name}_test.py"]
-                """
-            with open(dockerfile_path, "w") as f:
-                f.write(dockerfile_content)
-            image_tag = f"{pipeline_name}_test_image"
-            subprocess.run(["docker", "build", "-t", image_tag, folder], check=True)
-            result = subprocess.run(["docker", "run", "--rm", image_tag], capture_output=True, text=True)
-        else:
-            return {"success": False, "details": "Unknown execution mode."}
-        return {
-            "success": result.returncode == 0,
-            "stdout": result.stdout,
-            "stderr": result.stderr
-        }
-
-    def create_and_run_unittest(self, name: str, code: str, requirements: str, python_test: str, execution_mode="venv") -> dict:
-        folder = self.create_pipeline_output(name, code, requirements, python_test)
-        return self.run_pipeline_test(folder, name, execution_mode)
\ No newline at end of file
+                req_path = os.path.join(folder, "requirements.txt")
+                with tracer.span("pip.install"):
+                    subprocess.run([pip_path, "install", "-r", req_path], check=True, timeout=budget["install_timeout_seconds"])
+            # An explicit DATA_FOLDER wins over the pipeline's .env (load_dotenv does not override)
+            env = {**os.environ, "DATA_FOLDER": data_folder} if data_folder else None
+            return lambda command: self.run_step([python_path, *command[1:]], folder, budget, env=env)
+        if execution_mode == "docker":
+            # Packages come from the shared base image, nothing is installed per pipeline
+            with tracer.span("docker.base_image"):
+                self.docker_runner.ensure_base_image()
+            return lambda command: self.docker_runner.run(folder, pipeline_name, command, budget, data_folder=data_folder)
+        return None
+
+    def run_streaming_check(self, folder: str, pipeline_name: str, data_folder: str, memory_budget_mb: int, execution_mode="venv") -> dict:
+        """
+        Re-run an already tested pipeline against a synthetic input larger than its
+        memory budget, with the budget as a hard limit: the venv run is killed as
+        soon as the pipeline's own RSS passes it, the docker run gets --memory.
+        It passes only if the pipeline finishes under that limit.
+        """
+        self.log.info(f"Running streaming check for {pipeline_name} with a {memory_budget_mb} MB budget...")
+        budget = {**self.budget, "max_rss_mb": memory_budget_mb}
+        run = self.step_runner(folder, pipeline_name, execution_mode, budget, data_folder=data_folder)
+        result = run(["python", f"{pipeline_name}.py"])
+        metrics = self.step_metrics(result)
+        violations = self.budget_violations("streaming check on input larger than the memory budget", result, budget)
+        if violations:
+            self.log.error(f"Pipeline {pipeline_name} is not streaming-safe: {violations}")
+            return {"success": False, "details": self.budget_details(violations, result), "metrics": metrics}
+        if result["returncode"] != 0:
+            self.log.error(f"Streaming check failed for {pipeline_name} with error: {result['stderr']}")
+            return {"success": False, "details": f"Pipeline failed on a large input: {result['stderr'][-2000:]}", "metrics": metrics}
+        peak = f" (peak {result['max_rss_kb'] / 1024:.0f} MB)" if result["max_rss_kb"] is not None else ""
+        return {"success": True, "details": f"Pipeline stayed within its {memory_budget_mb} MB memory budget on an oversized input{peak}.", "metrics": metrics}
+
+    def run_step(self, args: list, folder: str, budget: dict, env: dict = None) -> dict:
+        return run_measured(
+            args,
+            cwd=folder,
+            timeout=budget["timeout_seconds"],
+            env=env,
+            memory_limit_mb=budget["max_rss_mb"],
+            address_space_limit_mb=budget["address_space_limit_mb"] or None,
+        )
+
+    @staticmethod
+    def step_metrics(result: dict) -> dict:
+        keys = ("wall_seconds", "user_cpu_seconds", "sys_cpu_seconds", "max_rss_kb", "output_bytes", "timed_out", "returncode")
+        metrics = {key: result[key] for key in keys}
+        for key in ("memory_exceeded", "oom_killed"):
+            if key in result:
+                metrics[key] = result[key]
+        return metrics
+
+    @staticmethod
+    def budget_violations(step: str, result: dict, budget: dict) -> list:
+        violations = []
+        if result["timed_out"]:
+            violations.append(f"{step} exceeded the {budget['timeout_seconds']}s time limit and was killed")
+        if result.get("oom_killed") or result.get("memory_exceeded"):
+            violations.append(f"{step} was killed for exceeding the {budget['max_rss_mb']} MB memory limit")
+        elif result["max_rss_kb"] is not None and result["max_rss_kb"] / 1024 > budget["max_rss_mb"]:
+            violations.append(f"{step} peak memory {result['max_rss_kb'] / 1024:.0f} MB exceeded the {budget['max_rss_mb']} MB limit")
+        if result["output_bytes"] > budget["max_output_bytes"]:
+            violations.append(f"{step} wrote {result['output_bytes']} bytes to stdout/stderr, limit is {budget['max_output_bytes']}")
+        return violations
+
+    @staticmethod
+    def budget_details(violations: list, result: dict) -> str:
+        # Worded for the repair prompt: say what was too expensive, not just that it failed
+        return (
+            "Performance budget exceeded: " + "; ".join(violations) + ". "
+            "Rewrite the code to use less time and memory (e.g. process the data in chunks, avoid copying DataFrames, "
+            "select only needed columns) and keep logging output small.\n"
+            f"stderr (tail): {result['stderr'][-2000:]}"
+        )
+
+    def create_and_run_unittest(self, name: str, code: str, requirements: str, python_test: str, execution_mode="venv", env: dict = None,
+                                output_dir="../pipelines") -> dict:
+        with tracer.span("files.write", file_count=4):
+            folder = self.create_pipeline_output(name, code, requirements, python_test, output_dir=output_dir, env=env)
+        result = self.run_pipeline_test(folder, name, execution_mode)
+        result["folder"] = folder
+        return result
\ No newline at end of file
@@ -0,0 +1,235 @@
+import contextvars
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+SERVICE_NAME = "dataops-assistant"
+# Width of the text bar drawn for each span in a waterfall
+WATERFALL_WIDTH = 60
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list = []
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span") -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def root(self) -> "Span":
+        return self.spans[0]
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: dict, start_ns: Optional[int] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes)
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class _NoopSpan:
+    def set(self, **attributes) -> None:
+        pass
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP JSON encodes 64-bit integers as strings
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """
+    Minimal in-process tracer. Spans nest through a context variable, so child
+    spans opened in other threads join the trace as long as the context is
+    carried over (asyncio.to_thread and BuildQueue both do). Finished traces are
+    kept in memory (the most recent ones, and the slowest ones that finished
+    within the last `window_seconds`) for the debug endpoints and, with
+    TRACE_EXPORT_PATH set, appended to that file as OTLP/JSON, one
+    ExportTraceServiceRequest per line.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_traces: Optional[int] = None, export_path: Optional[str] = None,
+                 window_seconds: Optional[float] = None):
+        self.enabled = enabled if enabled is not None else os.getenv("TRACING_ENABLED", "true").lower() == "true"
+        self.max_traces = max_traces or int(os.getenv("TRACING_MAX_TRACES", "200"))
+        self.export_path = export_path or os.getenv("TRACE_EXPORT_PATH")
+        self.window_seconds = window_seconds or float(os.getenv("TRACING_SLOWEST_WINDOW_SECONDS", "3600"))
+        self._lock = threading.Lock()
+        self._recent: deque = deque(maxlen=self.max_traces)
+        # Min-heap of (duration_ms, seq, trace) holding the slowest traces of the window
+        self._slowest: list = []
+        self._seq = 0
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield _NoopSpan()
+            return
+        parent = _current_span.get()
+        trace = parent.trace if parent is not None else Trace()
+        span = Span(trace, name, parent.span_id if parent is not None else None, attributes)
+        trace.add(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+            if parent is None:
+                self._finish(trace)
+
+    def record_span(self, name: str, start_ns: int, end_ns: Optional[int] = None, **attributes) -> None:
+        """Add an already finished span (e.g. time spent waiting) under the current span."""
+        parent = _current_span.get()
+        if not self.enabled or parent is None:
+            return
+        span = Span(parent.trace, name, parent.span_id, attributes, start_ns=start_ns)
+        span.end_ns = end_ns or time.time_ns()
+        parent.trace.add(span)
+
+    def set_attributes(self, **attributes) -> None:
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def _finish(self, trace: Trace) -> None:
+        with self._lock:
+            self._recent.append(trace)
+            self._evict_expired(trace.root.end_ns)
+            self._seq += 1
+            entry = (trace.duration_ms, self._seq, trace)
+            if len(self._slowest) < self.max_traces:
+                heapq.heappush(self._slowest, entry)
+            elif entry[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+        if self.export_path:
+            line = json.dumps(self.to_otlp([trace]))
+            with self._lock:
+                with open(self.export_path, "a") as f:
+                    f.write(line + "\n")
+
+    def _evict_expired(self, now_ns: int) -> None:
+        # Without this one slow outlier would hold its slot (and the memory of its spans) forever
+        cutoff = now_ns - int(self.window_seconds * 1e9)
+        if self._slowest and min(t.root.end_ns for _, _, t in self._slowest) < cutoff:
+            self._slowest = [e for e in self._slowest if e[2].root.end_ns >= cutoff]
+            heapq.heapify(self._slowest)
+
+    # --- queries ---
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            for trace in self._recent:
+                if trace.trace_id == trace_id:
+                    return trace
+            for _, _, trace in self._slowest:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def slowest(self, limit: int = 10, name: Optional[str] = None, window_seconds: Optional[float] = None) -> list:
+        """Slowest traces that finished within the last `window_seconds` (at most the tracer's window)."""
+        window = min(window_seconds or self.window_seconds, self.window_seconds)
+        cutoff = time.time_ns() - int(window * 1e9)
+        with self._lock:
+            # Recent traces too: a slow one may have been turned away while the heap was full of older ones
+            candidates = {t.trace_id: t for _, _, t in self._slowest}
+            candidates.update((t.trace_id, t) for t in self._recent)
+        traces = [t for t in candidates.values() if t.root.end_ns >= cutoff]
+        if name:
+            traces = [t for t in traces if any(s.name == name for s in t.spans)]
+        return sorted(traces, key=lambda t: t.duration_ms, reverse=True)[:limit]
+
+    # --- rendering ---
+
+    @staticmethod
+    def waterfall(trace: Trace) -> dict:
+        spans = sorted(trace.spans, key=lambda s: s.start_ns)
+        root = trace.root
+        total_ns = max((root.end_ns or time.time_ns()) - root.start_ns, 1)
+        depth = {root.span_id: 0}
+        rows = []
+        for span in spans:
+            depth.setdefault(span.span_id, depth.get(span.parent_id, 0) + 1)
+            offset_ns = span.start_ns - root.start_ns
+            end_ns = (span.end_ns or time.time_ns()) - root.start_ns
+            start_col = int(offset_ns / total_ns * WATERFALL_WIDTH)
+            end_col = max(start_col + 1, int(end_ns / total_ns * WATERFALL_WIDTH))
+            rows.append({
+                "name": span.name,
+                "depth": depth[span.span_id],
+                "offset_ms": round(offset_ns / 1e6, 3),
+                "duration_ms": round(span.duration_ms, 3),
+                "attributes": span.attributes,
+                "error": span.error,
+                "bar": " " * start_col + "#" * (end_col - start_col) + " " * (WATERFALL_WIDTH - end_col),
+            })
+        return {"trace_id": trace.trace_id, "name": root.name, "duration_ms": round(trace.duration_ms, 3), "spans": rows}
+
+    @staticmethod
+    def to_otlp(traces: list) -> dict:
+        spans = []
+        for trace in traces:
+            for span in trace.spans:
+                otlp = {
+                    "traceId": trace.trace_id,
+                    "spanId": span.span_id,
+                    "name": span.name,
+                    # SPAN_KIND_INTERNAL
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns or time.time_ns()),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items() if v is not None],
+                    # STATUS_CODE_ERROR / STATUS_CODE_UNSET
+                    "status": {"code": 2, "message": span.error} if span.error else {"code": 0},
+                }
+                if span.parent_id:
+                    otlp["parentSpanId"] = span.parent_id
+                spans.append(otlp)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "app.services.tracing"}, "spans": spans}],
+            }]
+        }
+
+
+tracer = Tracer()
@@ -0,0 +1,277 @@
+"""
+Load test for POST /chat.
+
+Drives the endpoint at a fixed concurrency and reports p50/p95/p99 latency,
+end to end and for each build stage. By default the app runs in-process with
+LLM_MODE=replay, so it needs no network or API key: record a session first
+with LLM_MODE=record, then replay it here.
+
+The test stage is stubbed by default (`--tests stub`): a real run pip-installs
+requirements from PyPI, and a failed run makes the next code generation prompt
+carry stderr text that differs between runs, which replay cannot match. With
+`--tests run` the pipelines really run; pass `--wheelhouse DIR` so pip installs
+from local wheels only (PIP_NO_INDEX). In-process runs build into a throwaway
+pipelines directory with its own registry, never the live ../pipelines, and a
+stubbed test never marks a pipeline verified.
+
+    python -m app.tools.chat_load_test --concurrency 8 --requests 200
+    python -m app.tools.chat_load_test --tests run --wheelhouse ./wheels
+    python -m app.tools.chat_load_test --prompts prompts.txt --latency-scale 0.1
+    python -m app.tools.chat_load_test --url http://localhost:8000   # end to end only
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+SPEC_PROMPT_PREFIX = "Generate a pipeline spec for: "
+
+
+class StageTimer:
+    """Collects wall-clock durations per stage from wrapped service methods."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, obj, method: str, stage: str) -> None:
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+
+        setattr(obj, method, timed)
+
+    def wrap_queue(self, build_queue) -> None:
+        # Time between submit and a worker picking the build up
+        original = build_queue.submit
+
+        def submit(fn, priority="normal"):
+            submitted = time.perf_counter()
+
+            def run():
+                self.add("queue_wait", time.perf_counter() - submitted)
+                return fn()
+
+            return original(run, priority)
+
+        build_queue.submit = submit
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    # Nearest-rank percentile
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, int(round(p / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: dict) -> dict:
+    summary = {}
+    for stage, values in samples.items():
+        values = sorted(values)
+        summary[stage] = {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 4),
+            "p95": round(percentile(values, 95), 4),
+            "p99": round(percentile(values, 99), 4),
+            "max": round(values[-1], 4),
+        }
+    return summary
+
+
+def load_prompts(path: Optional[str]) -> list:
+    if path:
+        with open(path) as f:
+            return [line.strip() for line in f if line.strip()]
+    # Fall back to the prompts seen by spec generation in the recordings
+    from app.services.llm_service import recording_store
+
+    prompts = []
+    for record in recording_store().records():
+        request_input = record["request"].get("input")
+        if isinstance(request_input, str) and request_input.startswith(SPEC_PROMPT_PREFIX):
+            prompts.append(request_input[len(SPEC_PROMPT_PREFIX):])
+    return prompts
+
+
+def stub_tests(builder, seconds: float) -> None:
+    # Every pipeline passes its unit test and streaming check after `seconds`,
+    # so no retry (and no fix prompt) is ever generated
+    def run_pipeline_test(folder, pipeline_name, execution_mode="venv", budget=None):
+        time.sleep(seconds)
+        return {"success": True, "details": "Unit test stubbed by the load test.", "stdout": "", "metrics": {"stubbed": True}}
+
+    def run_streaming_check(spec, data_preview, test_result):
+        return test_result, True
+
+    register_pipeline = builder.register_pipeline
+
+    def register_unverified(spec, code, requirements, python_test, fingerprint, verified, *args):
+        # A stubbed test proves nothing about the code
+        return register_pipeline(spec, code, requirements, python_test, fingerprint, False, *args)
+
+    builder.test_service.run_pipeline_test = run_pipeline_test
+    builder.run_streaming_check = run_streaming_check
+    builder.register_pipeline = register_unverified
+
+
+def isolate_pipelines(root: str) -> str:
+    # Read when the app is imported and when the registry and scheduler are first
+    # used, so this must run before either
+    pipelines_dir = os.path.join(root, "pipelines")
+    os.makedirs(pipelines_dir, exist_ok=True)
+    os.environ["PIPELINES_DIR"] = pipelines_dir
+    os.environ["PIPELINE_REGISTRY_DB"] = os.path.join(pipelines_dir, "registry.db")
+    os.environ["SQLITE_DESTINATION_DB"] = os.path.join(pipelines_dir, "warehouse.db")
+    return pipelines_dir
+
+
+def use_wheelhouse(path: str) -> None:
+    # Inherited by the pip subprocesses of the test stage
+    os.environ["PIP_NO_INDEX"] = "1"
+    os.environ["PIP_FIND_LINKS"] = os.path.abspath(path)
+
+
+def instrument(timer: StageTimer, reuse: bool, tests: str = "stub", test_seconds: float = 0.0) -> None:
+    from app.routes.chat import chat_service
+
+    builder = chat_service.pipeline_builder_service
+    builder.reuse_enabled = reuse
+    if tests == "stub":
+        stub_tests(builder, test_seconds)
+    timer.wrap(chat_service.prompt_guard_service, "analyze", "guard")
+    timer.wrap_queue(chat_service.build_queue)
+    timer.wrap(builder.spec_gen, "generate_spec", "spec_generation")
+    timer.wrap(builder, "connect_to_source", "connect_to_source")
+    timer.wrap(builder.code_gen, "generate_code", "code_generation")
+    timer.wrap(builder, "create_and_run_unittest", "unit_tests")
+    timer.wrap(builder, "run_streaming_check", "streaming_check")
+    timer.wrap(builder, "deploy_pipeline", "deploy")
+
+
+async def drive(client, prompts: list, total: int, concurrency: int, priority: str, timer: StageTimer) -> Counter:
+    statuses = Counter()
+    next_index = iter(range(total))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"message": prompts[i % len(prompts)], "priority": priority})
+                statuses[response.status_code] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            timer.add("end_to_end", time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+async def main_async(args) -> dict:
+    import httpx
+
+    timer = StageTimer()
+    workdir = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+    else:
+        os.environ.setdefault("LLM_MODE", "replay")
+        workdir = tempfile.mkdtemp(prefix="chat-load-test-")
+        isolate_pipelines(workdir)
+        from app.main import app
+        from app.services.llm_service import recording_store
+
+        if args.latency_scale is not None:
+            recording_store().latency_scale = args.latency_scale
+        if args.latency_seconds is not None:
+            recording_store().latency_seconds = args.latency_seconds
+
+        if args.wheelhouse:
+            use_wheelhouse(args.wheelhouse)
+        instrument(timer, reuse=args.reuse, tests=args.tests, test_seconds=args.test_seconds)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None)
+
+    try:
+        prompts = load_prompts(args.prompts)
+        if not prompts:
+            raise SystemExit("No prompts: pass --prompts or record a session with LLM_MODE=record first")
+
+        started = time.perf_counter()
+        async with client:
+            statuses = await drive(client, prompts, args.requests, args.concurrency, args.priority, timer)
+        elapsed = time.perf_counter() - started
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(args.requests / elapsed, 3),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "stages": summarize(timer.samples),
+    }
+    if not args.url:
+        from app.routes.chat import chat_service
+        from app.services.llm_service import recording_store
+
+        report["replay"] = recording_store().stats()
+        report["queue"] = chat_service.build_queue.stats()
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"{report['requests']} requests at concurrency {report['concurrency']} in {report['elapsed_seconds']}s "
+          f"({report['requests_per_second']} req/s), statuses {report['statuses']}")
+    print(f"{'stage':<20}{'count':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<20}{s['count']:>7}{s['p50']:>10.3f}{s['p95']:>10.3f}{s['p99']:>10.3f}{s['max']:>10.3f}")
+    if "replay" in report:
+        print(f"replay: {report['replay']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test POST /chat (offline by default, using recorded LLM responses)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--prompts", help="file with one prompt per line (default: prompts found in the recordings)")
+    parser.add_argument("--priority", default="normal", choices=["high", "normal", "low"])
+    parser.add_argument("--url", help="test a running server instead of the in-process app (end-to-end latency only)")
+    parser.add_argument("--latency-scale", type=float, help="multiply recorded LLM latency (replay mode)")
+    parser.add_argument("--latency-seconds", type=float, help="fixed simulated LLM latency (replay mode)")
+    parser.add_argument("--tests", default="stub", choices=["stub", "run"],
+                        help="stub the unit test and streaming check (default, fully offline) or really run them")
+    parser.add_argument("--test-seconds", type=float, default=0.0, help="simulated duration of a stubbed test run")
+    parser.add_argument("--wheelhouse", help="with --tests run: install pipeline requirements only from wheels in this directory")
+    parser.add_argument("--reuse", action="store_true",
+                        help="allow registry reuse (off by default so every request builds); stubbed builds are never verified, "
+                             "so only --tests run builds are reused")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Latency of PromptGuardService.analyze on 1 KB - 1 MB inputs.
+
+Compares the current implementation (PatternScanner prefilter, translate based
+basic_clean) with the previous one, kept below as `reference_analyze`: every
+rule run over the whole text with its hits materialised, and a per-character
+clean. The verdict cache is bypassed so every call does the full work.
+
+    python -m app.tools.guard_benchmark
+    python -m app.tools.guard_benchmark --sizes 1024,65536 --repeat 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+import unicodedata
+from typing import Dict
+
+from app.services.guards.prompt_guard_service import (
+    BIDI_CHARS,
+    BLOCK_SCORE,
+    PATTERNS,
+    REVIEW_SCORE,
+    RISK_WEIGHTS,
+    SEVERITY,
+    ZERO_WIDTH,
+    PromptGuardService,
+    basic_clean,
+)
+
+# --- Previous implementation ---
+
+def reference_basic_clean(s: str) -> str:
+    s = unicodedata.normalize("NFKC", s)
+    for ch in BIDI_CHARS.union(ZERO_WIDTH):
+        s = s.replace(ch, "")
+    out = []
+    for ch in s:
+        if ch in ("\n", "\t"):
+            out.append(ch)
+        elif unicodedata.category(ch).startswith("C"):  # control/format/surrogate
+            continue
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def reference_analyze(raw: str) -> Dict:
+    cleaned = reference_basic_clean(raw)
+    findings = []
+    for key, rx, desc in PATTERNS:
+        hits = [(m.start(), m.end()) for m in rx.finditer(cleaned)]
+        if hits:
+            findings.append({
+                "rule": key,
+                "severity": SEVERITY.get(key, "low"),
+                "count": len(hits),
+                "description": desc,
+            })
+    score = sum(RISK_WEIGHTS[f["severity"]] * f["count"] for f in findings)
+    decision = "block" if score >= BLOCK_SCORE else "review" if score >= REVIEW_SCORE else "allow"
+    return {"cleaned": cleaned, "findings": findings, "risk_score": score, "decision": decision}
+
+
+# --- Inputs ---
+
+ASCII_WORDS = ("load", "the", "daily", "orders", "csv", "and", "aggregate", "revenue", "per", "country",
+               "filter", "refunded", "rows", "write", "to", "sqlite", "every", "morning")
+MIXED_WORDS = ASCII_WORDS + ("טען", "הזמנות", "données", "Straße", "ｆｕｌｌ", "naïve", "東京", "​zw")
+ATTACK_FRAGMENTS = ("import os", "eval(x)", "$(whoami)", "subprocess.run", "os.system", "SELECT * FROM t;",
+                    "ignore previous instruction", "system prompt", "https://evil.example/x", "[a](b)",
+                    "base64,", "```rm -rf```", "התעלם מהנחיות")
+
+
+def synthetic_prompt(size: int, kind: str, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    words = MIXED_WORDS if kind == "mixed" else ASCII_WORDS
+    parts, length = [], 0
+    while length < size:
+        if kind == "attack" and rng.random() < 0.1:
+            part = rng.choice(ATTACK_FRAGMENTS)
+        else:
+            part = rng.choice(words)
+        parts.append(part)
+        length += len(part) + 1
+    return " ".join(parts)[:size]
+
+
+def median_ms(fn, text: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(text)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(sizes: list, kinds: list, repeat: int) -> list:
+    guard = PromptGuardService(cache_size=0)
+    results = []
+    for kind in kinds:
+        for size in sizes:
+            text = synthetic_prompt(size, kind)
+            # Fewer repeats for the slow reference on large inputs
+            reference_repeat = max(1, min(repeat, repeat * 64 * 1024 // size))
+            results.append({
+                "kind": kind,
+                "bytes": len(text.encode("utf-8")),
+                "reference_ms": median_ms(reference_analyze, text, reference_repeat),
+                "current_ms": median_ms(guard._analyze, text, repeat),
+                "clean_reference_ms": median_ms(reference_basic_clean, text, reference_repeat),
+                "clean_current_ms": median_ms(basic_clean, text, repeat),
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="PromptGuardService.analyze latency, previous vs current implementation")
+    parser.add_argument("--sizes", default="1024,16384,131072,1048576", help="input sizes in characters")
+    parser.add_argument("--kinds", default="ascii,mixed,attack", help="ascii, mixed (non-ASCII scripts) and/or attack (rule-heavy)")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.sizes.split(",")], args.kinds.split(","), args.repeat)
+    print(f"{'kind':<8}{'bytes':>10}{'analyze old ms':>16}{'new ms':>10}{'speedup':>9}{'clean old ms':>14}{'new ms':>10}")
+    for r in results:
+        print(f"{r['kind']:<8}{r['bytes']:>10}{r['reference_ms']:>16.2f}{r['current_ms']:>10.2f}"
+              f"{r['reference_ms'] / r['current_ms']:>8.1f}x{r['clean_reference_ms']:>14.2f}{r['clean_current_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
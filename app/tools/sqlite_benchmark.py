@@ -0,0 +1,128 @@
+"""
+Insert throughput of the SQLite destination, in rows per second.
+
+Writes a synthetic pipeline output (default 1M rows) at several batch sizes,
+both the way PipelineCodeGenerator tells generated pipelines to (one sqlite3
+connection, WAL, batched executemany with per-batch BEGIN/COMMIT, values
+converted column-wise) and with SQLiteService, which does the same through its
+connection pool. Compares both with row-by-row
+autocommit inserts (timed on a sample and extrapolated) and DataFrame.to_sql.
+
+    python -m app.tools.sqlite_benchmark --rows 2000000 --batch-sizes 1000,10000,50000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.services.source.sqlite_service import SQLiteService, dataframe_rows
+
+
+def synthetic_output(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "id": np.arange(rows, dtype=np.int64),
+        "customer_id": rng.integers(0, 100_000, rows),
+        "amount": rng.random(rows) * 1000,
+        "country": rng.choice(["US", "DE", "IL", "FR", "JP", "BR"], rows),
+        "status": rng.choice(["paid", "refunded", "pending"], rows),
+        "date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+    })
+
+
+def instructed_write(df: pd.DataFrame, path: str, table: str, batch_size: int) -> int:
+    """The SQLite write path as destination_instructions describes it to the LLM."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"CREATE TABLE {table} ({', '.join(df.columns)})")
+        sql = f"INSERT INTO {table} VALUES ({', '.join('?' for _ in df.columns)})"
+        cursor = conn.cursor()
+        for start in range(0, len(df), batch_size):
+            # Column-wise conversion to plain Python values, as the instructions ask
+            rows = dataframe_rows(df.iloc[start:start + batch_size])
+            conn.execute("BEGIN")
+            cursor.executemany(sql, rows)
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return len(df)
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def run(rows: int, batch_sizes: list, row_by_row_sample: int, directory: str) -> list:
+    df = synthetic_output(rows)
+    results = []
+
+    for batch_size in batch_sizes:
+        path = os.path.join(directory, f"instructed_{batch_size}.db")
+        seconds = timed(lambda: instructed_write(df, path, "orders", batch_size))
+        results.append({"method": f"generated pipeline pattern, batch {batch_size}", "rows": rows, "seconds": seconds})
+
+        service = SQLiteService(batch_size=batch_size)
+        path = os.path.join(directory, f"batched_{batch_size}.db")
+        seconds = timed(lambda: service.write_dataframe(df, path, "orders", if_exists="replace"))
+        service.close_all()
+        results.append({"method": f"SQLiteService executemany, batch {batch_size}", "rows": rows, "seconds": seconds})
+
+    path = os.path.join(directory, "to_sql.db")
+    with sqlite3.connect(path) as conn:
+        seconds = timed(lambda: df.to_sql("orders", conn, if_exists="replace", index=False, chunksize=10_000))
+    results.append({"method": "DataFrame.to_sql, chunksize 10000", "rows": rows, "seconds": seconds})
+
+    # Row-by-row autocommit is far too slow for the full set: time a sample
+    sample = df.head(row_by_row_sample).astype(object).where(df.head(row_by_row_sample).notna(), None)
+    path = os.path.join(directory, "row_by_row.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"CREATE TABLE orders ({', '.join(df.columns)})")
+    sql = f"INSERT INTO orders VALUES ({', '.join('?' for _ in df.columns)})"
+
+    def row_by_row():
+        for row in sample.itertuples(index=False, name=None):
+            conn.execute(sql, row)
+
+    seconds = timed(row_by_row)
+    conn.close()
+    results.append({"method": "row-by-row autocommit (sampled)", "rows": row_by_row_sample, "seconds": seconds})
+
+    for result in results:
+        result["rows_per_second"] = result["rows"] / result["seconds"]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SQLite destination insert throughput")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-sizes", default="1000,10000,50000")
+    parser.add_argument("--row-by-row-sample", type=int, default=20_000)
+    parser.add_argument("--dir", help="where to write the databases (default: a temp dir, removed afterwards)")
+    args = parser.parse_args()
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+        results = run(args.rows, batch_sizes, args.row_by_row_sample, args.dir)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = run(args.rows, batch_sizes, args.row_by_row_sample, directory)
+
+    print(f"{'method':<44}{'rows':>10}{'seconds':>10}{'rows/s':>12}")
+    for r in results:
+        print(f"{r['method']:<44}{r['rows']:>10}{r['seconds']:>10.2f}{r['rows_per_second']:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
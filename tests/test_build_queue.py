@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.build_queue import BuildQueue, BuildRejected
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def blocking(release: threading.Event, value=None):
+    def build():
+        release.wait(10)
+        return value
+
+    return build
+
+
+def wait_running(queue: BuildQueue, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while queue.stats()["running"] < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_full_queue_rejects_immediately(release):
+    queue = BuildQueue(workers=1, max_queued=1, max_wait=60)
+    queue.submit(blocking(release))
+    wait_running(queue, 1)
+    queue.submit(blocking(release))
+    started = time.monotonic()
+    with pytest.raises(BuildRejected) as rejected:
+        queue.submit(blocking(release))
+    assert time.monotonic() - started < 0.1
+    assert rejected.value.retry_after >= 1
+    assert queue.stats()["rejected"] == 1
+
+
+def test_higher_priority_evicts_newest_lower_priority(release):
+    queue = BuildQueue(workers=1, max_queued=2, max_wait=60)
+    queue.submit(blocking(release))
+    wait_running(queue, 1)
+    older = queue.submit(blocking(release), "low")
+    newer = queue.submit(blocking(release), "low")
+    queue.submit(blocking(release), "high")
+    with pytest.raises(BuildRejected):
+        newer.result(timeout=1)
+    assert not older.done()
+    with pytest.raises(BuildRejected):
+        queue.submit(blocking(release), "low")
+
+
+def test_expired_builds_are_dropped(release):
+    queue = BuildQueue(workers=1, max_queued=2, max_wait=0.05)
+    queue.submit(blocking(release))
+    wait_running(queue, 1)
+    stale = queue.submit(blocking(release))
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(BuildRejected):
+        stale.result(timeout=5)
+    assert queue.stats()["expired"] == 1
+
+
+def test_awaiting_requests_hold_no_threads(release):
+    queue = BuildQueue(workers=2, max_queued=38, max_wait=60)
+
+    async def main():
+        running = [asyncio.create_task(queue.run(blocking(release, i))) for i in range(2)]
+        await asyncio.to_thread(wait_running, queue, 2)
+        baseline = threading.active_count()
+        queued = [asyncio.create_task(queue.run(blocking(release, i))) for i in range(2, 40)]
+        await asyncio.sleep(0.1)
+        # 38 more waiters, no more threads
+        added_threads = threading.active_count() - baseline
+        # The queue is full: the next request is turned away at once, not after a build
+        started = time.monotonic()
+        for _ in range(20):
+            with pytest.raises(BuildRejected):
+                await asyncio.wait_for(queue.run(blocking(release)), timeout=1)
+        rejected_in = time.monotonic() - started
+        waiting = running + queued
+        release.set()
+        return added_threads, rejected_in, await asyncio.gather(*waiting)
+
+    added_threads, rejected_in, results = asyncio.run(main())
+    assert added_threads == 0
+    assert rejected_in < 0.5
+    assert results == list(range(40))
+    assert queue.stats()["rejected"] == 20
@@ -0,0 +1,67 @@
+import datetime
+
+import pytest
+
+from app.services.scheduler.cron import CronSchedule
+
+
+def fires(expr: str, start: datetime.datetime, count: int) -> list:
+    schedule = CronSchedule(expr)
+    times, current = [], start
+    for _ in range(count):
+        current = schedule.next_after(current)
+        times.append(current)
+    return times
+
+
+def test_next_after_is_strictly_later():
+    start = datetime.datetime(2024, 1, 1, 10, 0, 30)
+    assert CronSchedule("* * * * *").next_after(start) == datetime.datetime(2024, 1, 1, 10, 1)
+    assert CronSchedule("0 10 * * *").next_after(datetime.datetime(2024, 1, 1, 10, 0)) == datetime.datetime(2024, 1, 2, 10, 0)
+
+
+def test_ranges_lists_and_steps():
+    schedule = CronSchedule("0-10/5,30 8-9 * * *")
+    assert schedule.minutes == {0, 5, 10, 30}
+    assert schedule.hours == {8, 9}
+    assert CronSchedule("*/15 * * * *").minutes == {0, 15, 30, 45}
+    # "5/20" means every 20 minutes starting at 5
+    assert CronSchedule("5/20 * * * *").minutes == {5, 25, 45}
+
+
+def test_names_and_aliases():
+    schedule = CronSchedule("0 0 * jan-mar mon,fri")
+    assert schedule.months == {1, 2, 3}
+    assert schedule.weekdays == {1, 5}
+    assert CronSchedule("0 0 * * 7").weekdays == {0}
+    assert fires("@daily", datetime.datetime(2024, 1, 1, 12, 0), 2) == [
+        datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 3),
+    ]
+
+
+def test_restricted_day_fields_match_either():
+    # 2024-01-01 is a Monday: fires on the 15th and on every Monday
+    times = fires("0 0 15 * mon", datetime.datetime(2023, 12, 31), 4)
+    assert times == [
+        datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 8),
+        datetime.datetime(2024, 1, 15), datetime.datetime(2024, 1, 22),
+    ]
+
+
+def test_star_step_day_field_does_not_restrict():
+    # "*/2" still starts with "*", so the day-of-week restriction alone applies (AND, not OR)
+    times = fires("0 0 */2 * mon", datetime.datetime(2023, 12, 31), 3)
+    assert times == [
+        datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 15), datetime.datetime(2024, 1, 29),
+    ]
+
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "* 24 * * *", "5-1 * * * *", "*/0 * * * *", "x * * * *"])
+def test_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+
+def test_never_firing_expression():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 30 2 *").next_after(datetime.datetime(2024, 1, 1))
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+from app.services.tests.docker_runner_service import BASE_IMAGE_REPO, DockerRunnerService
+
+# Stand-in for the docker CLI: logs every call and keeps built images in a file
+FAKE_DOCKER = """#!{python}
+import json, os, sys
+state = os.environ["FAKE_DOCKER_STATE"]
+args = sys.argv[1:]
+with open(os.path.join(state, "calls.jsonl"), "a") as f:
+    f.write(json.dumps(args) + "\\n")
+images_path = os.path.join(state, "images")
+images = open(images_path).read().split() if os.path.exists(images_path) else []
+if args[:2] == ["image", "inspect"]:
+    sys.exit(0 if args[2] in images else 1)
+if args[0] == "build":
+    with open(images_path, "a") as f:
+        f.write(args[args.index("-t") + 1] + "\\n")
+elif args[0] == "images":
+    print("\\n".join(images))
+elif args[0] == "run":
+    print("PIPELINE_ROWS=3")
+"""
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "docker"
+    script.write_text(FAKE_DOCKER.format(python=sys.executable))
+    script.chmod(0o755)
+    state = tmp_path / "state"
+    state.mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_DOCKER_STATE", str(state))
+    monkeypatch.delenv("DOCKER_CLI", raising=False)
+    monkeypatch.delenv("PIPELINE_DOCKER_NETWORK", raising=False)
+
+    def calls():
+        with open(state / "calls.jsonl") as f:
+            return [json.loads(line) for line in f]
+
+    return calls
+
+
+def make_runner(**kwargs) -> DockerRunnerService:
+    return DockerRunnerService(logging.getLogger(__name__), python_image="python:3.11-slim", **kwargs)
+
+
+def pipeline_folder(tmp_path, env: str):
+    folder = tmp_path / "pipelines" / "orders"
+    folder.mkdir(parents=True)
+    (folder / ".env").write_text(env)
+    return str(folder)
+
+
+def test_base_image_tag_hashes_image_and_requirements():
+    runner = make_runner()
+    digest = hashlib.sha256(f"python:3.11-slim\n{runner.requirements_text()}".encode()).hexdigest()[:12]
+    assert runner.base_image_tag() == f"{BASE_IMAGE_REPO}:{digest}"
+    assert make_runner().base_image_tag() == runner.base_image_tag()
+    assert DockerRunnerService(logging.getLogger(__name__), python_image="python:3.12-slim").base_image_tag() != runner.base_image_tag()
+
+
+def test_base_image_is_built_once(fake_docker):
+    runner = make_runner()
+    tag = runner.ensure_base_image()
+    assert runner.ensure_base_image() == tag
+    builds = [call for call in fake_docker() if call[0] == "build"]
+    assert len(builds) == 1 and builds[0][builds[0].index("-t") + 1] == tag
+
+
+def test_run_mounts_limits_and_network(fake_docker, tmp_path):
+    db_path = str(tmp_path / "warehouse" / "orders.db")
+    data_folder = str(tmp_path / "cache")
+    folder = pipeline_folder(tmp_path, f"DATA_FOLDER={data_folder}\nSQLITE_DB_PATH={db_path}\n")
+    runner = make_runner(network="dataops_default")
+
+    result = runner.run(folder, "orders", ["python", "orders.py"], {"timeout_seconds": 30, "max_rss_mb": 512})
+
+    assert result["returncode"] == 0 and "PIPELINE_ROWS=3" in result["stdout"]
+    assert result["max_rss_kb"] is None and not result["oom_killed"]
+    args = next(call for call in fake_docker() if call[0] == "run")
+    options = list(zip(args, args[1:]))
+    assert ("--memory", "512m") in options and ("--memory-swap", "512m") in options
+    assert ("--network", "dataops_default") in options
+    mounts = [value for flag, value in options if flag == "-v"]
+    assert f"{folder}:/work/pipelines/orders" in mounts
+    assert f"{data_folder}:{data_folder}:ro" in mounts
+    # The SQLite destination directory is mounted read-write at the same path
+    assert f"{os.path.dirname(db_path)}:{os.path.dirname(db_path)}" in mounts
+    assert os.path.isdir(os.path.dirname(db_path))
+    tag_index = args.index(runner.base_image_tag())
+    assert args[tag_index + 1:] == ["timeout", "30", "python", "orders.py"]
+
+
+def test_run_without_network_or_sqlite(fake_docker, tmp_path):
+    folder = pipeline_folder(tmp_path, "DATA_FOLDER=s3://bucket?endpoint_override=minio:9000\n")
+    make_runner().run(folder, "orders", ["python", "orders.py"], {"timeout_seconds": 30, "max_rss_mb": 256})
+    args = next(call for call in fake_docker() if call[0] == "run")
+    assert "--network" not in args
+    assert [value for flag, value in zip(args, args[1:]) if flag == "-v"] == [f"{folder}:/work/pipelines/orders"]
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import shutil
+
+import pytest
+
+from app.services import pipeline_builder_service
+from app.services.pipeline_builder_service import PipelineBuilderService
+from app.services.registry.pipeline_registry_service import PipelineRegistryService, schema_fingerprint, spec_key
+from app.services.scheduler.pipeline_scheduler_service import DEPLOYMENT_FILE, PipelineSchedulerService
+
+SPEC = {
+    "pipeline_name": "orders_20240101_0800_abcdef",
+    "source_type": "localFileCSV",
+    "source_path": "data/orders.csv",
+    "destination_type": "file",
+    "destination_name": "Daily Revenue",
+    "transformation": "Sum amount  per country",
+    "schedule": "0 8 * * *",
+}
+PREVIEW = [{"country": "IL", "amount": 1.5}, {"country": "US", "amount": None}]
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return PipelineRegistryService(db_path=str(tmp_path / "registry.db"))
+
+
+def test_spec_key_normalization():
+    key = spec_key(SPEC)
+    assert spec_key({**SPEC, "pipeline_name": "other"}) == key
+    assert spec_key({**SPEC, "transformation": "sum AMOUNT per country"}) == key
+    assert spec_key({**SPEC, "source_path": "./data/orders.csv"}) == key
+    assert spec_key({**SPEC, "source_path": "data//orders.csv"}) == key
+    # Absolute, parent and other relative paths are different sources
+    keys = {spec_key({**SPEC, "source_path": path}) for path in ("/data/orders.csv", "../data/orders.csv", "../../data/orders.csv")}
+    assert len(keys) == 3 and key not in keys
+    assert spec_key({**SPEC, "source_path": "s3://bucket/data/orders.csv"}) != spec_key({**SPEC, "source_path": "s3://bucket/data//orders.csv"})
+
+
+def test_schema_fingerprint_ignores_values_and_nulls():
+    assert schema_fingerprint(PREVIEW) == schema_fingerprint([{"country": "FR", "amount": 2.0}])
+    assert schema_fingerprint(PREVIEW) != schema_fingerprint([{"amount": 2.0, "country": "FR"}])
+    assert schema_fingerprint([]) is None
+
+
+def test_find_verified_and_by_prompt(registry):
+    fingerprint = schema_fingerprint(PREVIEW)
+    registry.upsert(SPEC, code="print(1)", fingerprint=fingerprint, verified=False, prompt="build orders")
+    assert registry.find_verified(SPEC, fingerprint) is None
+    assert registry.find_by_prompt("build orders") is None
+
+    registry.upsert(SPEC, code="print(2)", folder="/p/orders", fingerprint=fingerprint, verified=True,
+                    metrics=[{"attempt": 1}], prompt="build   orders")
+    found = registry.find_verified({**SPEC, "pipeline_name": "x", "source_path": "./data/orders.csv"}, fingerprint)
+    assert found["name"] == SPEC["pipeline_name"] and found["code"] == "print(2)"
+    assert found["spec"] == SPEC and found["test_metrics"] == [{"attempt": 1}] and found["verified"] is True
+    assert registry.find_verified(SPEC, "other-schema") is None
+    assert registry.find_by_prompt("build orders")["name"] == SPEC["pipeline_name"]
+
+
+def test_search_and_runs(registry):
+    registry.upsert(SPEC, verified=True)
+    registry.upsert({**SPEC, "pipeline_name": "users", "transformation": "dedupe users", "source_type": "sqlite"})
+    assert registry.search(q="country")["total"] == 1
+    assert registry.search(verified=False)["pipelines"][0]["name"] == "users"
+    assert registry.search(source_type="localFileCSV", limit=1)["total"] == 1
+
+    registry.record_run({"pipeline": SPEC["pipeline_name"], "scheduled_for_ts": 10.0, "status": "success", "rows": 3})
+    entry = registry.get(SPEC["pipeline_name"])
+    assert (entry["run_count"], entry["last_run_status"]) == (1, "success")
+    assert entry["recent_runs"][0]["rows"] == 3
+
+
+@pytest.fixture
+def scheduler(tmp_path, monkeypatch):
+    scheduler = PipelineSchedulerService(pipelines_dir=str(tmp_path))
+    monkeypatch.setattr(pipeline_builder_service, "get_pipeline_scheduler", lambda: scheduler)
+    return scheduler
+
+
+@pytest.fixture
+def builder(scheduler):
+    # Only reuse_result is exercised; skip the LLM, storage and test service setup
+    builder = PipelineBuilderService.__new__(PipelineBuilderService)
+    builder.log = logging.getLogger(__name__)
+    return builder
+
+
+def registered(folder, deployed=True, code=True, venv=True) -> dict:
+    name = SPEC["pipeline_name"]
+    os.makedirs(folder, exist_ok=True)
+    if code:
+        with open(os.path.join(folder, f"{name}.py"), "w") as f:
+            f.write("print('PIPELINE_ROWS=1')\n")
+    if venv:
+        os.makedirs(os.path.join(folder, "venv", "bin"))
+        open(os.path.join(folder, "venv", "bin", "python"), "w").close()
+    if deployed:
+        with open(os.path.join(folder, DEPLOYMENT_FILE), "w") as f:
+            json.dump({"name": name, "folder": folder, "schedule": SPEC["schedule"], "execution_mode": "venv"}, f)
+    return {"name": name, "folder": folder, "spec": SPEC, "code": "print(1)", "test_metrics": None,
+            "streaming_safe": None, "schedule": SPEC["schedule"]}
+
+
+def test_reuse_schedules_deployed_pipeline(builder, scheduler, tmp_path):
+    result = builder.reuse_result(registered(str(tmp_path / "orders")))
+    assert result["reused"] and result["deployment"]["success"]
+    assert result["deployment"]["next_run"] is not None
+    assert SPEC["pipeline_name"] in scheduler.jobs
+
+
+@pytest.mark.parametrize("missing", ["deployed", "code", "venv"])
+def test_reuse_falls_back_when_pipeline_is_gone(builder, scheduler, tmp_path, missing):
+    existing = registered(str(tmp_path / "orders"), **{missing: False})
+    assert builder.reuse_result(existing) is None
+    assert scheduler.jobs == {}
+
+
+def test_reuse_falls_back_when_folder_is_deleted(builder, tmp_path):
+    folder = str(tmp_path / "orders")
+    existing = registered(folder)
+    shutil.rmtree(folder)
+    assert builder.reuse_result(existing) is None
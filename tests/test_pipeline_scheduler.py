@@ -0,0 +1,95 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from app.services.scheduler.pipeline_scheduler_service import HISTORY_FILE, PipelineSchedulerService
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = PipelineSchedulerService(pipelines_dir=str(tmp_path), max_workers=1, misfire_grace=60, max_catch_up=5)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def write_history(folder, records):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, HISTORY_FILE), "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def minute_floor(ts: float) -> float:
+    return ts - ts % 60
+
+
+def test_register_resumes_from_latest_scheduled_time(scheduler, tmp_path):
+    folder = str(tmp_path / "job")
+    latest = minute_floor(time.time()) - 600
+    # A long run finishing after a later one was skipped: the file is not in fire-time order
+    write_history(folder, [
+        {"scheduled_for_ts": latest, "status": "skipped"},
+        {"scheduled_for_ts": latest - 300, "status": "success"},
+    ])
+    job = scheduler.register("job", "* * * * *", folder=folder)
+    assert job.next_run == latest + 60
+
+
+def test_reregister_does_not_replay_misfires(scheduler, tmp_path):
+    folder = str(tmp_path / "job")
+    write_history(folder, [{"scheduled_for_ts": minute_floor(time.time()) - 3600, "status": "success"}])
+    first = scheduler.register("job", "* * * * *", folder=folder)
+    assert first.next_run < time.time()
+    second = scheduler.register("job", "* * * * *", folder=folder)
+    assert second.next_run > time.time()
+    assert second.generation == first.generation + 1
+
+
+@pytest.mark.parametrize("policy, submitted, missed", [("skip", 0, 5), ("run_once", 1, 4), ("catch_up", 5, 0)])
+def test_misfire_policies(scheduler, tmp_path, monkeypatch, policy, submitted, missed):
+    job = scheduler.register("job", "* * * * *", folder=str(tmp_path / "job"), misfire_policy=policy)
+    runs = []
+    monkeypatch.setattr(scheduler, "_submit", lambda job, ts, force_queue=False: runs.append(ts))
+    scheduled_for = minute_floor(time.time()) - 600
+
+    scheduler._fire(job, scheduled_for)
+
+    # max_catch_up bounds the backlog to the first 5 missed fire times
+    expected = [scheduled_for + 60 * i for i in range(5)]
+    assert runs == expected[len(expected) - submitted:]
+    skipped = [r["scheduled_for_ts"] for r in job.history if r["status"] == "skipped"]
+    assert skipped == expected[:missed]
+    assert job.next_run > time.time()
+
+
+def test_fire_within_grace_runs_once(scheduler, tmp_path, monkeypatch):
+    job = scheduler.register("job", "* * * * *", folder=str(tmp_path / "job"), misfire_policy="skip")
+    runs = []
+    monkeypatch.setattr(scheduler, "_submit", lambda job, ts, force_queue=False: runs.append(ts))
+    scheduled_for = minute_floor(time.time())
+    scheduler._fire(job, scheduled_for)
+    assert runs == [scheduled_for]
+    assert list(job.history) == []
+
+
+def test_shutdown_kills_running_pipeline(tmp_path):
+    folder = tmp_path / "sleeper"
+    (folder / "venv" / "bin").mkdir(parents=True)
+    os.symlink(sys.executable, folder / "venv" / "bin" / "python")
+    (folder / "sleeper.py").write_text("import time\ntime.sleep(60)\n")
+    scheduler = PipelineSchedulerService(pipelines_dir=str(tmp_path), max_workers=1, run_timeout=120)
+    scheduler.start()
+    job = scheduler.register("sleeper", "0 0 1 1 *", folder=str(folder))
+    scheduler._submit(job, time.time())
+    deadline = time.time() + 10
+    while job.running == 0 and time.time() < deadline:
+        time.sleep(0.05)
+
+    started = time.time()
+    scheduler.shutdown()
+
+    assert time.time() - started < 10
+    assert job.history[-1]["status"] == "cancelled"
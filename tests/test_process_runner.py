@@ -0,0 +1,78 @@
+import logging
+import sys
+import threading
+import time
+
+import pytest
+
+from app.services.process_runner import run_measured
+# Aliased so pytest does not try to collect it as a test class
+from app.services.tests.test_pipline_service import TestPipelineService as PipelineTestService
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc and waitid")
+
+ALLOCATE = "import time\nblocks = [bytearray(16 * 1024 * 1024) for _ in range({blocks})]\ntime.sleep({sleep})\n"
+
+
+def python(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+def test_success_output_and_accounting():
+    result = run_measured(python("import sys; print('out'); print('err', file=sys.stderr)"))
+    assert result["returncode"] == 0
+    assert (result["stdout"], result["stderr"]) == ("out\n", "err\n")
+    assert not (result["timed_out"] or result["memory_exceeded"] or result["cancelled"])
+    assert result["output_bytes"] == 8
+    assert result["max_rss_kb"] > 0
+
+
+def test_peak_memory_is_the_childs_own():
+    # Grow the parent well past the child's footprint; the child's peak must not include it
+    ballast = bytearray(400 * 1024 * 1024)
+    ballast[::4096] = b"x" * len(ballast[::4096])
+    result = run_measured(python(ALLOCATE.format(blocks=4, sleep=0.3)))
+    assert result["returncode"] == 0
+    assert 64 * 1024 <= result["max_rss_kb"] < 300 * 1024
+    del ballast
+
+
+def test_timeout_kills_process_group():
+    started = time.monotonic()
+    # The grandchild would keep the output files open for 30s if only the child were killed
+    code = "import subprocess, sys, time\nsubprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])\ntime.sleep(30)\n"
+    result = run_measured(python(code), timeout=0.5)
+    assert time.monotonic() - started < 10
+    assert result["timed_out"]
+    assert result["returncode"] == -9
+    assert not result["memory_exceeded"]
+
+
+def test_memory_limit_kills_child():
+    result = run_measured(python(ALLOCATE.format(blocks=16, sleep=30)), memory_limit_mb=100, timeout=20)
+    assert result["memory_exceeded"]
+    assert not result["timed_out"]
+    assert result["returncode"] == -9
+    assert result["max_rss_kb"] > 100 * 1024
+
+
+def test_within_memory_limit_is_not_killed():
+    result = run_measured(python(ALLOCATE.format(blocks=2, sleep=0.2)), memory_limit_mb=200)
+    assert result["returncode"] == 0
+    assert not result["memory_exceeded"]
+
+
+def test_cancel_kills_child():
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+    started = time.monotonic()
+    result = run_measured(python("import time; time.sleep(30)"), cancel=cancel)
+    assert time.monotonic() - started < 10
+    assert result["cancelled"]
+    assert result["returncode"] == -9
+
+
+def test_unknown_execution_mode_reports_metrics(tmp_path):
+    result = PipelineTestService(logging.getLogger(__name__)).run_pipeline_test(str(tmp_path), "p", execution_mode="lambda")
+    assert not result["success"]
+    assert result["metrics"]["execution_mode"] == "lambda"
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from app.services.generators.pipeline_code_generator import ALLOWED_PACKAGES
+from app.services.generators.prompt_builder import CodePromptBuilder, count_tokens, instruction_prefix
+
+PREVIEW_MARKER = "Data preview (column-wise, long values truncated):\n"
+
+
+def wide_preview(columns: int = 500, rows: int = 5) -> list:
+    preview = []
+    for r in range(rows):
+        row = {}
+        for c in range(columns):
+            if c % 5 == 0:
+                row[f"col_{c}"] = f"long text value {r}-{c} " * 20
+            elif c % 5 == 1:
+                row[f"col_{c}"] = r * c
+            elif c % 5 == 2:
+                row[f"col_{c}"] = r * c / 7
+            elif c % 5 == 3:
+                row[f"col_{c}"] = None if r % 2 else True
+            else:
+                row[f"col_{c}"] = {"nested": [r, c], "label": "x" * 200}
+        row["event_date"] = f"2025-09-{r + 10:02d}"
+        preview.append(row)
+    return preview
+
+
+def spec(transformation: str) -> dict:
+    return {
+        "pipeline_name": "wide_sales_20250918_1200_a1b2c3",
+        "source_type": "localFileCSV",
+        "source_path": "data/wide/*.csv",
+        "destination_type": "sqlLite",
+        "destination_name": "wide_sales",
+        "transformation": transformation,
+        "schedule": "0 8 * * *",
+        "memory_budget_mb": None,
+    }
+
+
+def preview_of(prompt: str) -> dict:
+    return json.loads(prompt.split(PREVIEW_MARKER, 1)[1].split("\n", 1)[0])
+
+
+@pytest.mark.parametrize("last_error", [None, "Traceback (most recent call last):\n" + "  File \"x.py\", line 1\n" * 2000])
+def test_500_column_prompt_stays_within_budget(last_error):
+    builder = CodePromptBuilder(max_tokens=8000, preview_max_tokens=2500, max_cell_chars=64)
+    fix_request = builder.fix_request("import pandas as pd\n" * 50, last_error, "def test_x(): pass") if last_error else ""
+    prefix = instruction_prefix(tuple(ALLOWED_PACKAGES))
+    spec_ = spec("Sum col_417 and col_3 per event_date, drop rows where col_250 is null")
+
+    prompt, tokens = builder.build(prefix, spec_, wide_preview(), "Write ../pipelines/wide_sales/wide_sales.py", fix_request)
+
+    assert tokens["total"] <= tokens["budget"]
+    assert count_tokens(prompt) == tokens["total"]
+    # The shared instructions stay a byte-identical prefix for provider caching
+    assert prompt.startswith(prefix)
+    preview = preview_of(prompt)
+    for column in ("col_417", "col_3", "col_250", "event_date"):
+        assert column in preview["columns"]
+    assert len(preview["columns"]) < 500
+    assert preview["rows"]
+
+
+def test_long_cells_are_truncated():
+    builder = CodePromptBuilder(max_tokens=8000, preview_max_tokens=2500, max_cell_chars=64)
+    prompt, _ = builder.build(instruction_prefix(tuple(ALLOWED_PACKAGES)), spec("Keep col_0"), wide_preview(columns=5), "")
+    preview = preview_of(prompt)
+    value = preview["rows"][0][preview["columns"].index("col_0")]
+    assert len(value) < 100 and value.endswith("chars)")
+
+
+def test_small_preview_is_kept_whole():
+    builder = CodePromptBuilder(max_tokens=8000, preview_max_tokens=2500)
+    data = [{"id": i, "amount": i * 1.5, "country": "IL"} for i in range(5)]
+    prompt, tokens = builder.build(instruction_prefix(tuple(ALLOWED_PACKAGES)), spec("Sum amount per country"), data, "")
+    preview = preview_of(prompt)
+    assert preview["columns"] == ["id", "amount", "country"]
+    assert len(preview["rows"]) == 5
+    assert "other_columns" not in preview
+    assert tokens["total"] <= tokens["budget"]
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from app.services.guards.prompt_guard_service import PromptGuardService, basic_clean
+from app.tools.guard_benchmark import ATTACK_FRAGMENTS, reference_analyze, reference_basic_clean, synthetic_prompt
+
+# Characters that exercise the fast paths and the prefilter edge cases: case
+# folding ("ı", "ſ", "K" Kelvin sign), NFKC compatibility forms, bidi and
+# zero-width characters, C0/C1 controls, surrogates and Hebrew.
+ALPHABET = (
+    "abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 \n\t\r"
+    "!%$()`;-_.,:/[]{}<>=\"'@#&*+|\\~"
+    "ıİſKﬁｆｉｌｅ①²ª"
+    "‪‮⁦⁩​‌‍⁠﻿"
+    "\x00\x07\x1b\x7f\x85\x9f\ud800"
+    "התעלםמהנחיותבטלחוקים"
+)
+
+
+def fuzzed_inputs(count: int, seed: int = 1234):
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts = []
+        for _ in range(rng.randint(1, 12)):
+            if rng.random() < 0.4:
+                fragment = rng.choice(ATTACK_FRAGMENTS)
+                # Mangle the case so the case-insensitive prefilter is exercised
+                parts.append("".join(c.upper() if rng.random() < 0.3 else c for c in fragment))
+            else:
+                parts.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 24))))
+        yield rng.choice(("", " ", "\n")).join(parts)
+
+
+def verdict(result: dict) -> tuple:
+    return result["cleaned"], result["findings"], result["risk_score"], result["decision"]
+
+
+def test_basic_clean_matches_reference():
+    for text in fuzzed_inputs(5000):
+        assert basic_clean(text) == reference_basic_clean(text), repr(text)
+
+
+def test_analyze_matches_reference_on_fuzzed_inputs():
+    guard = PromptGuardService(cache_size=0)
+    for text in fuzzed_inputs(5000, seed=99):
+        assert verdict(guard.analyze(text)) == verdict(reference_analyze(text)), repr(text)
+
+
+@pytest.mark.parametrize("kind", ["ascii", "mixed", "attack"])
+@pytest.mark.parametrize("size", [1024, 64 * 1024])
+def test_analyze_matches_reference_on_large_inputs(kind, size):
+    text = synthetic_prompt(size, kind, seed=size)
+    assert verdict(PromptGuardService(cache_size=0).analyze(text)) == verdict(reference_analyze(text))
+
+
+def test_cached_verdict_matches_reference():
+    guard = PromptGuardService(cache_size=16)
+    text = synthetic_prompt(4096, "attack")
+    first = guard.analyze(text)
+    first["findings"].clear()
+    assert verdict(guard.analyze(text)) == verdict(reference_analyze(text))
+
+
+def test_cache_can_be_disabled_by_byte_budget():
+    guard = PromptGuardService(cache_max_bytes=0)
+    guard.analyze("import os")
+    guard.analyze("import os")
+    assert guard.cache_stats()["entries"] == 0
+
+
+def test_large_cleaned_text_is_not_cached():
+    guard = PromptGuardService(cache_max_text_bytes=1024)
+    text = "\x07" + "x" * 10_000
+    assert guard.analyze(text)["cleaned"] == guard.analyze(text)["cleaned"] == "x" * 10_000
+    assert guard.cache_stats()["bytes"] < 2048
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app.services.source.s3_cache_service import S3DiskCache
+
+
+class FakeStorage:
+    def __init__(self, size: int = 100, delay: float = 0.0):
+        self.size = size
+        self.delay = delay
+        self.downloads = []
+        self._lock = threading.Lock()
+
+    def head_object(self, key, bucket=None):
+        return {"size": self.size, "etag": f"etag-{key}"}
+
+    def download_to(self, key, path, bucket=None, etag=None):
+        time.sleep(self.delay)
+        with self._lock:
+            self.downloads.append(key)
+        with open(path, "wb") as f:
+            f.write(key.encode()[:1] * self.size)
+        return self.size
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def test_miss_then_hit(cache_dir):
+    storage = FakeStorage()
+    cache = S3DiskCache(storage, cache_dir=cache_dir, max_bytes=1000)
+    path = cache.get("b", "dir/a.csv")
+    assert cache.get("b", "dir/a.csv") == path
+    assert path == os.path.join(cache.entry_dir("b", "etag-dir/a.csv"), "dir", "a.csv")
+    assert storage.downloads == ["dir/a.csv"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_lookup_counts_misses(cache_dir):
+    cache = S3DiskCache(FakeStorage(), cache_dir=cache_dir, max_bytes=1000)
+    assert cache.lookup("b", "a.csv", "e") is None
+    assert cache.stats()["misses"] == 1
+    assert cache.hit_rate() == 0.0
+
+
+def test_concurrent_misses_share_one_download(cache_dir):
+    storage = FakeStorage(delay=0.2)
+    cache = S3DiskCache(storage, cache_dir=cache_dir, max_bytes=1000)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("b", "a.csv"))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(results)) == 1
+    assert storage.downloads == ["a.csv"]
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_lru_eviction_keeps_size_under_budget(cache_dir):
+    cache = S3DiskCache(FakeStorage(size=100), cache_dir=cache_dir, max_bytes=250)
+    a = cache.get("b", "a.csv")
+    cache.get("b", "b.csv")
+    cache.get("b", "a.csv")  # a is now most recently used
+    cache.get("b", "c.csv")
+    assert os.path.exists(a)
+    assert cache.lookup("b", "b.csv", "etag-b.csv") is None
+    assert cache.stats()["size_bytes"] <= 250
+
+
+def test_pinned_entries_are_not_evicted(cache_dir):
+    cache = S3DiskCache(FakeStorage(size=100), cache_dir=cache_dir, max_bytes=150)
+    with cache.pinned("b", "a.csv") as path:
+        cache.get("b", "b.csv")
+        cache.get("b", "c.csv")
+        assert os.path.exists(path)
+        assert cache.stats()["pinned"] == 1
+    # Released: the cache goes back under budget
+    assert cache.stats()["size_bytes"] <= 150
+    assert cache.stats()["pinned"] == 0
+
+
+def test_index_is_rebuilt_after_restart(cache_dir):
+    storage = FakeStorage()
+    cache = S3DiskCache(storage, cache_dir=cache_dir, max_bytes=1000)
+    path = cache.get("b", "a.csv")
+    partial = path + ".123.part"
+    with open(partial, "wb") as f:
+        f.write(b"half")
+    restarted = S3DiskCache(storage, cache_dir=cache_dir, max_bytes=1000)
+    assert restarted.lookup("b", "a.csv", "etag-a.csv") == path
+    assert not os.path.exists(partial)
+    assert storage.downloads == ["a.csv"]
+
+
+def test_unsafe_keys_are_refused(cache_dir):
+    cache = S3DiskCache(FakeStorage(), cache_dir=cache_dir, max_bytes=1000)
+    with pytest.raises(ValueError):
+        cache.get("b", "../escape.csv")
@@ -0,0 +1,96 @@
+import io
+
+import pandas as pd
+import pytest
+
+from app.services.source.s3_object_service import S3ObjectService, S3RangeReader, parse_s3_path
+
+
+class FakeStorage:
+    """In-memory stand-in for MinioStorage that records every range request."""
+
+    bucket = "dataops-bucket"
+
+    def __init__(self, objects: dict):
+        self.objects = objects
+        self.ranges = []
+
+    def head_object(self, key, bucket=None):
+        data = self.objects[(bucket or self.bucket, key)]
+        return {"size": len(data), "etag": f"etag-{len(data)}", "content_type": None, "last_modified": None}
+
+    def get_range(self, key, start, end, bucket=None):
+        assert 0 <= start <= end, f"invalid range bytes={start}-{end}"
+        self.ranges.append((start, end))
+        return self.objects[(bucket or self.bucket, key)][start:end + 1]
+
+
+def reader(data: bytes, block_size: int = 4) -> S3RangeReader:
+    storage = FakeStorage({("b", "k"): data})
+    return S3RangeReader(storage, "b", "k", len(data), block_size=block_size)
+
+
+def test_parse_s3_path():
+    assert parse_s3_path("s3://other/dir/file.csv", "default") == ("other", "dir/file.csv")
+    assert parse_s3_path("/dir/file.csv", "default") == ("default", "dir/file.csv")
+
+
+def test_reads_and_seeks_match_the_object():
+    data = bytes(range(256)) * 4
+    r = reader(data, block_size=16)
+    assert r.read(10) == data[:10]
+    assert r.seek(-5, io.SEEK_END) == len(data) - 5
+    assert r.read() == data[-5:]
+    assert r.read(3) == b""
+    r.seek(100)
+    assert r.read(50) == data[100:150]
+
+
+def test_zero_length_read_sends_no_request():
+    r = reader(b"0123456789")
+    r.seek(3)
+    assert r.read(0) == b""
+    assert r.storage.ranges == []
+    assert r.tell() == 3
+
+
+def test_reads_within_a_block_reuse_it():
+    r = reader(b"0123456789abcdef", block_size=8)
+    assert r.read(2) == b"01"
+    assert r.read(2) == b"23"
+    assert r.requests == 1
+    assert r.storage.ranges == [(0, 7)]
+
+
+def test_tail_prefetch_does_not_evict_the_data_block():
+    data = b"x" * 100 + b"footer"
+    r = reader(data, block_size=10)
+    r.prefetch_tail(6)
+    r.read(5)
+    r.seek(-6, io.SEEK_END)
+    assert r.read(6) == b"footer"
+    r.seek(0)
+    assert r.read(5) == b"xxxxx"
+    assert r.requests == 2
+
+
+def test_csv_preview_fetches_only_a_prefix():
+    rows = "\n".join(f"{i},{i * 2}" for i in range(100_000))
+    data = f"a,b\n{rows}\n".encode()
+    storage = FakeStorage({("dataops-bucket", "big.csv"): data})
+    service = S3ObjectService(storage=storage, preview_bytes=4096, block_size=4096, cache=None)
+    df = service.preview("big.csv", nrows=5)
+    assert df.to_dict(orient="list") == {"a": [0, 1, 2, 3, 4], "b": [0, 2, 4, 6, 8]}
+    assert sum(end - start + 1 for start, end in storage.ranges) <= 2 * 4096
+
+
+def test_parquet_preview_reads_footer_and_first_row_group():
+    pytest.importorskip("pyarrow")
+    buf = io.BytesIO()
+    pd.DataFrame({"id": range(200_000), "value": [i * 0.5 for i in range(200_000)]}).to_parquet(buf, row_group_size=50_000)
+    data = buf.getvalue()
+    storage = FakeStorage({("dataops-bucket", "t.parquet"): data})
+    service = S3ObjectService(storage=storage, cache=None)
+    df = service.preview("t.parquet", nrows=3, columns=["id"])
+    assert df["id"].tolist() == [0, 1, 2]
+    assert sum(end - start + 1 for start, end in storage.ranges) < len(data) / 2
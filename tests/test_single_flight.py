@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from app.services.build_queue import BuildQueue
+from app.services.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_future():
+    flight = SingleFlight()
+    started = []
+
+    def start():
+        started.append(1)
+        return Future()
+
+    leader, shared = flight.submit("k", start)
+    follower, follower_shared = flight.submit("k", start)
+    assert (shared, follower_shared) == (False, True)
+    assert follower is leader and len(started) == 1
+
+    leader.set_result("built")
+    assert follower.result() == "built"
+    # Completed flights are forgotten, the next call starts a new one
+    again, shared = flight.submit("k", start)
+    assert again is not leader and not shared
+    assert flight.stats() == {"in_flight": 1, "executions": 2, "coalesced": 1}
+
+
+def test_exception_is_shared_and_failed_start_registers_nothing():
+    flight = SingleFlight()
+    future, _ = flight.submit("k", Future)
+    follower, _ = flight.submit("k", Future)
+    future.set_exception(ValueError("boom"))
+    with pytest.raises(ValueError):
+        follower.result()
+
+    def reject():
+        raise RuntimeError("queue full")
+
+    with pytest.raises(RuntimeError):
+        flight.submit("other", reject)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_coalesced_waiters_do_not_hold_threads():
+    queue = BuildQueue(workers=1, max_queued=1, max_wait=60)
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def build():
+        release.wait(10)
+        return "built"
+
+    async def request():
+        future, _ = flight.submit("k", lambda: queue.submit(build))
+        return await asyncio.wrap_future(future)
+
+    async def main():
+        tasks = [asyncio.create_task(request()) for _ in range(200)]
+        await asyncio.sleep(0.1)
+        # One build worker, no thread per waiter
+        threads = threading.active_count()
+        release.set()
+        return threads, await asyncio.gather(*tasks)
+
+    before = threading.active_count()
+    threads, results = asyncio.run(main())
+    assert threads <= before + 2
+    assert results == ["built"] * 200
+    assert flight.stats()["executions"] == 1 and queue.stats()["submitted"] == 1
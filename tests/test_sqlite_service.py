@@ -0,0 +1,129 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.source.sqlite_service import SQLiteService, dataframe_rows
+
+
+@pytest.fixture
+def source_db(tmp_path):
+    # A user's database in the default rollback-journal mode
+    path = str(tmp_path / "shop.db")
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE "order items" (id INTEGER, amount REAL, country TEXT)')
+    conn.executemany('INSERT INTO "order items" VALUES (?, ?, ?)', [(i, i * 1.5, "IL") for i in range(1000)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def journal_mode(path: str) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_source_reads_are_read_only_and_leave_the_file_alone(source_db):
+    service = SQLiteService(pool_size=2)
+    assert service.check_table_exists(source_db, "order items")
+    assert not service.check_table_exists(source_db, "missing")
+    assert service.list_tables(source_db) == ["order items"]
+    service.close_all()
+    assert journal_mode(source_db) == "delete"
+    assert not os.path.exists(source_db + "-wal")
+    with service.connection(source_db, read_only=True) as conn:
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute('DELETE FROM "order items"')
+
+
+def test_missing_source_is_not_created(tmp_path):
+    path = str(tmp_path / "missing.db")
+    assert not SQLiteService().check_table_exists(path, "t")
+    with pytest.raises(sqlite3.OperationalError):
+        SQLiteService().preview(path, "t")
+    assert not os.path.exists(path)
+
+
+def test_preview_reads_only_the_limit(source_db):
+    service = SQLiteService()
+    statements = []
+    with service.connection(source_db, read_only=True) as conn:
+        conn.set_trace_callback(statements.append)
+    df = service.preview(source_db, "order items", nrows=3, columns=["country", "id"])
+    assert list(df.columns) == ["country", "id"]
+    assert df["id"].tolist() == [0, 1, 2]
+    assert statements == ['SELECT "country", "id" FROM "order items" LIMIT 3']
+
+
+def test_pool_reuses_connections(source_db):
+    service = SQLiteService(pool_size=2)
+    for _ in range(10):
+        service.preview(source_db, "order items")
+    assert service.stats()["connections_opened"] == 1
+    assert service.stats()["checkouts"] == 10
+
+    # Concurrent checkouts never open more than pool_size connections per database
+    barrier = threading.Barrier(4)
+
+    def preview():
+        barrier.wait()
+        service.preview(source_db, "order items")
+
+    threads = [threading.Thread(target=preview) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = service.stats()
+    assert stats["connections_opened"] <= 2
+    assert stats["idle"] == stats["connections_opened"]
+
+
+def test_writes_use_wal_and_one_transaction_per_batch(tmp_path):
+    path = str(tmp_path / "out" / "warehouse.db")
+    service = SQLiteService(batch_size=4)
+    df = pd.DataFrame({"id": np.arange(10), "amount": [1.5, np.nan] * 5})
+    statements = []
+    os.makedirs(os.path.dirname(path))
+    with service.connection(path) as conn:
+        conn.set_trace_callback(statements.append)
+
+    assert service.write_dataframe(df, path, "sales", if_exists="replace") == 10
+    assert statements.count("BEGIN IMMEDIATE") == 3
+    assert statements.count("COMMIT") == 3
+    service.close_all()
+    assert journal_mode(path) == "wal"
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT id, amount FROM sales ORDER BY id").fetchall()
+    conn.close()
+    assert len(rows) == 10 and rows[1] == (1, None) and rows[2] == (2, 1.5)
+
+
+def test_failed_batch_is_rolled_back(tmp_path):
+    path = str(tmp_path / "warehouse.db")
+    service = SQLiteService(batch_size=2)
+    with service.connection(path) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY)")
+    with pytest.raises(sqlite3.IntegrityError):
+        service.insert_rows(path, "t", ["id"], [(1,), (2,), (3,), (3,)])
+    with service.connection(path) as conn:
+        assert not conn.in_transaction
+        assert [r[0] for r in conn.execute("SELECT id FROM t")] == [1, 2]
+
+
+def test_dataframe_rows_converts_to_plain_python():
+    df = pd.DataFrame({
+        "i": np.array([1, 2], dtype=np.int64),
+        "f": [0.5, np.nan],
+        "s": ["a", None],
+        "t": pd.to_datetime(["2025-01-01 10:00", None]),
+    })
+    rows = list(dataframe_rows(df))
+    assert rows == [(1, 0.5, "a", "2025-01-01T10:00:00.000000"), (2, None, None, None)]
+    assert type(rows[0][0]) is int
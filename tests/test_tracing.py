@@ -0,0 +1,65 @@
+import time
+
+from app.services.tracing import Tracer
+
+
+def finished(tracer: Tracer, name: str, duration_ms: float, age_seconds: float = 0.0):
+    with tracer.span(name):
+        pass
+    trace = tracer._recent[-1]
+    # Backdate the trace instead of sleeping
+    end_ns = time.time_ns() - int(age_seconds * 1e9)
+    trace.root.start_ns = end_ns - int(duration_ms * 1e6)
+    trace.root.end_ns = end_ns
+    return trace
+
+
+def test_spans_nest_into_one_trace():
+    tracer = Tracer(enabled=True)
+    with tracer.span("request") as root:
+        with tracer.span("child", step=1):
+            tracer.record_span("wait", time.time_ns())
+        root.set(done=True)
+    trace = tracer._recent[-1]
+    assert [s.name for s in trace.spans] == ["request", "child", "wait"]
+    assert trace.spans[2].parent_id == trace.spans[1].span_id
+    assert tracer.get(trace.trace_id) is trace
+    assert [row["depth"] for row in tracer.waterfall(trace)["spans"]] == [0, 1, 2]
+
+
+def test_slowest_only_covers_the_window():
+    tracer = Tracer(enabled=True, max_traces=10, window_seconds=60)
+    old = finished(tracer, "build", 5000, age_seconds=120)
+    fresh = finished(tracer, "build", 100)
+    assert tracer.slowest(10) == [fresh]
+    # A wider window than the tracer keeps is capped at the tracer's window
+    assert old not in tracer.slowest(10, window_seconds=3600)
+    assert tracer.slowest(10, window_seconds=1) == [fresh]
+
+
+def test_old_outliers_are_evicted_from_the_heap():
+    tracer = Tracer(enabled=True, max_traces=2, window_seconds=60)
+    # Two slow traces fill the heap, then age out of the window
+    for _ in range(2):
+        trace = finished(tracer, "build", 10_000)
+        trace.root.end_ns -= int(120 * 1e9)
+    recent = [finished(tracer, "build", ms) for ms in (50, 20)]
+    heap = [t for _, _, t in tracer._slowest]
+    assert len(heap) <= 2 and all(t in recent for t in heap)
+    assert tracer.slowest(5) == recent
+
+
+def test_recent_slow_trace_is_found_when_heap_is_full():
+    tracer = Tracer(enabled=True, max_traces=2, window_seconds=60)
+    finished(tracer, "build", 900, age_seconds=30)
+    finished(tracer, "build", 800, age_seconds=30)
+    # Not slower than the heap's minimum, so it is not pushed, but it is recent
+    fresh = finished(tracer, "build", 10)
+    assert tracer.slowest(1, window_seconds=5) == [fresh]
+
+
+def test_slowest_filters_by_span_name():
+    tracer = Tracer(enabled=True)
+    finished(tracer, "health", 900)
+    build = finished(tracer, "build_pipeline", 10)
+    assert tracer.slowest(5, name="build_pipeline") == [build]